@@ -1,17 +1,60 @@
+import time
+
 from PyQt6.QtCore import pyqtSignal, QThread
 
 class AIResponseThread(QThread):
     response_ready = pyqtSignal(str)
+    chunk_ready = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, llm, prompt):
-        super().__init__() 
+    # Minimum delay between two chunk_ready emissions while streaming
+    FLUSH_INTERVAL = 0.04
+
+    def __init__(self, llm, prompt, streaming=False, session=None):
+        super().__init__()
         self.llm = llm
         self.prompt = prompt
+        self.streaming = streaming
+        # Second item of a (prompt, data) pair returned by a prompt callable
+        self.prompt_data = None
+        # Session-aware clients reuse per-session state when given a session
+        self.llm_kwargs = {'session': session} if session is not None else {}
 
     def run(self):
         try:
-            response = self.llm.invoke(self.prompt)
+            # The prompt may be a callable so expensive assembly runs on this thread;
+            # what it learned on the way comes back to the GUI as prompt_data
+            if callable(self.prompt):
+                self.prompt = self.prompt()
+                if isinstance(self.prompt, tuple):
+                    self.prompt, self.prompt_data = self.prompt
+            if self.streaming:
+                response = self._stream_response()
+            else:
+                response = self.llm.invoke(self.prompt, **self.llm_kwargs)
             self.response_ready.emit(response)
         except Exception as e:
-            self.error_occurred.emit(str(e))
\ No newline at end of file
+            self.error_occurred.emit(str(e))
+
+    def _stream_response(self):
+        """Stream tokens from the LLM, coalescing them into periodic UI flushes."""
+        parts = []
+        pending = []
+        last_flush = 0.0  # Flush the very first token immediately
+
+        for token in self.llm.stream(self.prompt, **self.llm_kwargs):
+            if not token:
+                continue
+            parts.append(token)
+            pending.append(token)
+
+            now = time.monotonic()
+            if now - last_flush >= self.FLUSH_INTERVAL:
+                self.chunk_ready.emit("".join(pending))
+                pending.clear()
+                last_flush = now
+
+        if pending:
+            self.chunk_ready.emit("".join(pending))
+
+        return "".join(parts)
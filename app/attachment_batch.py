@@ -0,0 +1,213 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt6.QtCore import pyqtSignal, QThread
+
+from app import ingest
+
+# Never attached from a directory, whatever its .gitignore says
+DEFAULT_IGNORES = ['.git/', '.hg/', '.svn/', 'node_modules/', '__pycache__/', '.venv/', 'venv/',
+                   '.mypy_cache/', '.pytest_cache/', '.tox/', '*.pyc', '*.pyo', '.DS_Store']
+
+
+def _translate(pattern):
+    """Regular expression for a gitignore glob"""
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            out.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        else:
+            if pattern[i] == '\\' and i + 1 < len(pattern):
+                i += 1
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile(''.join(out) + r'\Z')
+
+
+class IgnoreRules:
+    """gitignore-style path filter.
+
+    Supports comments, negation with '!', directory-only patterns ending in
+    '/', patterns anchored by a '/' and '**'. Patterns read from a nested
+    .gitignore apply below its directory. As in git, the last matching
+    pattern wins.
+    """
+
+    def __init__(self, patterns=DEFAULT_IGNORES):
+        self._rules = []  # (base, regex, negate, dir_only, anchored)
+        self.add(patterns)
+
+    def add(self, patterns, base=''):
+        """Add patterns relative to base, a '/'-separated directory or ''"""
+        for line in patterns:
+            line = line.rstrip('\n')
+            if line.endswith(' ') and not line.endswith('\\ '):
+                line = line.rstrip(' ')
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = '/' in line
+            line = line.lstrip('/')
+            if line:
+                self._rules.append((base, _translate(line), negate, dir_only, anchored))
+
+    def add_file(self, path, base=''):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                self.add(f, base)
+        except OSError:
+            pass
+
+    def ignored(self, rel_path, is_dir=False):
+        """Whether rel_path, '/'-separated and relative to the root, is ignored"""
+        result = False
+        for base, regex, negate, dir_only, anchored in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + '/'):
+                    continue
+                path = rel_path[len(base) + 1:]
+            else:
+                path = rel_path
+            target = path if anchored else path.rsplit('/', 1)[-1]
+            if regex.match(target):
+                result = not negate
+        return result
+
+
+def collect_files(root, rules=None):
+    """Paths of the files under root that are not ignored, in sorted order.
+
+    Ignored directories are not descended into, and every .gitignore found
+    on the way is honoured.
+    """
+    rules = rules or IgnoreRules()
+    files = []
+    for directory, dirs, names in os.walk(root):
+        rel_dir = os.path.relpath(directory, root).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir
+        prefix = rel_dir + '/' if rel_dir else ''
+        if '.gitignore' in names:
+            rules.add_file(os.path.join(directory, '.gitignore'), rel_dir)
+        dirs[:] = sorted(d for d in dirs if not rules.ignored(prefix + d, is_dir=True))
+        for name in sorted(names):
+            if not rules.ignored(prefix + name):
+                files.append(os.path.join(directory, name))
+    return files
+
+
+class AttachBatchThread(QThread):
+    """Lists, reads and decodes many attachments on a thread pool.
+
+    paths may mix files and directories; directories are walked with
+    collect_files(). The head of each file is sniffed first, and text files
+    are taken in order while their size fits the token budget, so binary
+    files use none of it and the files that would not be sent are never
+    read whole.
+    loaded is emitted with the attached (path, Attachment) pairs and the
+    skipped (path, reason) pairs.
+    """
+
+    progress = pyqtSignal(int)
+    loaded = pyqtSignal(object, object)
+    error_occurred = pyqtSignal(str)
+
+    MAX_WORKERS = 16
+
+    def __init__(self, load, paths, token_budget):
+        super().__init__()
+        self.load = load  # path -> Attachment, e.g. AttachmentStore.load
+        self.paths = paths
+        self.token_budget = token_budget
+
+    def run(self):
+        try:
+            self._run()
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+    def _run(self):
+        files = []
+        for path in self.paths:
+            files.extend(collect_files(path) if os.path.isdir(path) else [path])
+
+        workers = min(self.MAX_WORKERS, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Plan with the size: a file never has more characters than bytes
+            planned, skipped = [], []
+            remaining = self.token_budget
+            for path, inspected in zip(files, pool.map(self._inspect, files)):
+                if isinstance(inspected, OSError):
+                    skipped.append((path, str(inspected)))
+                    continue
+                size, binary = inspected
+                if binary:
+                    skipped.append((path, "binary file"))
+                    continue
+                estimate = size // 4 + 1
+                if estimate > remaining:
+                    skipped.append((path, "over the token budget"))
+                    continue
+                planned.append(path)
+                remaining -= estimate
+
+            results = {}
+            done, reported = 0, -1
+            futures = {pool.submit(self.load, path): path for path in planned}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    skipped.append((path, str(e)))
+                done += 1
+                percent = done * 100 // len(planned)
+                if percent != reported:
+                    self.progress.emit(percent)
+                    reported = percent
+
+        attached = []
+        for path in planned:
+            attachment = results.get(path)
+            if attachment is None:
+                continue
+            if attachment.binary:
+                skipped.append((path, "binary file"))
+            else:
+                attached.append((path, attachment))
+        self.loaded.emit(attached, skipped)
+
+    @staticmethod
+    def _inspect(path):
+        """(size, is binary) of a file, or the OSError reading it raised"""
+        try:
+            return os.path.getsize(path), ingest.is_binary(path)
+        except OSError as e:
+            return e
@@ -0,0 +1,270 @@
+import math
+import re
+import threading
+
+import numpy as np
+from PyQt6.QtCore import pyqtSignal, QThread
+
+from app import ingest
+from app.context_builder import estimate_tokens, format_excerpts
+
+
+class Chunk:
+    __slots__ = ('name', 'start_line', 'end_line', 'text', 'digest')
+
+    def __init__(self, name, start_line, end_line, text, digest=None):
+        self.name = name
+        self.start_line = start_line  # 1-based, inclusive
+        self.end_line = end_line
+        self.text = text
+        self.digest = digest  # SHA-256 of the file, when it is stored
+
+    @property
+    def key(self):
+        """Identifies the excerpt across turns, or None for files not stored"""
+        if self.digest is None:
+            return None
+        return (self.digest, self.start_line, self.end_line)
+
+
+def chunk_text(name, text, chunk_chars=1500, overlap_lines=2):
+    """Split text into chunks of whole lines of about chunk_chars characters.
+
+    Consecutive chunks share overlap_lines lines so a passage cut at a chunk
+    boundary is still found whole in one of them. A line longer than a chunk
+    is a chunk of its own: lines are never split, so an excerpt is always
+    the lines start_line to end_line of the file and its key names it.
+    """
+    lines = list(enumerate(text.splitlines(), 1))  # (line number, text)
+
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end, size = start, 0
+        while end < len(lines) and (size == 0 or size + len(lines[end][1]) < chunk_chars):
+            size += len(lines[end][1]) + 1
+            end += 1
+        body = "\n".join(line for _, line in lines[start:end])
+        if body.strip():
+            chunks.append(Chunk(name, lines[start][0], lines[end - 1][0], body))
+        if end >= len(lines):
+            break
+        start = max(start + 1, end - overlap_lines)
+    return chunks
+
+
+def _terms(text):
+    return re.findall(r'\w+', text.lower())
+
+
+class AttachmentIndex:
+    """Chunks and embeds attached files, and retrieves the passages relevant to a question.
+
+    Only the best matching chunks, up to MAX_CONTEXT_TOKENS, go into the
+    prompt instead of the whole file. A small file is a single chunk ranked
+    like any other; only the small file last attached on its own is always
+    sent whole. When the embedding model is unavailable, chunks are ranked
+    by keyword overlap instead. Cosine similarities and keyword scores are
+    not on the same scale, so the two rankings are merged by reciprocal
+    rank fusion. add() may take a while on large files and runs on an
+    AttachmentIndexThread; retrieval runs on the response thread.
+
+    Files too large to chunk in memory are added with add_file() and
+    searched on disk at question time for lines containing its words.
+    """
+
+    TOP_K = 6
+    MAX_CONTEXT_TOKENS = 1024
+    # Files up to this size are kept as a single chunk
+    SMALL_FILE_TOKENS = 512
+    EMBED_BATCH = 64
+    # Lines of context around each line matched in a large file
+    GREP_CONTEXT = 3
+    # Reciprocal rank fusion constant: a chunk ranked r scores 1 / (RRF_K + r)
+    RRF_K = 60
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        # name -> (chunks, vectors or None, embedder name)
+        self._files = {}
+        # name -> path of files searched on disk
+        self._large_files = {}
+        # Small file always included, see add()
+        self._pinned = None
+
+    @property
+    def names(self):
+        with self._lock:
+            return list(self._files) + list(self._large_files)
+
+    def add(self, name, text, progress=None, digest=None, pin=False):
+        """Chunk and embed a file; returns the number of chunks.
+
+        pin marks a file the user attached on its own: when it is small it
+        is sent whole with every question, in place of the previously
+        pinned file.
+        """
+        embedder = self.embedder
+        vectors = None
+        small = estimate_tokens(text) <= self.SMALL_FILE_TOKENS
+        if small:
+            chunks = [Chunk(name, 1, max(1, len(text.splitlines())), text, digest)]
+        else:
+            chunks = chunk_text(name, text)
+            for chunk in chunks:
+                chunk.digest = digest
+        if chunks:
+            try:
+                parts = []
+                for start in range(0, len(chunks), self.EMBED_BATCH):
+                    batch = chunks[start:start + self.EMBED_BATCH]
+                    parts.append(embedder.embed([chunk.text for chunk in batch]))
+                    if progress is not None:
+                        progress(min(100, (start + len(batch)) * 100 // len(chunks)))
+                vectors = np.vstack(parts).astype(np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            except Exception:
+                vectors = None  # Ranked by keywords instead
+        with self._lock:
+            self._files[name] = (chunks, vectors, embedder.name)
+            if pin and small:
+                self._pinned = name
+            elif self._pinned == name:
+                self._pinned = None
+        return len(chunks)
+
+    def add_file(self, name, path):
+        """Add a large text file that is searched on disk instead of embedded"""
+        with self._lock:
+            self._files.pop(name, None)
+            self._large_files[name] = path
+            if self._pinned == name:
+                self._pinned = None
+
+    def remove(self, name):
+        with self._lock:
+            self._files.pop(name, None)
+            self._large_files.pop(name, None)
+            if self._pinned == name:
+                self._pinned = None
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._large_files.clear()
+            self._pinned = None
+
+    def retrieve(self, query, k=TOP_K, max_tokens=MAX_CONTEXT_TOKENS):
+        """Return the chunks most relevant to query, best first, within max_tokens"""
+        with self._lock:
+            files = list(self._files.items())
+            large_files = list(self._large_files.items())
+            pinned = self._pinned
+        if not files and not large_files:
+            return []
+
+        scored = []
+        by_vector, by_keyword = [], []
+        for name, path in large_files:
+            chunks = self._grep_chunks(name, path, query, k)
+            by_keyword.extend(zip(self._keyword_scores(query, chunks), chunks))
+        query_vector = None
+        embedding_failed = False
+        for name, (chunks, vectors, embedder_name) in files:
+            if name == pinned:
+                scored.extend((math.inf, chunk) for chunk in chunks)
+                continue
+            if vectors is not None and embedder_name == self.embedder.name and not embedding_failed:
+                if query_vector is None:
+                    try:
+                        query_vector = self.embedder.embed([query])[0]
+                    except Exception:
+                        # The embedding model went away since indexing
+                        embedding_failed = True
+                    else:
+                        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+                if query_vector is not None:
+                    by_vector.extend(zip((vectors @ query_vector).tolist(), chunks))
+                    continue
+            by_keyword.extend(zip(self._keyword_scores(query, chunks), chunks))
+
+        for ranking in (by_vector, by_keyword):
+            ranking.sort(key=lambda item: item[0], reverse=True)
+            # Chunks sharing no word with the query come after every match
+            scored.extend((1.0 / (self.RRF_K + rank) if score > 0 else 0.0, chunk)
+                          for rank, (score, chunk) in enumerate(ranking, 1))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        selected, used = [], 0
+        for score, chunk in scored:
+            if len(selected) == k:
+                break
+            tokens = estimate_tokens(chunk.text)
+            if used + tokens > max_tokens:
+                continue
+            selected.append(chunk)
+            used += tokens
+        return selected
+
+    def _grep_chunks(self, name, path, query, k):
+        """Chunks around the lines of a file on disk containing words of query"""
+        words = sorted({term for term in _terms(query) if len(term) > 2}, key=len, reverse=True)
+        if not words:
+            return []
+        pattern = b'|'.join(re.escape(word.encode('utf-8')) for word in words[:16])
+        try:
+            matches = ingest.grep(path, pattern, max_matches=k * 4, context=self.GREP_CONTEXT)
+        except OSError:
+            return []
+        return [Chunk(name, line, line + text.count("\n"), text) for line, text in matches]
+
+    @staticmethod
+    def _keyword_scores(query, chunks):
+        terms = set(_terms(query))
+        scores = []
+        for chunk in chunks:
+            words = _terms(chunk.text)
+            hits = sum(1 for word in words if word in terms)
+            scores.append(hits / math.sqrt(len(words) + 1))
+        return scores
+
+    def augment(self, prompt, query, shown=()):
+        """Prefix prompt with the attachment excerpts relevant to query.
+
+        Excerpts whose key is in shown are already in the context window and
+        are only referred to. Returns the prompt and the chunks used.
+        """
+        chunks = self.retrieve(query)
+        if not chunks:
+            return prompt, []
+        excerpts = [(chunk.key, chunk.name, chunk.start_line, chunk.end_line, chunk.text)
+                    for chunk in chunks]
+        return format_excerpts(excerpts, shown) + "\n\n" + prompt, chunks
+
+
+class AttachmentIndexThread(QThread):
+    """Indexes attached files off the GUI thread, one after the other"""
+
+    progress = pyqtSignal(int)
+    indexed = pyqtSignal(str, int)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, index, items, pin=False):
+        super().__init__()
+        self.index = index
+        self.items = items  # [(name, text, digest), ...]
+        self.pin = pin  # A single file attached on its own, see AttachmentIndex.add()
+
+    def run(self):
+        total = len(self.items)
+        for position, (name, text, digest) in enumerate(self.items):
+            if self.isInterruptionRequested():
+                break
+            try:
+                count = self.index.add(name, text, digest=digest, pin=self.pin,
+                                       progress=lambda percent: self.progress.emit(
+                                           (position * 100 + percent) // total))
+                self.indexed.emit(name, count)
+            except Exception as e:
+                self.error_occurred.emit(f"{name}: {e}")
+            self.progress.emit((position + 1) * 100 // total)
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from pygments.lexers import get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+from app import ingest
+from app.context_builder import estimate_tokens
+
+# Characters shown in the Files tab preview
+PREVIEW_CHARS = 1000
+
+
+def detect_language(name):
+    """Pygments alias for a file name, e.g. 'python', or '' when unknown"""
+    base = os.path.basename(name)
+    extension = os.path.splitext(base)[1].lower()
+    # Files without an extension are matched by name, e.g. Makefile
+    return _language_for('x' + extension if extension else base)
+
+
+@lru_cache(maxsize=512)
+def _language_for(name):
+    # Every pygments lookup scans the installed plugins, hence the cache
+    try:
+        return get_lexer_for_filename(name).aliases[0]
+    except (ClassNotFound, IndexError):
+        return ''
+
+
+class Attachment:
+    """What is known about one version of an attached file.
+
+    text is the full decoded content for files up to ingest.FULL_TEXT_LIMIT
+    and a head/tail summary for larger ones (large is then True); it is None
+    for binary files.
+    """
+
+    __slots__ = ('path', 'size', 'mtime_ns', 'binary', 'large', 'text',
+                 'language', 'tokens', 'digest')
+
+    def __init__(self, path, size, mtime_ns, binary=False, large=False, text=None,
+                 language='', tokens=0, digest=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.binary = binary
+        self.large = large
+        self.text = text
+        self.language = language
+        self.tokens = tokens
+        self.digest = digest
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def preview(self):
+        if self.text is None:
+            return None
+        return self.text[:PREVIEW_CHARS] + ("..." if len(self.text) > PREVIEW_CHARS else "")
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class AttachmentStore:
+    """Caches decoded attachments, keyed by path, size and modification time.
+
+    A file that has not changed since it was last loaded is served from
+    memory or from the on-disk cache without being read or decoded again.
+    The disk cache is a directory of JSON entries, trimmed least recently
+    used first to MAX_DISK_BYTES. A content hash is computed only when asked
+    for and is cached with the entry. The store is thread-safe.
+
+        store = AttachmentStore('chat_history.attachments')
+        attachment = store.load(path)
+        attachment.text, attachment.language, attachment.tokens
+    """
+
+    MEMORY_SIZE = 32
+    MAX_DISK_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        # key -> size of the entry file, least recently used first
+        self._disk = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+
+    @staticmethod
+    def fingerprint(path):
+        """Cache key for the current version of a file"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        source = f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return hashlib.sha1(source.encode('utf-8')).hexdigest(), path, stat
+
+    def load(self, path, with_digest=False):
+        """Return the Attachment for path, decoding the file only if it changed.
+
+        with_digest also fills in attachment.digest, except for large files.
+        """
+        key, path, stat = self.fingerprint(path)
+        with_digest = with_digest and stat.st_size <= ingest.FULL_TEXT_LIMIT
+        attachment = self._cached(key)
+        if attachment is None:
+            attachment = self.read(path, stat)
+        elif not (with_digest and attachment.digest is None):
+            return attachment
+        if with_digest:
+            attachment.digest = ingest.sha256(path)
+        self._save(key, attachment)
+        return attachment
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            keys = list(self._disk)
+            self._disk.clear()
+        for key in keys:
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _cached(self, key):
+        with self._lock:
+            attachment = self._memory.get(key)
+            if attachment is not None:
+                self._memory.move_to_end(key)
+                return attachment
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        try:
+            with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+                attachment = Attachment(**json.load(f))
+            os.utime(self._entry_path(key))  # Recency survives restarts
+        except (OSError, ValueError, TypeError):
+            with self._lock:
+                self._disk.pop(key, None)
+            return None
+        self._remember(key, attachment)
+        return attachment
+
+    @staticmethod
+    def read(path, stat=None):
+        """Read and decode a file without using the cache"""
+        stat = stat or os.stat(path)
+        binary = ingest.is_binary(path)
+        large = not binary and stat.st_size > ingest.FULL_TEXT_LIMIT
+        text = None
+        tokens = 0
+        if large:
+            text = ingest.summary_view(path)
+            tokens = stat.st_size // 4 + 1
+        elif not binary:
+            text = ingest.read_text(path)
+            tokens = estimate_tokens(text)
+        return Attachment(path, stat.st_size, stat.st_mtime_ns, binary, large, text,
+                          detect_language(path), tokens)
+
+    def _save(self, key, attachment):
+        self._remember(key, attachment)
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(attachment.to_dict(), f)
+            os.replace(temp_path, entry_path)
+            size = os.path.getsize(entry_path)
+        except OSError:
+            return  # Still cached in memory
+        with self._lock:
+            self._disk[key] = size
+            self._disk.move_to_end(key)
+            evicted = []
+            total = sum(self._disk.values())
+            while total > self.MAX_DISK_BYTES and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                total -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._entry_path(old_key))
+            except OSError:
+                pass
+
+    def _remember(self, key, attachment):
+        with self._lock:
+            self._memory[key] = attachment
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.MEMORY_SIZE:
+                self._memory.popitem(last=False)
@@ -1,51 +1,110 @@
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                           QHBoxLayout, QTextEdit, QPushButton, QScrollArea,
+                           QHBoxLayout, QTextEdit, QPushButton,
                            QComboBox, QLabel, QMessageBox, QStatusBar, QFileDialog,
                            QProgressBar, QSystemTrayIcon, QMenu, QLineEdit, QInputDialog,
                            QSplitter, QTabWidget, QToolButton, QListWidget, QDialog,
                            QListWidgetItem)
-from PyQt6.QtCore import Qt, pyqtSignal, QThread
+from PyQt6.QtCore import Qt, pyqtSignal, QThread, QTimer
 from PyQt6.QtGui import QKeySequence, QShortcut, QPixmap, QPainter, QFont, QIcon
 
-import sys
 import os
+import sys
 import json
-import markdown
 
 from datetime import datetime
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters import HtmlFormatter
-from langchain_ollama import OllamaLLM
 
-from model.database import ChatDatabase
 from app.settings_dialog import SettingsDialog
 from app.templates_manager import TemplateManager
-from app.message_bubble import MessageBubble
+from app.transcript_view import TranscriptView, ChatMessage
 from app.chatbot_translator import Translator
 from app.stt_worker import VoiceInputDialog
 from app.styles import get_sidebar_button_style, get_combo_style, get_button_style
 from app.ai_response import AIResponseThread
+from app.db_service import DatabaseService
+from app.context_builder import ContextBuilder, estimate_tokens
+from app.ollama_client import OllamaSessionClient
+from app.render_cache import RenderCache
+from app.renderer import MarkdownRenderer, IncrementalMarkdownRenderer
+from app.render_pool import RenderPool
+from app.themes import ThemeManager
+from app.embedding_service import EmbeddingService
+from app.vector_index import OllamaEmbedder
+from app.attachment_index import AttachmentIndex
+from app.attachment_store import AttachmentStore
+from app.file_handler import FileHandler
+from app.data_profiler import DataProfileThread
+from app.summarizer import Summarizer, SummarizeThread
+from app import ingest
 
 # Create a global translator instance
 translator = Translator()
 
 class ChatBotWindow(QMainWindow):
+    # Conversations per history page, and how close to the top (in pixels)
+    # the chat must be scrolled before the previous page is fetched
+    HISTORY_PAGE_SIZE = 25
+    HISTORY_PREFETCH_MARGIN = 200
+    # Typing pause before the chat search runs, and hits fetched at a time
+    SEARCH_DEBOUNCE_MS = 250
+    SEARCH_PAGE_SIZE = 200
+    # Pygments style used for fenced code blocks
+    CODE_STYLE = 'monokai'
+    # Template whose {input} is filled with a profile of the attached data file
+    DATA_TEMPLATE = "Data Analysis"
+    # Template whose input is summarized part by part when it exceeds the context
+    SUMMARIZE_TEMPLATE = "Summarize"
+    # Parts summarized at once; Ollama queues requests beyond OLLAMA_NUM_PARALLEL
+    SUMMARIZE_WORKERS = 4
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Madick Chatbot")
         self.setMinimumSize(800, 600)
         
-        # Initialize database
-        self.db = ChatDatabase()
+        # Initialize database; all queries run on the database thread
+        self.db = DatabaseService()
+        self.db.error_occurred.connect(self.update_status)
+        QApplication.instance().aboutToQuit.connect(self.shutdown_services)
         
         # Load settings
         self.settings = SettingsDialog.load_settings(self)
         
+        # Builds multi-turn prompts from the session history
+        self.context_builder = ContextBuilder(self.db, self.settings)
+        
+        # Rendered replies, reused across history loads and restarts
+        self.renderer = MarkdownRenderer(style=self.CODE_STYLE)
+        self.render_cache = RenderCache(self.db, self.renderer.render, style=self.CODE_STYLE)
+        # Markdown and highlighting run on worker threads, visible messages first
+        self.render_pool = RenderPool(self.render_cache, style=self.CODE_STYLE, parent=self)
+        
+        # Semantic history search; saved turns are embedded in the background
+        self.embedding_service = EmbeddingService(self.db, self._create_embedder())
+        self.embedding_service.error_occurred.connect(self.update_status)
+        self.embedding_service.index_new()
+        
+        # Attached files are indexed; only the parts relevant to a question are sent
+        self.attachment_index = AttachmentIndex(self._create_embedder())
+        # Decoded attachments, reused until the file changes on disk
+        self.attachment_store = AttachmentStore(os.path.splitext(self.db.db_path)[0] + '.attachments')
+        self.file_handler = FileHandler(self, self.attachment_index, self.attachment_store)
+        # session -> (Ollama context, keys of the attachment excerpts it holds).
+        # Only valid while the client still reuses that very context; once it
+        # is dropped the next prompt is rebuilt and quotes them again.
+        self.excerpts_in_context = {}
+        # Profiles attached data files for the Data Analysis template
+        self.profile_thread = None
+        
         # Available models
         self.models = ["llama3.2:1b", "deepseek-r1", "mistral:7b"]
         self.current_model = self.settings.get('default_model', "llama3.2:1b")
-        self.llm = OllamaLLM(model=self.current_model)
+        self.llm = OllamaSessionClient(
+            model=self.current_model,
+            base_url=self.settings.get('api_url', 'http://localhost:11434'),
+            temperature=float(self.settings.get('temperature', 70)) / 100.0,
+            system_prompt=self.settings.get('system_prompt', ''),
+            max_context_tokens=self.context_builder.token_budget
+        )
         
         self.get_combo_style = get_combo_style()
         self.get_button_style1 = get_button_style("#d32f2f")
@@ -96,11 +155,12 @@ class ChatBotWindow(QMainWindow):
         self.current_session = "Default"
         self.sessions = ["Default"]
         
-        # Message bubbles container
-        self.message_bubbles = []
-        
         # Setup UI
         self.setup_splitter_ui()
+        self.apply_theme(self.current_theme)
+        
+        # Sessions persist in the database across restarts
+        self.db.read('get_sessions', callback=self._add_stored_sessions)
         
         # Load chat history
         self.load_chat_history()
@@ -111,6 +171,13 @@ class ChatBotWindow(QMainWindow):
         with open('settings.json', 'w') as f:
             json.dump(self.settings, f)
             
+    def _add_stored_sessions(self, sessions):
+        """Offer the sessions found in the database in the session selector"""
+        for name in sessions:
+            if name not in self.sessions:
+                self.sessions.append(name)
+                self.session_combo.addItem(name)
+
     def setup_system_tray(self):
         self.tray_icon = QSystemTrayIcon(self)
         try:
@@ -164,6 +231,10 @@ class ChatBotWindow(QMainWindow):
         # Add settings shortcut (Ctrl+,)
         settings_shortcut = QShortcut(QKeySequence("Ctrl+,"), self)
         settings_shortcut.activated.connect(self.open_settings)
+        
+        # Cancel a long summary (Esc)
+        cancel_shortcut = QShortcut(QKeySequence("Esc"), self)
+        cancel_shortcut.activated.connect(self.cancel_summary)
 
     def setup_splitter_ui(self):
         main_widget = QWidget()
@@ -381,40 +452,18 @@ class ChatBotWindow(QMainWindow):
         
         chat_tab_layout.addLayout(model_layout)
         
-        # Chat messages scroll area
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.scroll_area.setStyleSheet("""
-            QScrollArea {
-                border: none;
-                background-color: #2b2b2b;
-            }
-            QScrollBar:vertical {
-                border: none;
-                background: #2b2b2b;
-                width: 10px;
-                margin: 0px;
-            }
-            QScrollBar::handle:vertical {
-                background: #666666;
-                min-height: 20px;
-                border-radius: 5px;
-            }
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                border: none;
-                background: none;
-            }
-        """)
-        
-        self.chat_container = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_container)
-        self.chat_layout.setContentsMargins(5, 5, 5, 5)
-        self.chat_layout.setSpacing(15)
-        self.chat_layout.addStretch()
+        # Chat transcript; only the visible messages are laid out and painted
+        self.chat_view = TranscriptView(chat_window=self, render_pool=self.render_pool,
+                                        code_css=self.renderer.css)
+        chat_tab_layout.addWidget(self.chat_view)
         
-        self.scroll_area.setWidget(self.chat_container)
-        chat_tab_layout.addWidget(self.scroll_area)
+        # Older history is paged in as the user scrolls towards the top
+        self._history_cursor = None
+        self._history_exhausted = True
+        self._loading_history_page = False
+        self._page_inserted = False  # Check for paging once the page is laid out
+        self.chat_view.verticalScrollBar().valueChanged.connect(self._on_chat_scrolled)
+        self.chat_view.verticalScrollBar().rangeChanged.connect(self._on_chat_range_changed)
         
         # Input area with controls
         input_container = QWidget()
@@ -426,8 +475,8 @@ class ChatBotWindow(QMainWindow):
         
         file_btn = QToolButton()
         file_btn.setText("📎")
-        file_btn.setToolTip("Attach File")
-        file_btn.clicked.connect(self.attach_file)
+        file_btn.setToolTip("Attach Files")
+        file_btn.clicked.connect(self.attach_files)
         
         voice_btn = QToolButton()
         voice_btn.setText("🎤")
@@ -517,11 +566,47 @@ class ChatBotWindow(QMainWindow):
             padding: 5px;
             }
         """)
-        self.search_input.textChanged.connect(self.search_chat)
+        # Search once typing pauses, against every turn of the session in the database
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_chat)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        # Enter walks back from the most recent hit, fetching older ones as needed
+        self.search_input.returnPressed.connect(self.previous_search_hit)
+        
+        self.search_count_label = QLabel()
+        self.search_count_label.setStyleSheet("color: #bbbbbb;")
+        self.search_prev_btn = QToolButton()
+        self.search_prev_btn.setText("▲")
+        self.search_prev_btn.setToolTip(translator.tr('previous_match'))
+        self.search_prev_btn.clicked.connect(self.previous_search_hit)
+        self.search_next_btn = QToolButton()
+        self.search_next_btn.setText("▼")
+        self.search_next_btn.setToolTip(translator.tr('next_match'))
+        self.search_next_btn.clicked.connect(self.next_search_hit)
+        self._search_query = ""
+        self._search_hits = []          # (id, ts) of matching turns, newest first
+        self._search_hit_ids = set()
+        self._search_index = -1
+        self._search_hit_pending = False
+        self._search_exhausted = True   # Every hit is in _search_hits
+        self._search_loading = False
+        self._update_search_count()
         
         search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_count_label)
+        search_layout.addWidget(self.search_prev_btn)
+        search_layout.addWidget(self.search_next_btn)
         history_layout.addLayout(search_layout)
         
+        # Semantic search: finds conversations by meaning rather than exact words
+        self.semantic_input = QLineEdit()
+        self.semantic_input.setPlaceholderText(translator.tr('semantic_placeholder'))
+        self.semantic_input.setStyleSheet(self.search_input.styleSheet())
+        self.semantic_input.returnPressed.connect(self.semantic_search)
+        history_layout.addWidget(self.semantic_input)
+        
         # Enhanced history list with better visualization
         self.history_list = QListWidget()
         self.history_list.setStyleSheet("""
@@ -546,17 +631,7 @@ class ChatBotWindow(QMainWindow):
         """)
         
         # Load and display chat history with more details
-        conversations = self.db.get_recent_conversations(self.current_session)
-        for conv in conversations:
-            id, timestamp, model, user_msg, ai_resp = conv
-            item = QListWidgetItem()
-            # Show more detailed preview
-            preview = f"[{timestamp}] {model}\nUser: {user_msg[:50]}..."
-            if ai_resp:
-                preview += f"\nAI: {ai_resp[:50]}..."
-            item.setText(preview)
-            item.setData(Qt.ItemDataRole.UserRole, id)
-            self.history_list.addItem(item)
+        self.update_history_list()
             
         self.history_list.itemDoubleClicked.connect(self.load_history_item)
         history_layout.addWidget(self.history_list)
@@ -585,12 +660,17 @@ class ChatBotWindow(QMainWindow):
         
         files_layout.addWidget(QLabel("Uploaded Files"))
         self.files_list = QListWidget()
+        self.files_list.itemDoubleClicked.connect(lambda item: self.file_handler.view_file(item.text()))
         files_layout.addWidget(self.files_list)
         
-        upload_btn = QPushButton("📎 Upload File")
-        upload_btn.clicked.connect(self.attach_file)
+        upload_btn = QPushButton("📎 Upload Files")
+        upload_btn.clicked.connect(self.attach_files)
         files_layout.addWidget(upload_btn)
         
+        upload_folder_btn = QPushButton("📂 Upload Folder")
+        upload_folder_btn.clicked.connect(self.attach_directory)
+        files_layout.addWidget(upload_folder_btn)
+        
         # Add tabs to tab widget
         self.tabs.addTab(self.chat_tab, "Chat")
         self.tabs.addTab(self.templates_tab, "Templates")
@@ -716,6 +796,11 @@ class ChatBotWindow(QMainWindow):
             
         # Get template from template manager
         template = self.template_manager.get_template(template_name)
+        if template and template_name == self.DATA_TEMPLATE:
+            data_file = self.file_handler.latest_data_file()
+            if data_file:
+                self._profile_into_template(template, data_file)
+                return
         if template:
             # Replace {input} with cursor position marker
             template = template.replace("{input}", "")
@@ -729,6 +814,29 @@ class ChatBotWindow(QMainWindow):
                 cursor.setPosition(position)
                 self.input_box.setTextCursor(cursor)
 
+    def _profile_into_template(self, template, path):
+        """Fill a template with a profile of a data file, computed on a worker thread"""
+        if self.profile_thread is not None and self.profile_thread.isRunning():
+            self.update_status("Still profiling the previous file...")
+            return
+        file_name = os.path.basename(path)
+        self.profile_thread = DataProfileThread(path)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.profile_thread.progress.connect(self.progress_bar.setValue)
+        self.profile_thread.profiled.connect(lambda profile: self._show_profile(template, profile))
+        self.profile_thread.error_occurred.connect(
+            lambda e: self.update_status(f"Error profiling {file_name}: {e}"))
+        self.profile_thread.finished.connect(self.progress_bar.reset)
+        self.profile_thread.finished.connect(lambda: self.progress_bar.setVisible(False))
+        self.update_status(f"Profiling {file_name}...")
+        self.profile_thread.start()
+
+    def _show_profile(self, template, profile):
+        self.input_box.setPlainText(template.replace("{input}", profile))
+        self.input_box.setFocus()
+        self.update_status("Data profile ready")
+
     def create_custom_template(self):
         """Create a new custom template."""
         name, ok = QInputDialog.getText(self, "New Template", "Template Name:")
@@ -785,46 +893,16 @@ class ChatBotWindow(QMainWindow):
             self.set_dark_theme()
 
     def set_dark_theme(self):
-        self.current_theme = "dark"
-        self.setStyleSheet("""
-            QMainWindow { background-color: #1e1e1e; }
-            QWidget { background-color: #1e1e1e; }
-        """)
+        self.apply_theme("dark")
 
     def set_light_theme(self):
-        self.current_theme = "light"
-        self.setStyleSheet("""
-            QMainWindow { background-color: #f5f5f5; }
-            QWidget { background-color: #f5f5f5; color: #2c3e50; }
-            QLabel { color: #2c3e50; }
-            QPushButton { 
-                background-color: #e0e0e0; 
-                color: #2c3e50;
-                border: 1px solid #bdbdbd;
-            }
-            QPushButton:hover {
-                background-color: #d5d5d5;
-            }
-            QTextEdit {
-                background-color: white;
-                color: #2c3e50;
-                border: 1px solid #bdbdbd;
-            }
-            QComboBox {
-                background-color: white;
-                color: #2c3e50;
-                border: 1px solid #bdbdbd;
-            }
-            QListWidget {
-                background-color: white;
-                color: #2c3e50;
-                border: 1px solid #bdbdbd;
-            }
-            QStatusBar {
-                background-color: #e0e0e0;
-                color: #2c3e50;
-            }
-        """)
+        self.apply_theme("light")
+
+    def apply_theme(self, theme):
+        """Switch theme through the application stylesheet, without re-parsing QSS"""
+        self.current_theme = theme
+        ThemeManager.apply_theme(QApplication.instance(), self, theme)
+        self.chat_view.message_delegate.set_theme(theme)
 
     def create_new_session(self):
         name, ok = QInputDialog.getText(self, "New Session", "Enter session name:")
@@ -851,17 +929,129 @@ class ChatBotWindow(QMainWindow):
             self.current_session = "Default"
 
     def search_chat(self):
-        search_text = self.search_input.text().lower()
-        
-        # Reset all message highlights
-        for bubble in self.message_bubbles:
-            content = bubble.content.toPlainText()
-            base_style = bubble.styleSheet().replace("border: 2px solid #FFEB3B;", "")
-            
-            if search_text and search_text in content.lower():
-                bubble.setStyleSheet(base_style + " border: 2px solid #FFEB3B;")
-            else:
-                bubble.setStyleSheet(base_style)
+        """Find every turn of the current session that matches the search text"""
+        query = self.search_input.text().strip()
+        session = self.current_session
+        self._search_query = query
+        if not query:
+            self._show_search_hits(session, query, [])
+            return
+        self._search_loading = True
+        self.db.read('find_conversations', query, session, self.SEARCH_PAGE_SIZE,
+                     callback=lambda hits: self._show_search_hits(session, query, hits),
+                     on_error=lambda error: self._search_failed(session, query))
+
+    def _show_search_hits(self, session, query, hits, more=False):
+        """Show the newest page of hits, or with more an older page of them"""
+        if session != self.current_session or query != self._search_query:
+            return  # A newer search has been started
+        self._search_loading = False
+        self._search_exhausted = len(hits) < self.SEARCH_PAGE_SIZE
+        if more:
+            self._search_hits.extend(hits)
+            self._search_hit_ids.update(hit[0] for hit in hits)
+            if not hits:
+                self._update_search_count()
+                return
+            self._search_index += 1  # The step that asked for this page
+        else:
+            self._search_hits = hits
+            self._search_hit_ids = {hit[0] for hit in hits}
+            self._search_index = 0  # Start from the most recent hit
+        
+        # Highlight the hits that are already loaded
+        for message in self.chat_view.transcript.messages:
+            message.highlighted = message.conversation_id in self._search_hit_ids
+        self.chat_view.transcript.all_changed()
+        
+        self._update_search_count()
+        if hits:
+            self._go_to_search_hit()
+
+    def _search_failed(self, session, query):
+        if session == self.current_session and query == self._search_query:
+            self._search_loading = False
+
+    def _update_search_count(self):
+        total = len(self._search_hits)
+        if not self._search_query:
+            self.search_count_label.setText("")
+        elif not self._search_hits:
+            self.search_count_label.setText(translator.tr('no_matches'))
+        else:
+            # Hits are counted from the most recent one
+            self.search_count_label.setText(translator.tr(
+                'search_hits', current=self._search_index + 1,
+                total=total if self._search_exhausted else f"{total}+"))
+        self.search_prev_btn.setEnabled(total > 1 or not self._search_exhausted)
+        self.search_next_btn.setEnabled(total > 1)
+
+    def next_search_hit(self):
+        """Go to the next more recent hit"""
+        self._step_search_hit(-1)
+
+    def previous_search_hit(self):
+        """Go to the next older hit"""
+        self._step_search_hit(1)
+
+    def _step_search_hit(self, step):
+        if not self._search_hits or self._search_loading:
+            return
+        index = self._search_index + step
+        if index >= len(self._search_hits) and not self._search_exhausted:
+            # Past the oldest hit fetched so far: fetch the page before it
+            session, query = self.current_session, self._search_query
+            before_id, before_ts = self._search_hits[-1]
+            self._search_loading = True
+            self.db.read('find_conversations', query, session, self.SEARCH_PAGE_SIZE, before_ts, before_id,
+                         callback=lambda hits: self._show_search_hits(session, query, hits, more=True),
+                         on_error=lambda error: self._search_failed(session, query))
+            return
+        if index < 0 and not self._search_exhausted:
+            return  # The oldest hit isn't known yet; don't wrap around
+        self._search_index = index % len(self._search_hits)
+        self._update_search_count()
+        self._go_to_search_hit()
+
+    def _go_to_search_hit(self):
+        """Scroll the chat to the current hit, paging it in if it isn't loaded"""
+        if not self._search_hits:
+            return
+        hit_id, hit_ts = self._search_hits[self._search_index]
+        row = self.chat_view.transcript.row_of_conversation(hit_id)
+        if row >= 0:
+            self.chat_view.scroll_to_row(row)
+            return
+        if self._loading_history_page:
+            # Retried once the page being loaded is in
+            self._search_hit_pending = True
+            return
+        if self._history_cursor is None or (hit_ts, hit_id) >= self._history_cursor:
+            return  # Not part of the loaded range, e.g. saved after the last page load
+        
+        # Load everything between the oldest loaded turn and the hit in one go
+        session = self.current_session
+        before_ts, before_id = self._history_cursor
+        self._loading_history_page = True
+        self.db.read('get_range', session, hit_ts, hit_id, before_ts, before_id,
+                     callback=lambda rows: self._prefetch_rendered(
+                         rows, lambda: self._show_search_range(session, rows, hit_id)),
+                     on_error=lambda error: self._history_page_failed(session))
+
+    def _show_search_range(self, session, rows, hit_id):
+        if session != self.current_session:
+            return
+        # The range ends at the hit, not at a page boundary
+        exhausted = self._history_exhausted
+        self._insert_history_page(rows, at_top=True)
+        self._history_exhausted = exhausted
+        # Scroll once the new rows have been laid out
+        QTimer.singleShot(0, lambda: self._scroll_to_conversation(hit_id))
+
+    def _scroll_to_conversation(self, conversation_id):
+        row = self.chat_view.transcript.row_of_conversation(conversation_id)
+        if row >= 0:
+            self.chat_view.scroll_to_row(row)
 
     def show_shortcuts(self):
         shortcuts = """
@@ -873,6 +1063,7 @@ class ChatBotWindow(QMainWindow):
         <tr><td><b>Ctrl+F</b></td><td>Focus search</td></tr>
         <tr><td><b>Ctrl+T</b></td><td>Toggle theme</td></tr>
         <tr><td><b>Ctrl+N</b></td><td>New session</td></tr>
+        <tr><td><b>Esc</b></td><td>Cancel a long summary</td></tr>
         </table>
         """
         QMessageBox.information(self, "Keyboard Shortcuts", shortcuts)
@@ -884,11 +1075,15 @@ class ChatBotWindow(QMainWindow):
             
         timestamp = datetime.now().strftime("%H:%M:%S")
         
-        # Create and add user message bubble
-        user_bubble = MessageBubble(is_user=True, chat_window=self)
-        user_bubble.set_content(user_message, timestamp)
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, user_bubble)
-        self.message_bubbles.append(user_bubble)
+        # A document too long for one prompt is shown and stored as a short
+        # line, so it doesn't crowd later prompts out of the history
+        summary_request = self._summary_request(user_message)
+        if summary_request is not None:
+            document, user_message = summary_request
+        
+        # Add the user message to the transcript
+        self.current_user_chat_message = ChatMessage('user', user_message, timestamp=timestamp)
+        self.add_chat_message(self.current_user_chat_message)
         
         self.progress_bar.setVisible(True)
         self.send_button.setEnabled(False)
@@ -897,99 +1092,209 @@ class ChatBotWindow(QMainWindow):
         # Store user message for later use
         self.current_user_message = user_message
         
+        # When Ollama's context from the previous turn is still valid it already
+        # holds the conversation, so only the new message needs to be sent.
+        # Otherwise rebuild the history within the token budget; the system
+        # prompt is passed separately by the client. Excerpts of attached
+        # files relevant to the message are put in front, except those the
+        # context already holds, which are only referred to. The prompt is
+        # built on the response thread, which may wait on the database and
+        # on the embedding model.
+        session = self.current_session
+        context = self.llm.get_context(session)
+        reuse_context = context is not None
+        held = self.excerpts_in_context.get(session)
+        shown_before = held[1] if held is not None and held[0] is context else set()
+        
+        def prompt():
+            if reuse_context:
+                text, shown = user_message, shown_before
+            else:
+                text, shown = self.context_builder.build_with_excerpts(
+                    session, user_message, include_system=False)
+            text, chunks = self.attachment_index.augment(text, user_message, shown)
+            # Handed to handle_ai_response with the reply, see AIResponseThread
+            return text, (session, shown | {c.key for c in chunks if c.key}, chunks)
+        
         # Create and start response thread
-        self.response_thread = AIResponseThread(self.llm, user_message)
+        streaming = self.settings.get('streaming', False)
+        if summary_request is not None:
+            # Summarized part by part with stateless requests. Ollama's context
+            # for the session won't hold this turn, so the next message is
+            # sent with the history rebuilt from the database, summary included.
+            self.llm.reset(session)
+            summarizer = Summarizer(self.llm, max(256, self.context_builder.token_budget - 512),
+                                    self.SUMMARIZE_WORKERS)
+            self.response_thread = SummarizeThread(summarizer, document, streaming=streaming)
+            self.progress_bar.setValue(0)
+            self.response_thread.progress.connect(self.progress_bar.setValue)
+            self.response_thread.finished.connect(self.progress_bar.reset)
+            self.update_status("Summarizing... (Esc to cancel)")
+        else:
+            self.response_thread = AIResponseThread(self.llm, prompt, streaming=streaming,
+                                                    session=self.current_session)
+        self.response_thread.chunk_ready.connect(self.handle_ai_chunk)
         self.response_thread.response_ready.connect(self.handle_ai_response)
         self.response_thread.error_occurred.connect(self.handle_ai_error)
         self.response_thread.finished.connect(self.on_response_complete)
         self.response_thread.start()
         
         self.input_box.clear()
-        
-        # Scroll to bottom
-        self.scroll_area.verticalScrollBar().setValue(
-            self.scroll_area.verticalScrollBar().maximum()
-        )
     
+    def _summary_request(self, user_message):
+        """(document, short message) for the map-reduce summarizer, or None to send as usual.
+
+        Applies to messages written from the Summarize template whose text is
+        more than half the context budget. With the template left empty, the
+        latest attached text file is summarized, read in full on the thread.
+        """
+        template = self.template_manager.get_template(self.SUMMARIZE_TEMPLATE)
+        prefix = template.split("{input}")[0].strip()
+        if not prefix or not user_message.startswith(prefix):
+            return None
+        text = user_message[len(prefix):].strip()
+        if not text:
+            path = self.file_handler.latest_text_file()
+            if not path:
+                return None
+            size = os.path.getsize(path)
+            return (lambda: ingest.read_text(path),
+                    f"{prefix}\n\n[Attached file: {os.path.basename(path)}, {size:,} bytes]")
+        tokens = estimate_tokens(text)
+        if tokens <= self.context_builder.token_budget // 2:
+            return None
+        return text, f"{prefix}\n\n[Pasted text, ~{tokens:,} tokens]"
+
+    def cancel_summary(self):
+        """Stop a map-reduce summary; the parts already sent still complete"""
+        thread = getattr(self, 'response_thread', None)
+        if isinstance(thread, SummarizeThread) and thread.isRunning():
+            thread.requestInterruption()
+            self.update_status("Cancelling the summary...")
+
+    def add_chat_message(self, message):
+        """Append a message to the transcript and scroll it into view"""
+        row = self.chat_view.transcript.append_message(message)
+        self.chat_view.scrollToBottom()
+        return row
+
+    def add_chat_messages(self, messages, at_top=False):
+        """Insert a batch of messages with one model insertion and one layout pass"""
+        self.chat_view.setUpdatesEnabled(False)
+        try:
+            if at_top:
+                self.chat_view.transcript.prepend_messages(messages)
+            else:
+                self.chat_view.transcript.append_messages(messages)
+        finally:
+            self.chat_view.setUpdatesEnabled(True)
+
+    def handle_ai_chunk(self, chunk):
+        """Append a batch of streamed tokens to the in-progress AI message"""
+        if not hasattr(self, 'current_ai_message'):
+            self.current_ai_message = ChatMessage('ai', "", timestamp=datetime.now().strftime("%H:%M:%S"))
+            self.current_ai_message.stream = IncrementalMarkdownRenderer(self.renderer)
+            self.add_chat_message(self.current_ai_message)
+            self.update_status("Receiving AI response...")
+        
+        # Only the block still being written is rendered and laid out again
+        self.current_ai_message.text += chunk
+        self.current_ai_message.stream.feed(chunk)
+        self.chat_view.message_resized(self.chat_view.transcript.row_of(self.current_ai_message))
+        
+        # Keep the latest tokens in view
+        self.chat_view.scrollToBottom()
+
     def handle_ai_response(self, response):
         timestamp = datetime.now().strftime("%H:%M:%S")
         
-        # Create new AI response bubble
-        ai_bubble = MessageBubble(is_user=False, chat_window=self)
-        ai_bubble.set_content(self.format_response(response), timestamp)
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, ai_bubble)
-        self.message_bubbles.append(ai_bubble)         
+        if hasattr(self, 'current_ai_message'):
+            # Streamed reply: the preview stays up until the full rendering replaces it
+            message = self.current_ai_message
+            message.text = response
+            message.needs_render = True
+            self.chat_view.message_resized(self.chat_view.transcript.row_of(message))
+        else:
+            message = ChatMessage('ai', response, timestamp=timestamp, needs_render=True)
+            self.add_chat_message(message)
+        self.render_pool.request(message, RenderPool.LATEST)
 
-        self.db.save_conversation(self.current_model, self.current_user_message, response, self.current_session)
+        # Tag the turn with its row id so search hits can be matched to it
+        turn = [m for m in (getattr(self, 'current_user_chat_message', None), message) if m is not None]
+        excerpts = []
+        prompt_data = getattr(self.response_thread, 'prompt_data', None)
+        if prompt_data is not None:
+            session, shown, chunks = prompt_data
+            # The context the client stored with this reply now holds them
+            context = self.llm.get_context(session)
+            if context is not None:
+                self.excerpts_in_context[session] = (context, shown)
+            else:
+                self.excerpts_in_context.pop(session, None)
+            excerpts = [(c.digest, c.name, c.start_line, c.end_line) for c in chunks if c.key]
+        self.db.write('save_conversation', self.current_model, self.current_user_message,
+                      response, self.current_session,
+                      callback=lambda conversation_id: self._on_conversation_saved(
+                          turn, conversation_id, excerpts))
         
         # Update history list if we're in the history tab
         if self.tabs.currentWidget() == self.history_tab:
             self.update_history_list()
             
         # Scroll to bottom
-        self.scroll_area.verticalScrollBar().setValue(
-            self.scroll_area.verticalScrollBar().maximum()
-        )
+        self.chat_view.scrollToBottom()
+
+    def _on_conversation_saved(self, messages, conversation_id, excerpts=()):
+        for message in messages:
+            message.conversation_id = conversation_id
+        if excerpts:
+            # The file contents are stored once; the turn only points at them
+            self.db.write('link_attachments', conversation_id, excerpts)
+        self.embedding_service.index_new()
 
     def handle_ai_error(self, error_message):
-        # Create error message bubble
-        error_bubble = MessageBubble(is_user=False)
-        error_bubble.setStyleSheet("""
-            QFrame {
-                background-color: #d32f2f;
-                border-radius: 10px;
-                margin-left: 10px;
-                margin-right: 80px;
-                padding: 10px;
-            }
-        """)
-        error_bubble.set_content(f"Error: {error_message}")
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, error_bubble)
-        self.message_bubbles.append(error_bubble)
+        # Add error message
+        self.add_chat_message(ChatMessage('error', f"Error: {error_message}",
+                                          timestamp=datetime.now().strftime("%H:%M:%S")))
 
     def on_response_complete(self):
         self.progress_bar.setVisible(False)
         self.send_button.setEnabled(True)
         self.update_status("Ready")
-        if hasattr(self, 'current_ai_bubble'):
-            delattr(self, 'current_ai_bubble')
+        if hasattr(self, 'current_ai_message'):
+            message = self.current_ai_message
+            if message.stream is not None:
+                # Ended without a reply, e.g. on an error: keep what was shown
+                message.html = message.stream.html()
+                message.stream = None
+            delattr(self, 'current_ai_message')
 
     def format_response(self, text):
-        # Convert markdown to HTML
-        html = markdown.markdown(text)
-        
-        # Find and highlight code blocks
-        code_blocks = text.split("```")
-        for i in range(1, len(code_blocks), 2):
-            try:
-                lang = code_blocks[i].split("\n")[0]
-                code = "\n".join(code_blocks[i].split("\n")[1:])
-                lexer = get_lexer_by_name(lang, stripall=True)
-                formatted_code = highlight(code, lexer, HtmlFormatter(style='monokai'))
-                html = html.replace(code_blocks[i], formatted_code)
-            except:
-                continue
-                
-        return html
+        """Return the HTML for a reply, rendered at most once per distinct text"""
+        return self.render_cache.get(text)
 
     def export_chat(self):
         filename, _ = QFileDialog.getSaveFileName(
             self, "Export Chat History", "", "JSON Files (*.json);;Text Files (*.txt)")
         if filename:
-            conversations = self.db.get_recent_conversations()
-            if filename.endswith('.json'):
-                with open(filename, 'w') as f:
-                    json.dump([{
-                        'timestamp': conv[1],
-                        'model': conv[2],
-                        'user_message': conv[3],
-                        'ai_response': conv[4]
-                    } for conv in conversations], f, indent=2)
-            else:
-                with open(filename, 'w') as f:
-                    for conv in conversations:
-                        f.write(f"Time: {conv[1]}\nModel: {conv[2]}\n")
-                        f.write(f"User: {conv[3]}\nAI: {conv[4]}\n\n")
+            self.db.read('get_recent_conversations',
+                         callback=lambda conversations: self._write_export(filename, conversations))
+
+    def _write_export(self, filename, conversations):
+        """Write the conversations loaded for export_chat to filename"""
+        if filename.endswith('.json'):
+            with open(filename, 'w') as f:
+                json.dump([{
+                    'timestamp': conv[1],
+                    'model': conv[2],
+                    'user_message': conv[3],
+                    'ai_response': conv[4]
+                } for conv in conversations], f, indent=2)
+        else:
+            with open(filename, 'w') as f:
+                for conv in conversations:
+                    f.write(f"Time: {conv[1]}\nModel: {conv[2]}\n")
+                    f.write(f"User: {conv[3]}\nAI: {conv[4]}\n\n")
 
     def update_status(self, message):
         self.status_bar.showMessage(message)
@@ -1007,35 +1312,23 @@ class ChatBotWindow(QMainWindow):
             api_base = self.settings.get('api_url', 'http://localhost:11434')
             temperature = float(self.settings.get('temperature', 70)) / 100.0  # Convert from 0-100 to 0-1
             
-            # Create LLM with settings
-            self.llm = OllamaLLM(
+            # Point the client at the new model. The session's context can't
+            # be reused by it, nor by this model later, once the other one
+            # has answered turns that aren't in it
+            self.llm.configure(
                 model=model_name,
                 base_url=api_base,
                 temperature=temperature
             )
-            
-            # Add system message bubble
-            system_bubble = MessageBubble(is_user=False, chat_window=self)
-            system_bubble.setStyleSheet("""
-                QFrame {
-                    background-color: #ff9800;
-                    border-radius: 10px;
-                    margin-left: 10px;
-                    margin-right: 80px;
-                    padding: 10px;
-                }
-            """)
+            self.llm.reset(self.current_session)
+            self.excerpts_in_context.pop(self.current_session, None)
             
             # Use translator for the message
             msg = translator.tr('switched_model', model=model_name)
-            system_bubble.set_content(msg)
-            self.chat_layout.insertWidget(self.chat_layout.count() - 1, system_bubble)
-            self.message_bubbles.append(system_bubble)
             
-            # Scroll to the new message
-            self.scroll_area.verticalScrollBar().setValue(
-                self.scroll_area.verticalScrollBar().maximum()
-            )
+            # Add system message and scroll to it
+            self.add_chat_message(ChatMessage('system', msg,
+                                              timestamp=datetime.now().strftime("%H:%M:%S")))
             
             # Update status bar with translated message
             self.update_status(msg)
@@ -1280,41 +1573,131 @@ class ChatBotWindow(QMainWindow):
                                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         
         if reply == QMessageBox.StandardButton.Yes:
-            # Clear all message bubbles
-            while self.chat_layout.count() > 1:  # Keep the stretch at the end
-                item = self.chat_layout.takeAt(0)
+            # Clear all messages from the view
+            self.chat_view.transcript.clear()
     
     def load_chat_history(self):
-        """Load chat history from database"""
+        """Load the newest page of the current session's history from the database"""
+        session = self.current_session
+        self._history_cursor = None
+        self._history_exhausted = False
+        self._loading_history_page = True
+        self.db.read('get_page', session, None, self.HISTORY_PAGE_SIZE,
+                     callback=lambda rows: self._prefetch_rendered(rows, lambda: self._show_chat_history(session, rows)),
+                     on_error=lambda error: self._history_page_failed(session))
+
+    def _prefetch_rendered(self, rows, callback):
+        """Load stored renderings of a page's replies before it is shown"""
+        self.render_cache.prefetch([row[4] for row in rows], callback)
+
+    def _show_chat_history(self, session, rows):
+        """Replace the chat view with the first page loaded by load_chat_history"""
+        if session != self.current_session:
+            return  # The user switched sessions while the query was queued
+        
         # Clear existing messages
-        while self.chat_layout.count() > 1:  # Keep the stretch at the end
-            item = self.chat_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        
-        conversations = self.db.get_recent_conversations(self.current_session)
-        for conv in conversations[::-1]:  # Display in chronological order
-            _, timestamp, model, user_msg, ai_resp, session = conv
-            
-            # Create user message bubble
-            user_bubble = MessageBubble(is_user=True)
-            user_bubble.set_content(user_msg, timestamp)
-            self.chat_layout.insertWidget(self.chat_layout.count() - 1, user_bubble)
-            
-            # Create AI response bubble
-            ai_bubble = MessageBubble(is_user=False)
-            if ai_resp is not None:
-                ai_bubble.set_content(self.format_response(ai_resp), timestamp)
-            else:
-                ai_bubble.set_content("No response received.", timestamp)
-            self.chat_layout.insertWidget(self.chat_layout.count() - 1, ai_bubble)
-            
-            self.message_bubbles.extend([user_bubble, ai_bubble])
+        self.chat_view.transcript.clear()
+        
+        # Search hits belong to the previous session; search this one again
+        self._search_hits = []
+        self._search_hit_ids = set()
+        self._search_hit_pending = False
+        self._search_exhausted = True
+        self._search_loading = False
+        if self._search_query:
+            self.search_timer.start()
+        
+        self._insert_history_page(rows)
+        
+        # Start at the most recent message
+        self.chat_view.keep_bottom_distance(0)
+        self._page_inserted = True
             
         # Update the history list if we're in the history tab
         if self.tabs.currentWidget() == self.history_tab:
             self.update_history_list()
 
+    def _on_chat_scrolled(self, value):
+        """Fetch the previous page of history when the user nears the top"""
+        if (value > self.HISTORY_PREFETCH_MARGIN or self._loading_history_page
+                or self._history_exhausted or self._history_cursor is None):
+            return
+        session = self.current_session
+        before_ts, before_id = self._history_cursor
+        self._loading_history_page = True
+        self.db.read('get_page', session, before_ts, self.HISTORY_PAGE_SIZE, before_id,
+                     callback=lambda rows: self._prefetch_rendered(rows, lambda: self._show_older_history(session, rows)),
+                     on_error=lambda error: self._history_page_failed(session))
+
+    def _history_page_failed(self, session):
+        """Unlock paging after a failed page load; scrolling tries again"""
+        if session != self.current_session:
+            return
+        self._loading_history_page = False
+        self._search_hit_pending = False
+
+    def _show_older_history(self, session, rows):
+        """Prepend an older page of history, keeping the visible messages in place"""
+        if session != self.current_session:
+            return
+        scroll_bar = self.chat_view.verticalScrollBar()
+        # Distance from the bottom stays constant while content grows above
+        self.chat_view.keep_bottom_distance(scroll_bar.maximum() - scroll_bar.value())
+        self._page_inserted = True
+        self._insert_history_page(rows, at_top=True)
+
+    def _on_chat_range_changed(self, _minimum, _maximum):
+        """Check for paging once a loaded history page has been laid out"""
+        # The view has already put the page in place
+        if not self._page_inserted:
+            return
+        self._page_inserted = False
+        # A page shorter than the viewport doesn't move the scroll bar
+        self._on_chat_scrolled(self.chat_view.verticalScrollBar().value())
+
+    def _insert_history_page(self, rows, at_top=False):
+        """Add the messages of a page of conversation rows (newest first)"""
+        self._loading_history_page = False
+        if self._search_hit_pending:
+            # Navigation waited for this page; go on once it is inserted
+            self._search_hit_pending = False
+            QTimer.singleShot(0, self._go_to_search_hit)
+        if len(rows) < self.HISTORY_PAGE_SIZE:
+            self._history_exhausted = True
+        if not rows:
+            return
+        
+        # Cursor for the next older page
+        oldest = rows[-1]
+        self._history_cursor = (oldest[6], oldest[0])
+        
+        messages = []
+        for conv in rows[::-1]:  # Display in chronological order
+            conversation_id, timestamp, model, user_msg, ai_resp, session, _ts = conv
+            turn = [ChatMessage('user', user_msg, timestamp=timestamp, conversation_id=conversation_id)]
+            if ai_resp is not None:
+                turn.append(ChatMessage('ai', ai_resp, timestamp=timestamp, needs_render=True,
+                                        conversation_id=conversation_id))
+            else:
+                turn.append(ChatMessage('ai', "No response received.", timestamp=timestamp,
+                                        conversation_id=conversation_id))
+            for message in turn:
+                message.highlighted = conversation_id in self._search_hit_ids
+            messages.extend(turn)
+        
+        # Queue rendering of the whole page; rows that get painted move up the queue
+        for message in messages:
+            self.render_pool.request(message, RenderPool.PREFETCH)
+        
+        self.add_chat_messages(messages, at_top=at_top)
+
+    def shutdown_services(self):
+        """Stop the worker threads; the database goes last as the others use it"""
+        self.cancel_summary()
+        self.render_pool.wait()
+        self.embedding_service.stop()
+        self.db.stop()
+
     def closeEvent(self, event):
         self.hide()
         self.tray_icon.showMessage(
@@ -1342,109 +1725,16 @@ class ChatBotWindow(QMainWindow):
             self.update_status(f"Voice input error: {str(e)}")
     
     def attach_file(self):
-        """Allow the user to attach a file to the conversation and process various file types"""
-        try:
-            file_path, _ = QFileDialog.getOpenFileName(
-                self, "Attach File", "", 
-                "Text Files (*.txt);;JSON Files (*.json);;Markdown (*.md);;Python (*.py);;CSV (*.csv);;HTML (*.html);;All Files (*.*)")
-            
-            if not file_path or not os.path.exists(file_path):
-                return
-            
-            file_size = os.path.getsize(file_path)
-            max_size = 10 * 1024 * 1024  # 10MB limit
-            
-            if file_size > max_size:
-                QMessageBox.warning(self, "File Too Large", 
-                          "File size exceeds 10MB limit.")
-                return
-                
-            file_name = os.path.basename(file_path)
-            file_extension = os.path.splitext(file_name)[1].lower()
-            
-            # Initialize attached_files if needed
-            if not hasattr(self, 'attached_files'):
-                self.attached_files = {}
-                self.attached_files[file_name] = file_path
-            
-            # Define text-based file types
-            text_extensions = ['.txt', '.json', '.md', '.py', '.js', '.html', '.css', '.csv', 
-                      '.xml', '.yaml', '.yml', '.ini', '.cfg', '.conf', '.sh', '.bat']
-            code_extensions = ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c', '.h', 
-                      '.cs', '.php', '.rb', '.go', '.rs', '.swift', '.kt', '.ts']
-            
-            # Process text-based files
-            file_content = None
-            if file_extension in text_extensions:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        file_content = f.read()
-                    
-                    # Format content based on file type
-                    if file_extension == '.json':
-                        try:
-                            json_data = json.loads(file_content)
-                            file_content = json.dumps(json_data, indent=2)
-                        except json.JSONDecodeError:
-                            QMessageBox.warning(self, "Invalid JSON", 
-                                      "The JSON file is not properly formatted.")
-                    
-                    # Determine language for code files
-                    language = ""
-                    if file_extension in code_extensions:
-                        language = file_extension[1:]  # Remove the dot
-                    
-                    # Ask if user wants to insert content or just reference
-                    if file_content:
-                        reply = QMessageBox.question(self, "File Attached", 
-                                     f"Do you want to send the contents of {file_name} to the AI?",
-                                     QMessageBox.StandardButton.Yes | 
-                                     QMessageBox.StandardButton.No)
-                        
-                        if reply == QMessageBox.StandardButton.Yes:
-                            current_text = self.input_box.toPlainText().strip()
-                            
-                            # Format code blocks properly based on file type
-                            if file_extension in code_extensions or file_extension in ['.json', '.md', '.csv']:
-                                prefix = f"Content of {file_name}:\n\n```{language}\n"
-                                suffix = "\n```"
-                            else:
-                                prefix = f"Content of {file_name}:\n\n"
-                                suffix = ""
-                            
-                            if current_text:
-                                self.input_box.setPlainText(f"{current_text}\n\n{prefix}{file_content}{suffix}")
-                            else:
-                                self.input_box.setPlainText(f"{prefix}{file_content}{suffix}")
-                            
-                            self.update_status(f"File content added to input")
-                            return
-                except UnicodeDecodeError:
-                    QMessageBox.warning(self, "Binary File Detected", 
-                              f"{file_name} appears to be a binary file and cannot be displayed directly.")
-                except Exception as e:
-                    QMessageBox.warning(self, "Error Reading File", 
-                              f"Could not read the file: {str(e)}")
-            else:
-                # Binary file handling
-                QMessageBox.information(self, "Binary File", 
-                             f"{file_name} is a binary file. Only the file reference will be added.")
-            
-            # Default: just attach file reference
-            current_text = self.input_box.toPlainText()
-            file_text = f"\n[Attached file: {file_name}]\n"
-            
-            self.input_box.setPlainText(current_text + file_text if current_text else file_text)
-            
-            # Add file to the files list if not already present
-            existing_items = [self.files_list.item(i).text() for i in range(self.files_list.count())]
-            if file_name not in existing_items:
-                self.files_list.addItem(file_name)
-            
-            self.update_status(f"File '{file_name}' attached")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to attach file: {str(e)}")
+        """Allow the user to attach a file to the conversation"""
+        self.file_handler.attach_file(self.input_box, self.files_list)
+    
+    def attach_files(self):
+        """Attach one or more files to the conversation"""
+        self.file_handler.attach_files(self.input_box, self.files_list)
+    
+    def attach_directory(self):
+        """Attach the files of a folder to the conversation"""
+        self.file_handler.attach_directory(self.input_box, self.files_list)
     
     def open_settings(self):
         """Open the settings dialog"""
@@ -1454,7 +1744,16 @@ class ChatBotWindow(QMainWindow):
             previous_language = self.settings.get('language', 'en')
             
             # Reload settings
-            self.load_settings()
+            self.settings = SettingsDialog.load_settings(self)
+            self.context_builder.settings = self.settings
+            self.embedding_service.set_embedder(self._create_embedder())
+            self.attachment_index.embedder = self._create_embedder()
+            self.llm.configure(
+                base_url=self.settings.get('api_url', 'http://localhost:11434'),
+                temperature=float(self.settings.get('temperature', 70)) / 100.0,
+                system_prompt=self.settings.get('system_prompt', ''),
+                max_context_tokens=self.context_builder.token_budget
+            )
             
             # Apply settings changes
             self.current_theme = self.settings.get('theme', 'dark')
@@ -1480,12 +1779,46 @@ class ChatBotWindow(QMainWindow):
                 self.update_status(translator.tr("language_changed", 
                                                language="English" if current_language == "en" else "Français"))
     
+    def _create_embedder(self):
+        return OllamaEmbedder(
+            model=self.settings.get('embedding_model', 'nomic-embed-text'),
+            base_url=self.settings.get('api_url', 'http://localhost:11434')
+        )
+
+    def semantic_search(self):
+        """List the conversations closest in meaning to the semantic search text"""
+        query = self.semantic_input.text().strip()
+        if not query:
+            self.update_history_list()
+            return
+        self.update_status("Searching history...")
+        self.embedding_service.search(query, callback=self._show_semantic_results)
+
+    def _show_semantic_results(self, results):
+        self.history_list.clear()
+        for conv, score in results:
+            id, timestamp, model, user_msg, ai_resp, session = conv
+            item = QListWidgetItem()
+            preview = f"[{score:.2f}] {session} · {timestamp}\nUser: {user_msg[:50]}..."
+            if ai_resp:
+                preview += f"\nAI: {ai_resp[:50]}..."
+            item.setText(preview)
+            item.setData(Qt.ItemDataRole.UserRole, id)
+            self.history_list.addItem(item)
+        self.update_status(f"Found {len(results)} related conversations")
+
     def update_history_list(self):
         """Update the history list with conversations from the current session"""
+        session = self.current_session
+        self.db.read('get_recent_conversations', session,
+                     callback=lambda conversations: self._show_history_list(session, conversations))
+
+    def _show_history_list(self, session, conversations):
+        """Fill the history list with conversations loaded by update_history_list"""
+        if session != self.current_session:
+            return
         try:
             self.history_list.clear()
-            conversations = self.db.get_recent_conversations(self.current_session)
-            
             for conv in conversations:
                 id, timestamp, model, user_msg, ai_resp, session = conv
                 item = QListWidgetItem()
@@ -1538,23 +1871,23 @@ class ChatBotWindow(QMainWindow):
         
         # Update placeholder texts
         self.search_input.setPlaceholderText(translator.tr('search_placeholder'))
+        self.semantic_input.setPlaceholderText(translator.tr('semantic_placeholder'))
+        self.search_prev_btn.setToolTip(translator.tr('previous_match'))
+        self.search_next_btn.setToolTip(translator.tr('next_match'))
+        self._update_search_count()
         
         # Update status bar
         self.update_status(translator.tr('ready'))
 
     def load_history_item(self, item):
         """Load a selected history item from history into the chat"""
-        try:
-            conversation_id = item.data(Qt.ItemDataRole.UserRole)
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT user_message FROM conversations WHERE id = ?', (conversation_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                user_message = result[0]
-                self.input_box.setPlainText(user_message)
-        except Exception as e:
-            self.update_status(f"Error loading history item: {str(e)}")
+        conversation_id = item.data(Qt.ItemDataRole.UserRole)
+        self.db.read('get_conversation', conversation_id, callback=self._show_history_item)
+
+    def _show_history_item(self, conversation):
+        """Put the user message of a conversation loaded by load_history_item in the input box"""
+        if conversation:
+            self.input_box.setPlainText(conversation[3])
             
     def clear_history(self):
         """Clear all conversations from history"""
@@ -1564,7 +1897,11 @@ class ChatBotWindow(QMainWindow):
         
         if reply == QMessageBox.StandardButton.Yes:
             try:
-                self.db.clear_history()
+                self.db.write('clear_history')
+                self.llm.reset()
+                self.excerpts_in_context.clear()
+                self.render_cache.clear()
+                self.embedding_service.reset()
                 self.history_list.clear()
                 self.update_status("Chat history cleared successfully")
             except Exception as e:
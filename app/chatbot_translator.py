@@ -41,6 +41,11 @@ class Translator:
                 'template_description': 'Enter a short description:',
                 'template_category': 'Select or enter a category:',
                 'search_placeholder': 'Search in chat history...',
+                'search_hits': '{current} of {total}',
+                'no_matches': 'No matches',
+                'previous_match': 'Previous match',
+                'next_match': 'Next match',
+                'semantic_placeholder': 'Describe a past conversation and press Enter...',
                 'refresh': '🔄 Refresh',
                 'clear_history': '🗑️ Clear History',
                 'user': 'User',
@@ -128,6 +133,11 @@ class Translator:
                 'template_description': 'Entrez une courte description:',
                 'template_category': 'Sélectionnez ou entrez une catégorie:',
                 'search_placeholder': 'Rechercher dans l\'historique...',
+                'search_hits': '{current} sur {total}',
+                'no_matches': 'Aucun résultat',
+                'previous_match': 'Résultat précédent',
+                'next_match': 'Résultat suivant',
+                'semantic_placeholder': 'Décrivez une conversation passée et appuyez sur Entrée...',
                 'refresh': '🔄 Rafraîchir',
                 'clear_history': '🗑️ Effacer l\'historique',
                 'user': 'Utilisateur',
@@ -0,0 +1,142 @@
+from app.utils import truncate_text
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English-like text)"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def format_excerpts(excerpts, shown=()):
+    """Prompt block for attachment excerpts given as (key, name, start_line, end_line, text).
+
+    Excerpts whose key is in shown are already in the context window and
+    are referred to instead of repeated.
+    """
+    parts = []
+    for key, name, start_line, end_line, text in excerpts:
+        if key is not None and key in shown:
+            parts.append(f"[{name}, lines {start_line}-{end_line}: already quoted in this conversation]")
+        else:
+            parts.append(f"[{name}, lines {start_line}-{end_line}]\n{text}")
+    return "Relevant excerpts from the attached files:\n\n" + "\n\n".join(parts)
+
+
+class ContextBuilder:
+    """Assemble the prompt for a new turn from the system prompt and recent history.
+
+    Turns are taken newest first from the database until the token budget is
+    spent; anything older is dropped and replaced by a one-line recap of the
+    questions that were asked, so the prefill cost stays bounded however long
+    the session grows.
+
+    Excerpts of attached files sent with a kept turn are put back in front
+    of its message. Each excerpt appears in full once, at its first use;
+    later turns only refer to it.
+    """
+
+    # Tokens always kept free for the new message and the model's reply header
+    RESERVED_TOKENS = 64
+    # How many dropped questions are mentioned in the recap line
+    RECAP_TOPICS = 5
+
+    def __init__(self, db, settings):
+        # db is a DatabaseService; build() blocks on it, so call it off the GUI thread
+        self.db = db
+        self.settings = settings
+
+    @property
+    def token_budget(self):
+        return int(self.settings.get('context_budget', 2048))
+
+    @property
+    def max_turns(self):
+        return int(self.settings.get('max_history', 50))
+
+    def build(self, session, user_message, include_system=True):
+        """Return the full prompt text for user_message in the given session"""
+        return self.build_with_excerpts(session, user_message, include_system)[0]
+
+    def build_with_excerpts(self, session, user_message, include_system=True):
+        """Return the prompt and the keys of the attachment excerpts it contains"""
+        conversations = self.db.call('get_recent_conversations', session, self.max_turns)
+        links = self.db.call('get_message_attachments', [conv[0] for conv in conversations])
+        contents = self.db.call('get_attachments', {link[0] for turn in links.values() for link in turn})
+        excerpts = {}
+        lines = {}
+        for conversation_id, turn in links.items():
+            for digest, name, start_line, end_line in turn:
+                if digest not in contents:
+                    continue
+                if digest not in lines:
+                    lines[digest] = contents[digest].splitlines()
+                text = "\n".join(lines[digest][start_line - 1:end_line])
+                excerpts.setdefault(conversation_id, []).append(
+                    ((digest, start_line, end_line), name, start_line, end_line, text))
+        return self._assemble(conversations, user_message, include_system, excerpts)
+
+    def build_from_history(self, conversations, user_message, include_system=True):
+        """Build the prompt from conversation rows ordered newest first"""
+        return self._assemble(conversations, user_message, include_system, {})[0]
+
+    def _assemble(self, conversations, user_message, include_system, excerpts):
+        system_prompt = self.settings.get('system_prompt', '').strip() if include_system else ''
+        current = f"User: {user_message}\nAssistant:"
+
+        budget = self.token_budget - self.RESERVED_TOKENS
+        budget -= estimate_tokens(system_prompt) + estimate_tokens(current)
+
+        kept = []     # (user_message, conversation row, cost), newest first
+        dropped = []  # user messages of the turns left out, newest first
+        for conv in conversations:
+            user_msg, ai_resp = conv[3], conv[4] or ""
+            # Counted in full; repeated excerpts only shrink the turn
+            turn_excerpts = excerpts.get(conv[0], ())
+            cost = estimate_tokens(f"User: {user_msg}\nAssistant: {ai_resp}")
+            if turn_excerpts:
+                cost += estimate_tokens(format_excerpts(turn_excerpts))
+            if not dropped and cost <= budget:
+                kept.append((user_msg, conv, cost))
+                budget -= cost
+            else:
+                # Once a turn doesn't fit, every older turn is dropped too so
+                # the kept history stays contiguous
+                dropped.append(user_msg)
+
+        # Make room for the recap by folding the oldest kept turns into it
+        recap = self._recap(dropped)
+        while recap and kept and estimate_tokens(recap) > budget:
+            user_msg, _, cost = kept.pop()
+            budget += cost
+            dropped.insert(0, user_msg)
+            recap = self._recap(dropped)
+
+        parts = []
+        if system_prompt:
+            parts.append(system_prompt)
+
+        if recap and estimate_tokens(recap) <= budget:
+            parts.append(recap)
+
+        shown = set()
+        for user_msg, conv, _ in reversed(kept):  # Chronological order
+            turn_excerpts = excerpts.get(conv[0])
+            if turn_excerpts:
+                user_msg = f"{format_excerpts(turn_excerpts, shown)}\n\n{user_msg}"
+                shown.update(excerpt[0] for excerpt in turn_excerpts)
+            parts.append(f"User: {user_msg}\nAssistant: {conv[4] or ''}")
+        parts.append(current)
+        return "\n\n".join(parts), shown
+
+    def _recap(self, dropped_messages):
+        """Summarize dropped turns as a short list of the questions asked"""
+        if not dropped_messages:
+            return ""
+        # dropped_messages is newest first; mention the most recent ones
+        topics = [truncate_text(" ".join(msg.split()), 60)
+                  for msg in dropped_messages[:self.RECAP_TOPICS] if msg]
+        recap = f"[{len(dropped_messages)} earlier turns omitted."
+        if topics:
+            recap += " Earlier the user asked about: " + "; ".join(reversed(topics)) + "."
+        return recap + "]"
@@ -0,0 +1,505 @@
+"""
+Compact statistical profiles of CSV and JSON data files.
+
+Files are streamed in chunks of rows, so memory use does not depend on the
+file size; each chunk is turned into NumPy arrays per column. Counts, means,
+extremes and correlations are exact. Quantiles come from a uniform sample
+of SAMPLE_SIZE values per column, and distinct values are only counted up
+to MAX_DISTINCT per column.
+
+Delimited files larger than FULL_SCAN_BYTES are not parsed whole: their
+lines are counted at disk speed and the statistics come from SAMPLE_BLOCKS
+blocks spread evenly across the file.
+"""
+import csv
+import io
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from PyQt6.QtCore import pyqtSignal, QThread
+
+from app import ingest
+
+DATA_EXTENSIONS = ('.csv', '.tsv', '.json', '.jsonl', '.ndjson')
+
+CHUNK_ROWS = 50000
+FULL_SCAN_BYTES = 32 * 1024 * 1024
+SAMPLE_BLOCKS = 32
+SAMPLE_BLOCK_BYTES = 1024 * 1024
+SAMPLE_SIZE = 100000
+MAX_DISTINCT = 50000
+TOP_VALUES = 5
+SAMPLE_ROWS = 5
+# Columns described in the profile text; the others are only counted
+MAX_COLUMNS = 40
+
+# Matched exactly: checking the raw strings is much cheaper than normalizing each value
+NULL_TOKENS = frozenset(['', 'NA', 'na', 'N/A', 'n/a', 'NaN', 'nan', 'NAN', 'NULL', 'null', 'Null',
+                         'None', 'none', '-'])
+BOOLEAN_TOKENS = frozenset(['true', 'false', 'yes', 'no', 't', 'f', 'y', 'n'])
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?')
+
+
+class _Column:
+    """Running statistics of one column"""
+
+    def __init__(self, name, rng):
+        self.name = name
+        self.rng = rng
+        self.present = 0
+        self.numeric = True
+        self.integral = True
+        self.count = 0
+        # Sums of the values minus shift, which keeps the variance precise
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.sample = np.empty(0)
+        self.sample_keys = np.empty(0)
+        self.counts = Counter()
+        self.first_values = []
+
+    def add(self, values):
+        """Add a chunk of values given as strings; returns its floats (NaN when missing) or None"""
+        if NULL_TOKENS.isdisjoint(values):
+            present = values
+        else:
+            present = [value for value in values if value not in NULL_TOKENS]
+        self.present += len(present)
+        if len(self.first_values) < 20:
+            self.first_values.extend(present[:20 - len(self.first_values)])
+        if self.counts is not None:
+            self.counts.update(present)
+            if len(self.counts) > MAX_DISTINCT:
+                self.counts = None
+        if not self.numeric or not present:
+            return None
+
+        try:
+            parsed = np.array(present, dtype=np.float64)
+        except ValueError:
+            self.numeric = False
+            self.sample = self.sample_keys = None
+            return None
+        if len(present) == len(values):
+            full = parsed
+        else:
+            full = np.full(len(values), np.nan)
+            mask = np.array([value not in NULL_TOKENS for value in values])
+            full[mask] = parsed
+
+        finite = np.isfinite(parsed)
+        if not finite.all():
+            parsed = parsed[finite]
+            full = np.where(np.isfinite(full), full, np.nan)
+        if self.shift is None and parsed.size:
+            self.shift = float(parsed[0])
+        shifted = parsed - (self.shift or 0.0)
+        self.count += parsed.size
+        self.total += float(shifted.sum())
+        self.total_sq += float(np.square(shifted).sum())
+        if parsed.size:
+            self.minimum = min(self.minimum, float(parsed.min()))
+            self.maximum = max(self.maximum, float(parsed.max()))
+            self.integral = self.integral and bool(np.all(parsed == np.floor(parsed)))
+        self._sample(parsed)
+        return full
+
+    def _sample(self, values):
+        # Keep the values with the SAMPLE_SIZE smallest random keys: a uniform sample
+        keys = self.rng.random(values.size)
+        self.sample = np.concatenate([self.sample, values])
+        self.sample_keys = np.concatenate([self.sample_keys, keys])
+        if self.sample.size > SAMPLE_SIZE:
+            keep = np.argpartition(self.sample_keys, SAMPLE_SIZE)[:SAMPLE_SIZE]
+            self.sample = self.sample[keep]
+            self.sample_keys = self.sample_keys[keep]
+
+    @property
+    def kind(self):
+        if not self.present:
+            return 'empty'
+        if self.numeric and self.sample.size:
+            return 'integer' if self.integral else 'float'
+        if self.counts is not None and {value.strip().lower() for value in self.counts} <= BOOLEAN_TOKENS:
+            return 'boolean'
+        if self.first_values and all(DATE_RE.match(value.strip()) for value in self.first_values):
+            return 'datetime'
+        return 'text'
+
+    def describe(self, rows, sampled=False):
+        kind = self.kind
+        if sampled:
+            parts = [f"- {self.name} ({kind}): {(rows - self.present) * 100 / max(rows, 1):.1f}% nulls"]
+        else:
+            parts = [f"- {self.name} ({kind}): {rows - self.present:,} nulls"]
+        if self.counts is not None:
+            parts.append(f"{len(self.counts):,} distinct")
+        else:
+            parts.append(f">{MAX_DISTINCT:,} distinct")
+        if kind in ('integer', 'float'):
+            offset = self.total / self.count
+            mean = self.shift + offset
+            std = max(self.total_sq / self.count - offset * offset, 0.0) ** 0.5
+            q25, q50, q75 = np.quantile(self.sample, [0.25, 0.5, 0.75])
+            parts.append(f"min {_number(self.minimum)}, p25 {_number(q25)}, median {_number(q50)}, "
+                         f"p75 {_number(q75)}, max {_number(self.maximum)}; "
+                         f"mean {_number(mean)}, std {_number(std)}")
+        if self.counts and (kind not in ('integer', 'float') or len(self.counts) <= 20):
+            top = ", ".join(f"{_clip(value)} ({count * 100 / max(self.present, 1):.0f}%)"
+                            for value, count in self.counts.most_common(TOP_VALUES))
+            parts.append(f"top: {top}")
+        return "; ".join(parts)
+
+
+def _number(value):
+    value = float(value)
+    if abs(value) >= 1e15:
+        return f"{value:.6g}"
+    if value == int(value):
+        return f"{int(value):,}"
+    if abs(value) >= 1e5:
+        return f"{value:,.1f}"
+    return f"{value:.6g}"
+
+
+def _clip(text, length=30):
+    text = " ".join(str(text).split())
+    return text if len(text) <= length else text[:length - 1] + "…"
+
+
+class DataProfile:
+    """Accumulates column statistics chunk by chunk and formats them as text"""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.rows = 0
+        # Rows in the whole file when only a sample of them was profiled
+        self.total_rows = None
+        self.columns = {}
+        self.sample_rows = []
+        self._rng = np.random.default_rng(0)
+        # Pairwise sums over rows where both numeric columns are present,
+        # of values shifted by a per-column offset to keep the sums precise
+        self._numeric = []
+        self._shift = {}
+        self._pairs = None
+
+    def add_columns(self, header):
+        """Register the columns of header, so they are listed even without rows"""
+        for name in header:
+            if name not in self.columns:
+                self.columns[name] = _Column(name, self._rng)
+
+    def add_chunk(self, header, rows):
+        """Add rows given as lists of strings aligned with header"""
+        if not rows:
+            return
+        if len(self.sample_rows) < SAMPLE_ROWS:
+            self.sample_rows.extend(rows[:SAMPLE_ROWS - len(self.sample_rows)])
+        self.rows += len(rows)
+        width = len(header)
+        if set(map(len, rows)) != {width}:
+            rows = [row[:width] + [''] * (width - len(row)) for row in rows]
+        arrays = {}
+        for position, values in enumerate(zip(*rows)):
+            name = header[position]
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = _Column(name, self._rng)
+            floats = column.add(values)
+            if floats is not None:
+                arrays[name] = floats
+        self._correlate(arrays, len(rows))
+
+    def _correlate(self, arrays, count):
+        # Columns stop being numeric at their first non-number; drop them
+        self._numeric_keep([name for name in self._numeric if self.columns[name].numeric])
+        for name in arrays:
+            if name not in self._numeric and len(self._numeric) < MAX_COLUMNS:
+                self._numeric_add(name)
+                self._shift[name] = float(np.nanmean(arrays[name]))
+        if not self._numeric:
+            return
+        matrix = np.column_stack([arrays.get(name, np.full(count, np.nan)) for name in self._numeric])
+        present = ~np.isnan(matrix)
+        values = np.where(present, matrix - [self._shift[name] for name in self._numeric], 0.0)
+        weights = present.astype(np.float64)
+        n, sx, sxx, sxy = self._pairs
+        n += weights.T @ weights
+        sx += values.T @ weights           # sx[i, j]: sum of column i where j is present
+        sxx += np.square(values).T @ weights
+        sxy += values.T @ values
+
+    def _numeric_add(self, name):
+        self._numeric.append(name)
+        size = len(self._numeric)
+        old = self._pairs
+        self._pairs = tuple(np.zeros((size, size)) for _ in range(4))
+        if old is not None:
+            for new, previous in zip(self._pairs, old):
+                new[:size - 1, :size - 1] = previous
+
+    def _numeric_keep(self, names):
+        if names == self._numeric:
+            return
+        keep = [self._numeric.index(name) for name in names]
+        self._numeric = names
+        self._pairs = tuple(matrix[np.ix_(keep, keep)] for matrix in self._pairs) if keep else None
+
+    def correlations(self, limit=5, threshold=0.3):
+        """Strongest Pearson correlations as (column, column, r)"""
+        if self._pairs is None or len(self._numeric) < 2:
+            return []
+        n, sx, sxx, sxy = self._pairs
+        with np.errstate(invalid='ignore', divide='ignore'):
+            numerator = n * sxy - sx * sx.T
+            denominator = np.sqrt((n * sxx - sx ** 2) * (n * sxx.T - sx.T ** 2))
+            r = numerator / denominator
+        found = []
+        for i in range(len(self._numeric)):
+            for j in range(i + 1, len(self._numeric)):
+                if n[i, j] > 2 and np.isfinite(r[i, j]) and abs(r[i, j]) >= threshold:
+                    found.append((self._numeric[i], self._numeric[j], float(r[i, j])))
+        found.sort(key=lambda item: abs(item[2]), reverse=True)
+        return found[:limit]
+
+    def to_text(self, header=None):
+        sampled = self.total_rows is not None
+        lines = [f"Dataset: {self.name} ({self.size / 1024 / 1024:.1f} MB, "
+                 f"{self.total_rows if sampled else self.rows:,} rows, {len(self.columns)} columns)"]
+        if sampled:
+            lines.append(f"Statistics from a sample of {self.rows:,} rows spread across the file")
+        lines.append("Columns:")
+        columns = list(self.columns.values())
+        lines.extend(column.describe(self.rows, sampled) for column in columns[:MAX_COLUMNS])
+        if len(columns) > MAX_COLUMNS:
+            lines.append(f"- ... and {len(columns) - MAX_COLUMNS} more columns")
+        correlations = self.correlations()
+        if correlations:
+            lines.append("Strongest correlations: " + ", ".join(
+                f"{a} ~ {b} {r:+.2f}" for a, b, r in correlations))
+        if self.sample_rows:
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(header or list(self.columns))
+            writer.writerows([_clip(value, 40) for value in row] for row in self.sample_rows)
+            lines.append(f"First {len(self.sample_rows)} rows:")
+            lines.append(out.getvalue().rstrip("\n"))
+        return "\n".join(lines)
+
+
+def profile_csv(path, progress=None):
+    """Profile a delimited text file; the first row is the header"""
+    size = os.path.getsize(path)
+    csv.field_size_limit(max(csv.field_size_limit(), 16 * 1024 * 1024))
+    with open(path, 'rb') as raw:
+        head = raw.read(16384).decode('utf-8', errors='replace')
+        head = head[:head.rfind('\n') + 1] or head  # Whole lines only
+        raw.seek(0)
+        if path.lower().endswith('.tsv'):
+            dialect = csv.excel_tab
+        else:
+            try:
+                dialect = csv.Sniffer().sniff(head, delimiters=',;\t|')
+            except csv.Error:
+                dialect = csv.excel
+        text = io.TextIOWrapper(raw, encoding='utf-8', errors='replace', newline='')
+        reader = csv.reader(text, dialect)
+        header = next(reader, None)
+        profile = DataProfile(os.path.basename(path), size)
+        if header is None:
+            return profile.to_text()
+        header = _unique([name.strip() or f"column_{i + 1}" for i, name in enumerate(header)])
+        profile.add_columns(header)
+        if size > FULL_SCAN_BYTES:
+            text.detach()
+            _profile_csv_sample(raw, size, dialect, header, profile, progress)
+            return profile.to_text(header)
+        while True:
+            rows = [row for _, row in zip(range(CHUNK_ROWS), reader) if row]
+            if not rows:
+                break
+            profile.add_chunk(header, rows)
+            if progress is not None:
+                progress(min(99, raw.tell() * 100 // max(size, 1)))
+    return profile.to_text(header)
+
+
+def _profile_csv_sample(raw, size, dialect, header, profile, progress):
+    """Profile blocks spread across a large file and count its lines"""
+    step = size // SAMPLE_BLOCKS
+    width = len(header)
+    for index in range(SAMPLE_BLOCKS):
+        raw.seek(index * step)
+        raw.readline()  # The header, or a line cut by the seek
+        block = raw.read(SAMPLE_BLOCK_BYTES)
+        block = block[:block.rfind(b'\n') + 1]
+        lines = io.StringIO(block.decode('utf-8', errors='replace'), newline='')
+        # A seek may land inside a quoted field; rows of the wrong width are dropped
+        rows = [row for row in csv.reader(lines, dialect) if len(row) == width]
+        profile.add_chunk(header, rows)
+        if progress is not None:
+            progress(index * 50 // SAMPLE_BLOCKS)
+
+    raw.seek(0)
+    lines = 0
+    last = b'\n'
+    read = 0
+    while True:
+        block = raw.read(16 * 1024 * 1024)
+        if not block:
+            break
+        lines += block.count(b'\n')
+        last = block[-1:]
+        read += len(block)
+        if progress is not None:
+            progress(50 + read * 49 // size)
+    # Quoted fields spanning lines make this an estimate
+    profile.total_rows = lines + (last != b'\n') - 1
+
+
+def _unique(names):
+    seen = Counter()
+    result = []
+    for name in names:
+        seen[name] += 1
+        result.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return result
+
+
+def _iter_json_records(path):
+    """Yield the records of a JSON array or of a JSON Lines file, decoding incrementally"""
+    decoder = json.JSONDecoder()
+    chunks = ingest.iter_text(path)
+    buffer = ''
+    position = 0
+    in_array = None
+
+    while True:
+        # Skip whitespace and separators, refilling the buffer as needed
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            buffer, position = buffer[position:] + chunk, 0
+        if in_array is None:
+            in_array = buffer[position] == '['
+            if in_array:
+                position += 1
+            continue
+        if in_array and buffer[position] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if end == len(buffer):
+            # A number may continue in the next chunk
+            chunk = next(chunks, None)
+            if chunk is not None:
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+        position = end
+        if isinstance(record, list) and not in_array:
+            # A single JSON document holding an array, already fully decoded
+            yield from record
+        else:
+            yield record
+
+
+def _flatten(record, prefix=''):
+    """Flatten nested objects to dotted keys; values become strings"""
+    if not isinstance(record, dict):
+        return {prefix or 'value': _json_text(record)}
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        else:
+            flat[name] = _json_text(value)
+    return flat
+
+
+def _json_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)[:200]
+    return str(value)
+
+
+def profile_json(path, progress=None):
+    """Profile a JSON array of objects or a JSON Lines file"""
+    size = os.path.getsize(path)
+    profile = DataProfile(os.path.basename(path), size)
+    header = []
+    known = set()
+    records = []
+    consumed = 0
+
+    def flush():
+        rows = [[record.get(name, '') for name in header] for record in records]
+        profile.add_chunk(header, rows)
+        records.clear()
+
+    for record in _iter_json_records(path):
+        flat = _flatten(record)
+        for name in flat:
+            if name not in known:
+                known.add(name)
+                header.append(name)
+        records.append(flat)
+        consumed += 1
+        if len(records) >= CHUNK_ROWS:
+            flush()
+            if progress is not None:
+                # Progress from the average record size seen so far
+                done = sum(len(value) for value in flat.values()) * consumed
+                progress(min(99, done * 100 // max(size, 1)))
+    if records:
+        flush()
+    return profile.to_text(header)
+
+
+def profile_file(path, progress=None):
+    """Profile text for a CSV, TSV, JSON or JSON Lines file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.json', '.jsonl', '.ndjson'):
+        return profile_json(path, progress)
+    return profile_csv(path, progress)
+
+
+class DataProfileThread(QThread):
+    """Profiles a data file off the GUI thread"""
+
+    progress = pyqtSignal(int)
+    profiled = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def run(self):
+        try:
+            self.profiled.emit(profile_file(self.path, progress=self.progress.emit))
+        except Exception as e:
+            self.error_occurred.emit(str(e))
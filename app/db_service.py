@@ -0,0 +1,181 @@
+import itertools
+import queue
+import threading
+
+from PyQt6.QtCore import pyqtSignal, QThread
+
+from model.database import ChatDatabase
+
+
+class _Request:
+    __slots__ = ('request_id', 'method', 'args', 'write', 'waiter', 'result', 'error')
+
+    def __init__(self, request_id, method, args, write, waiter=None):
+        self.request_id = request_id
+        self.method = method
+        self.args = args
+        self.write = write
+        self.waiter = waiter
+        self.result = None
+        self.error = None
+
+
+_STOP = object()
+
+
+class DatabaseService(QThread):
+    """Runs every ChatDatabase call on one dedicated thread.
+
+    The connection is opened and used on this thread only, so the GUI thread
+    never waits on SQLite. Writes are queued and consecutive ones are
+    committed together in one transaction; if one of them fails, the others
+    are committed on their own. Reads run in queue order, so a read always
+    sees the writes queued before it. Results come back to the GUI thread
+    through result_ready and are passed to the request's callback; a failed
+    request is reported with error_occurred and its exception is passed to
+    on_error, so callers waiting on the result can recover.
+
+        db.write('save_conversation', model, question, answer, session)
+        db.read('get_recent_conversations', session, 50, callback=self.show_history)
+        db.read('get_page', session, callback=self.show_page, on_error=self.page_failed)
+
+    Worker threads that need a result inline can use call(), which blocks
+    the calling thread until the request has been served; the GUI thread
+    should use read() instead. If the database can't be opened, every
+    request fails with that error instead of waiting.
+    """
+
+    result_ready = pyqtSignal(int, object)
+    request_failed = pyqtSignal(int, object)
+    error_occurred = pyqtSignal(str)
+
+    # Maximum number of queued writes grouped into one commit
+    WRITE_BATCH = 256
+
+    def __init__(self, db_path='chat_history.db', parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._callbacks = {}
+        self._ids = itertools.count(1)
+        # Emitted from the service thread, delivered on the GUI thread
+        self.result_ready.connect(self._dispatch)
+        self.request_failed.connect(self._dispatch_error)
+        self.start()
+
+    def read(self, method, *args, callback=None, on_error=None):
+        """Queue a read; callback(result) or on_error(exception) runs on the GUI thread"""
+        return self._submit(method, args, False, callback, on_error)
+
+    def write(self, method, *args, callback=None, on_error=None):
+        """Queue a write; it is committed together with adjacent writes"""
+        return self._submit(method, args, True, callback, on_error)
+
+    def call(self, method, *args):
+        """Run a request and block the calling thread until it completes"""
+        request = _Request(0, method, args, False, threading.Event())
+        self._queue.put(request)
+        request.waiter.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stop(self):
+        """Finish the queued requests and stop the thread"""
+        if self.isRunning():
+            self._queue.put(_STOP)
+            self.wait()
+
+    def _submit(self, method, args, write, callback, on_error):
+        request_id = next(self._ids)
+        if callback is not None or on_error is not None:
+            self._callbacks[request_id] = (callback, on_error)
+        self._queue.put(_Request(request_id, method, args, write))
+        return request_id
+
+    def _dispatch(self, request_id, result):
+        callback, _ = self._callbacks.pop(request_id, (None, None))
+        if callback is not None:
+            callback(result)
+
+    def _dispatch_error(self, request_id, error):
+        _, on_error = self._callbacks.pop(request_id, (None, None))
+        if on_error is not None:
+            on_error(error)
+
+    def run(self):
+        try:
+            db = ChatDatabase(self.db_path)
+        except Exception as e:
+            self.error_occurred.emit(f"Cannot open the database {self.db_path}: {e}")
+            self._fail_requests(e)
+            return
+        pending = []
+        try:
+            while True:
+                request = pending.pop(0) if pending else self._queue.get()
+                if request is _STOP:
+                    break
+
+                if not request.write:
+                    self._execute(db, request)
+                    self._finish(request)
+                    continue
+
+                # Group this write with every write already waiting behind it
+                writes = [request]
+                while len(writes) < self.WRITE_BATCH:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is not _STOP and nxt.write:
+                        writes.append(nxt)
+                    else:
+                        pending.append(nxt)
+                        break
+
+                try:
+                    with db.batch():
+                        for write in writes:
+                            self._execute(db, write, raise_errors=True)
+                except Exception:
+                    # The whole group was rolled back; redo the writes one by
+                    # one so only the failing one is lost
+                    for write in writes:
+                        write.result = write.error = None
+                        try:
+                            with db.batch():
+                                self._execute(db, write, raise_errors=True)
+                        except Exception:
+                            pass  # The error is on the request
+                for write in writes:
+                    self._finish(write)
+        finally:
+            db.conn.close()
+
+    def _fail_requests(self, error):
+        """Answer every request with error until stop(), so no caller waits forever"""
+        while True:
+            request = self._queue.get()
+            if request is _STOP:
+                break
+            request.error = error
+            self._finish(request)
+
+    def _execute(self, db, request, raise_errors=False):
+        try:
+            request.result = getattr(db, request.method)(*request.args)
+        except Exception as e:
+            request.error = e
+            if raise_errors:
+                raise
+
+    def _finish(self, request):
+        if request.waiter is not None:
+            request.waiter.set()
+        elif request.error is not None:
+            self.error_occurred.emit(f"Database error in {request.method}: {request.error}")
+            self.request_failed.emit(request.request_id, request.error)
+        else:
+            self.result_ready.emit(request.request_id, request.result)
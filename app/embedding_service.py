@@ -0,0 +1,151 @@
+import itertools
+import os
+import queue
+import time
+
+from PyQt6.QtCore import pyqtSignal, QThread
+
+from app.vector_index import VectorIndex
+
+_INDEX = object()
+_RESET = object()
+_STOP = object()
+
+
+class EmbeddingService(QThread):
+    """Keeps a semantic index of the chat history and answers queries against it.
+
+    Turns are embedded in the background, oldest first, in batches of
+    BATCH_SIZE: call index_new() after saving a conversation and everything
+    newer than the last indexed turn is picked up. Queries queued meanwhile
+    are served between two batches. The VectorIndex lives next to the
+    database file and is only touched on this thread. When indexing fails,
+    e.g. while Ollama is down, the error is reported once and indexing is
+    retried after RETRY_DELAY seconds, doubled after each failed attempt.
+
+        service.search("that pasta recipe", callback=self.show_results)
+    """
+
+    # Emitted with (request_id, [(conversation_row, score), ...])
+    results_ready = pyqtSignal(int, object)
+    error_occurred = pyqtSignal(str)
+
+    BATCH_SIZE = 32
+    # Longer turns are cut before embedding
+    MAX_TURN_CHARS = 4000
+    RETRY_DELAY = 5
+    MAX_RETRY_DELAY = 300
+
+    def __init__(self, db, embedder, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.embedder = embedder
+        self.index_path = os.path.splitext(db.db_path)[0] + '.vectors'
+        self._queue = queue.Queue()
+        self._callbacks = {}
+        self._ids = itertools.count(1)
+        self._index_queued = False
+        # Seconds until indexing is retried, 0 while it works
+        self._retry_delay = 0
+        self._retry_at = None
+        self.results_ready.connect(self._dispatch)
+        self.start()
+
+    def index_new(self):
+        """Embed every conversation saved since the last indexed one"""
+        if not self._index_queued:
+            self._index_queued = True
+            self._queue.put(_INDEX)
+
+    def reset(self):
+        """Forget every vector, e.g. after the history was cleared"""
+        self._queue.put(_RESET)
+
+    def set_embedder(self, embedder):
+        """Switch embedding model; the index is rebuilt when the model differs"""
+        self._queue.put(('embedder', embedder))
+        self.index_new()
+
+    def search(self, query, k=20, callback=None):
+        """Queue a semantic search; callback(results) runs on the GUI thread"""
+        request_id = next(self._ids)
+        if callback is not None:
+            self._callbacks[request_id] = callback
+        self._queue.put(('search', request_id, query, k))
+        return request_id
+
+    def stop(self):
+        if self.isRunning():
+            self._queue.put(_STOP)
+            self.wait()
+
+    def _dispatch(self, request_id, results):
+        callback = self._callbacks.pop(request_id, None)
+        if callback is not None:
+            callback(results)
+
+    def run(self):
+        index = VectorIndex(self.index_path)
+        while True:
+            timeout = None if self._retry_at is None else max(0.0, self._retry_at - time.monotonic())
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._retry_at = None
+                job = _INDEX
+            if job is _STOP:
+                break
+            try:
+                if job is _INDEX:
+                    self._index_queued = False
+                    if self._retry_at is not None:
+                        continue  # Retried when the delay is over
+                    try:
+                        more = self._index_batch(index)
+                    except Exception as e:
+                        self._index_failed(e)
+                        continue
+                    self._retry_delay = 0
+                    if more:
+                        # More to do; let queued searches go first
+                        self.index_new()
+                elif job is _RESET:
+                    index.reset()
+                elif job[0] == 'embedder':
+                    self.embedder = job[1]
+                elif job[0] == 'search':
+                    _, request_id, query, k = job
+                    self.results_ready.emit(request_id, self._search(index, query, k))
+            except Exception as e:
+                if isinstance(job, tuple) and job[0] == 'search':
+                    self._callbacks.pop(job[1], None)
+                self.error_occurred.emit(f"Semantic search error: {e}")
+
+    def _index_failed(self, error):
+        if not self._retry_delay:
+            # Reported once; later failures only push the next attempt back
+            self.error_occurred.emit(f"Semantic search error: {error}; retrying in the background")
+        self._retry_delay = min(self.MAX_RETRY_DELAY, self._retry_delay * 2 or self.RETRY_DELAY)
+        self._retry_at = time.monotonic() + self._retry_delay
+
+    def _index_batch(self, index):
+        """Embed the next batch of turns; returns True if there may be more"""
+        if index.count and index.model != self.embedder.name:
+            index.reset()
+        turns = self.db.call('get_turns_after', index.last_id, self.BATCH_SIZE)
+        if not turns:
+            return False
+        texts = [f"User: {user or ''}\nAssistant: {ai or ''}"[:self.MAX_TURN_CHARS]
+                 for _, user, ai in turns]
+        vectors = self.embedder.embed(texts)
+        index.add([turn[0] for turn in turns], vectors, self.embedder.name)
+        return len(turns) == self.BATCH_SIZE
+
+    def _search(self, index, query, k):
+        if not index.count or index.model != self.embedder.name:
+            return []
+        hits = index.search(self.embedder.embed([query])[0], k)
+        rows = {row[0]: row for row in self.db.call('get_conversations', [hit[0] for hit in hits])}
+        # Turns deleted since they were indexed are skipped
+        return [(rows[conversation_id], score) for conversation_id, score in hits
+                if conversation_id in rows]
@@ -3,11 +3,22 @@ import json
 from PyQt6.QtWidgets import QFileDialog, QMessageBox
 from PyQt6.QtCore import Qt
 
+from app import ingest
+from app.attachment_batch import AttachBatchThread
+from app.attachment_index import AttachmentIndexThread
+from app.attachment_store import AttachmentStore
+from app.data_profiler import DATA_EXTENSIONS
+
 class FileHandler:
-    def __init__(self, main_window=None):
+    def __init__(self, main_window=None, attachment_index=None, store=None):
         self.main_window = main_window
         self.attached_files = {}
-        self.max_file_size = 10 * 1024 * 1024  # 10MB limit
+        # Decoded files, reused while they are unchanged on disk
+        self.store = store
+        # When set, text files are indexed and only relevant parts are sent
+        self.attachment_index = attachment_index
+        self._index_threads = set()
+        self._batch_thread = None
 
         # Define text-based file types
         self.text_extensions = ['.txt', '.json', '.md', '.py', '.js', '.html', '.css', '.csv', 
@@ -20,49 +31,65 @@ class FileHandler:
         if not self.main_window:
             return None, "No main window reference"
             
+        file_path, _ = QFileDialog.getOpenFileName(
+            self.main_window, "Attach File", "", 
+            "Text Files (*.txt);;JSON Files (*.json);;Markdown (*.md);;Python (*.py);;CSV (*.csv);;HTML (*.html);;All Files (*.*)")
+        return self._attach_path(file_path, input_box, files_list)
+
+    def attach_files(self, input_box=None, files_list=None):
+        """Attach one or more files chosen together"""
+        if not self.main_window:
+            return None, "No main window reference"
+
+        file_paths, _ = QFileDialog.getOpenFileNames(self.main_window, "Attach Files", "", "All Files (*.*)")
+        if len(file_paths) == 1:
+            return self._attach_path(file_paths[0], input_box, files_list)
+        if not file_paths:
+            return None, "No file selected"
+        return self._attach_batch(file_paths, None, input_box, files_list)
+
+    def attach_directory(self, input_box=None, files_list=None):
+        """Attach the files of a folder, skipping what its .gitignore files exclude"""
+        if not self.main_window:
+            return None, "No main window reference"
+
+        directory = QFileDialog.getExistingDirectory(self.main_window, "Attach Folder")
+        if not directory:
+            return None, "No folder selected"
+        return self._attach_batch([directory], directory, input_box, files_list)
+
+    def _attach_path(self, file_path, input_box=None, files_list=None):
+        """Attach a single file"""
         try:
-            file_path, _ = QFileDialog.getOpenFileName(
-                self.main_window, "Attach File", "", 
-                "Text Files (*.txt);;JSON Files (*.json);;Markdown (*.md);;Python (*.py);;CSV (*.csv);;HTML (*.html);;All Files (*.*)")
-            
             if not file_path or not os.path.exists(file_path):
                 return None, "No file selected"
             
-            file_size = os.path.getsize(file_path)
-            if file_size > self.max_file_size:
-                QMessageBox.warning(self.main_window, "File Too Large", 
-                          "File size exceeds 10MB limit.")
-                return None, "File too large"
-                
+            attachment = self._load(file_path, with_digest=True)
             file_name = os.path.basename(file_path)
             file_extension = os.path.splitext(file_name)[1].lower()
             
             # Store file reference
             self.attached_files[file_name] = file_path
             
-            # Process text-based files
+            # Process text files; unchanged files come decoded from the store
             file_content = None
-            if file_extension in self.text_extensions:
+            if not attachment.binary:
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        file_content = f.read()
-                    
-                    # Format JSON content
-                    if file_extension == '.json':
-                        try:
-                            json_data = json.loads(file_content)
-                            file_content = json.dumps(json_data, indent=2)
-                        except json.JSONDecodeError:
-                            QMessageBox.warning(self.main_window, "Invalid JSON", 
-                                      "The JSON file is not properly formatted.")
+                    if attachment.large and self.attachment_index is not None:
+                        # Searched on disk at question time, never loaded whole
+                        self.attachment_index.add_file(file_name, file_path)
+                    else:
+                        # Head and tail of the file for large ones
+                        file_content = attachment.text
+                    language = attachment.language
                     
-                    # Determine language for code files
-                    language = ""
-                    if file_extension in self.code_extensions:
-                        language = file_extension[1:]  # Remove the dot
+                    # Index the file; matching excerpts are added to the prompt at send time
+                    if file_content and self.attachment_index is not None:
+                        self._save_content(attachment)
+                        self._index_files([(file_name, file_content, attachment.digest)], pin=True)
                     
                     # Ask if user wants to insert content or just reference
-                    if file_content and input_box:
+                    elif file_content and input_box:
                         reply = QMessageBox.question(self.main_window, "File Attached", 
                                      f"Do you want to send the contents of {file_name} to the AI?",
                                      QMessageBox.StandardButton.Yes | 
@@ -92,9 +119,6 @@ class FileHandler:
                                 self._update_files_list(files_list, file_name)
                                 
                             return file_path, "File content added"
-                except UnicodeDecodeError:
-                    QMessageBox.warning(self.main_window, "Binary File Detected", 
-                              f"{file_name} appears to be a binary file and cannot be displayed directly.")
                 except Exception as e:
                     QMessageBox.warning(self.main_window, "Error Reading File", 
                               f"Could not read the file: {str(e)}")
@@ -124,6 +148,122 @@ class FileHandler:
                 QMessageBox.critical(self.main_window, "Error", error_msg)
             return None, error_msg
     
+    def _load(self, file_path, with_digest=False):
+        """Attachment for a file, from the store when it has one"""
+        if self.store is not None:
+            return self.store.load(file_path, with_digest)
+        return AttachmentStore.read(file_path)
+
+    def _save_content(self, attachment):
+        """Store the text of an attached file in the database once per distinct content"""
+        db = getattr(self.main_window, 'db', None)
+        if db is None or attachment.digest is None or attachment.large or attachment.text is None:
+            return
+        # Ignored by the database when the content is already stored
+        db.write('save_attachment', attachment.digest, attachment.text)
+
+    def _attach_batch(self, paths, root, input_box, files_list):
+        """Read many files on a thread pool, within the attachment token budget"""
+        if self._batch_thread is not None:
+            self.main_window.update_status("Still attaching the previous files...")
+            return None, "Busy"
+
+        budget = int(self.main_window.settings.get('attach_budget', 200000))
+        thread = AttachBatchThread(lambda path: self._load(path, with_digest=True), paths, budget)
+        self._show_progress()
+        self._batch_thread = thread
+        thread.progress.connect(self.main_window.progress_bar.setValue)
+        thread.loaded.connect(lambda attached, skipped: self._on_batch_loaded(
+            root, attached, skipped, input_box, files_list))
+        thread.error_occurred.connect(lambda e: self.main_window.update_status(
+            f"Failed to attach files: {e}"))
+        thread.finished.connect(lambda: self._on_batch_finished(thread))
+        self.main_window.update_status("Reading files...")
+        thread.start()
+        return paths, "Attaching files"
+
+    def _on_batch_loaded(self, root, attached, skipped, input_box, files_list):
+        names = []
+        tokens = 0
+        items = []
+        for file_path, attachment in attached:
+            if root:
+                # Relative to the folder, so equal file names stay apart
+                name = os.path.join(os.path.basename(root), os.path.relpath(file_path, root))
+                name = name.replace(os.sep, '/')
+            else:
+                name = os.path.basename(file_path)
+            self.attached_files[name] = file_path
+            names.append(name)
+            tokens += attachment.tokens
+            if files_list:
+                self._update_files_list(files_list, name)
+            if self.attachment_index is None:
+                continue
+            if attachment.large:
+                self.attachment_index.add_file(name, file_path)
+            elif attachment.text:
+                self._save_content(attachment)
+                items.append((name, attachment.text, attachment.digest))
+        if items:
+            self._index_files(items)
+
+        if input_box and names:
+            label = f"{len(names)} files from {os.path.basename(root)}" if root else ", ".join(names)
+            current_text = input_box.toPlainText()
+            file_text = f"\n[Attached files: {label}]\n"
+            input_box.setPlainText(current_text + file_text if current_text else file_text)
+
+        status = f"Attached {len(names)} files (~{tokens:,} tokens)"
+        if skipped:
+            over_budget = sum(1 for _, reason in skipped if reason == "over the token budget")
+            status += f"; skipped {len(skipped)}"
+            if over_budget:
+                status += f", {over_budget} of them over the token budget"
+        self.main_window.update_status(status)
+
+    def _on_batch_finished(self, thread):
+        if self._batch_thread is thread:
+            self._batch_thread = None
+        self._hide_progress_if_idle()
+
+    def _index_files(self, items, pin=False):
+        """Chunk and embed attached files, given as (name, text, digest), on a background thread.
+
+        pin is for a file attached on its own, sent whole when it is small.
+        """
+        thread = AttachmentIndexThread(self.attachment_index, items, pin)
+        self._index_threads.add(thread)
+        if self.main_window:
+            self._show_progress()
+            thread.progress.connect(self.main_window.progress_bar.setValue)
+            if len(items) == 1:
+                thread.indexed.connect(lambda name, count: self.main_window.update_status(
+                    f"Indexed {name} ({count} chunks); relevant parts will be sent with your questions"))
+            else:
+                thread.finished.connect(lambda: self.main_window.update_status(
+                    f"Indexed {len(items)} files; relevant parts will be sent with your questions"))
+            thread.error_occurred.connect(lambda e: self.main_window.update_status(
+                f"Error indexing {e}"))
+        thread.finished.connect(lambda: self._on_index_finished(thread))
+        thread.start()
+
+    def _on_index_finished(self, thread):
+        self._index_threads.discard(thread)
+        self._hide_progress_if_idle()
+
+    def _show_progress(self):
+        if self.main_window and not self._index_threads and self._batch_thread is None:
+            progress_bar = self.main_window.progress_bar
+            progress_bar.setValue(0)
+            progress_bar.setVisible(True)
+
+    def _hide_progress_if_idle(self):
+        if self.main_window and not self._index_threads and self._batch_thread is None:
+            progress_bar = self.main_window.progress_bar
+            progress_bar.setVisible(False)
+            progress_bar.reset()
+
     def _update_files_list(self, files_list, file_name):
         """Add file to the files list widget if not already present"""
         existing_items = [files_list.item(i).text() for i in range(files_list.count())]
@@ -144,7 +284,7 @@ class FileHandler:
             
         if not conversations:
             if hasattr(self.main_window, 'db'):
-                conversations = self.main_window.db.get_recent_conversations()
+                conversations = self.main_window.db.call('get_recent_conversations')
             else:
                 return False, "No conversations to export"
         
@@ -191,15 +331,13 @@ class FileHandler:
         if not os.path.exists(file_path):
             return None, f"File '{filename}' does not exist on disk"
             
-        file_extension = os.path.splitext(filename)[1].lower()
-        
         try:
-            if file_extension in self.text_extensions:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return content, f"File '{filename}' content retrieved"
-            else:
+            attachment = self._load(file_path)
+            if attachment.binary:
                 return None, f"File '{filename}' is not a text file"
+            if attachment.large:
+                return attachment.text, f"File '{filename}' is large; showing a summary"
+            return attachment.text, f"File '{filename}' content retrieved"
         except Exception as e:
             return None, f"Error reading file '{filename}': {str(e)}"
 
@@ -208,15 +346,21 @@ class FileHandler:
         if not self.main_window or filename not in self.attached_files:
             return False
             
-        content, message = self.get_file_content(filename)
-        if not content:
+        try:
+            preview = self._load(self.attached_files[filename]).preview
+        except OSError as e:
+            preview = None
+            message = f"Error reading file '{filename}': {str(e)}"
+        else:
+            message = f"File '{filename}' is not a text file"
+        if not preview:
             QMessageBox.warning(self.main_window, "File Error", message)
             return False
             
         # Create dialog to view file
         dialog = QMessageBox(self.main_window)
         dialog.setWindowTitle(f"File: {filename}")
-        dialog.setText(content[:1000] + ("..." if len(content) > 1000 else ""))
+        dialog.setText(preview)
         dialog.setStandardButtons(QMessageBox.StandardButton.Ok)
         dialog.exec()
         return True
@@ -225,6 +369,8 @@ class FileHandler:
         """Remove an attached file from the list"""
         if filename in self.attached_files:
             del self.attached_files[filename]
+            if self.attachment_index is not None:
+                self.attachment_index.remove(filename)
             
             # Remove from UI list if provided
             if files_list:
@@ -239,6 +385,20 @@ class FileHandler:
             return True, f"File '{filename}' removed"
         return False, f"File '{filename}' not found"
 
+    def latest_data_file(self):
+        """Path of the most recently attached CSV or JSON file, or None"""
+        for file_path in reversed(list(self.attached_files.values())):
+            if file_path.lower().endswith(DATA_EXTENSIONS) and os.path.exists(file_path):
+                return file_path
+        return None
+
+    def latest_text_file(self):
+        """Path of the most recently attached text file, or None"""
+        for file_path in reversed(list(self.attached_files.values())):
+            if os.path.exists(file_path) and not ingest.is_binary(file_path):
+                return file_path
+        return None
+
     def get_all_attached_files(self):
         """Get a list of all attached files"""
         return list(self.attached_files.keys())
\ No newline at end of file
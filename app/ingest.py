@@ -0,0 +1,187 @@
+"""
+Streaming access to attached files of any size.
+
+Text is decoded incrementally from a memory map, so even multi-GB logs are
+never loaded into Python memory at once. Large files are represented by
+views: the head, the tail and the lines matching a pattern.
+"""
+import codecs
+import hashlib
+import mmap
+import os
+import re
+
+# Bytes sniffed to tell text from binary
+SNIFF_BYTES = 8192
+# Files up to this size are decoded whole
+FULL_TEXT_LIMIT = 2 * 1024 * 1024
+# Bytes decoded per step when streaming
+DECODE_CHUNK = 1024 * 1024
+# Window used to count lines between grep matches
+COUNT_WINDOW = 16 * 1024 * 1024
+
+# Control characters other than tab, newlines, form feed and escape
+_CONTROL = bytes(set(range(32)) - {9, 10, 12, 13, 27})
+
+
+def is_binary(path):
+    """Guess whether a file is binary from its first SNIFF_BYTES bytes"""
+    with open(path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    if not sample:
+        return False
+    if b'\0' in sample:
+        return True
+    try:
+        # A multi-byte character may be cut at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return False
+    except UnicodeDecodeError:
+        pass
+    # Not UTF-8; treat mostly printable single-byte text as text
+    control = len(sample) - len(sample.translate(None, _CONTROL))
+    return control > len(sample) * 0.1
+
+
+class _Mapped:
+    """Read-only memory map of a file; empty files map to b''"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, *exc):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+
+def iter_text(path, chunk_size=DECODE_CHUNK, start=0, end=None):
+    """Yield the decoded text of path (or of bytes start..end) chunk by chunk"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with _Mapped(path) as data:
+        end = len(data) if end is None else min(end, len(data))
+        for offset in range(start, end, chunk_size):
+            text = decoder.decode(data[offset:min(offset + chunk_size, end)])
+            if text:
+                yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def read_text(path, limit=None):
+    """Decode a text file, or its first limit bytes"""
+    end = None if limit is None else limit
+    return "".join(iter_text(path, end=end))
+
+
+def sha256(path):
+    """Hex SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with _Mapped(path) as data:
+        for offset in range(0, len(data), DECODE_CHUNK):
+            digest.update(data[offset:offset + DECODE_CHUNK])
+    return digest.hexdigest()
+
+
+def head(path, lines=100):
+    """First lines of a file"""
+    with _Mapped(path) as data:
+        end = 0
+        for _ in range(lines):
+            end = data.find(b'\n', end) + 1
+            if end == 0:
+                end = len(data)
+                break
+        return data[:end].decode('utf-8', errors='replace')
+
+
+def tail(path, lines=100):
+    """Last lines of a file"""
+    with _Mapped(path) as data:
+        start = len(data)
+        if data[-1:] == b'\n':
+            start -= 1
+        for _ in range(lines):
+            start = data.rfind(b'\n', 0, start)
+            if start < 0:
+                break
+        return data[start + 1:].decode('utf-8', errors='replace')
+
+
+def grep(path, pattern, max_matches=50, context=0, flags=re.IGNORECASE):
+    """Return (line_number, text) of matching lines, with context lines around each.
+
+    pattern is a regular expression matched against the raw bytes, so it
+    should be ASCII or escaped UTF-8. Windows are returned in file order;
+    windows that overlap or touch are merged, so no line appears twice.
+    At most max_matches matching lines are taken.
+    """
+    if isinstance(pattern, str):
+        pattern = pattern.encode('utf-8')
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    windows = []  # [first line number, start offset, end offset]
+    with _Mapped(path) as data:
+        line_number, counted = 1, 0
+        last_line = -1
+        matches = 0
+        for match in regex.finditer(data):
+            position = match.start()
+            line_start = data.rfind(b'\n', 0, position) + 1
+            if line_start == last_line:
+                continue  # Another match on the same line
+            last_line = line_start
+            # Count newlines since the previous match in bounded windows
+            while counted < position:
+                step = min(position, counted + COUNT_WINDOW)
+                line_number += data[counted:step].count(b'\n')
+                counted = step
+
+            end = data.find(b'\n', position)
+            end = len(data) if end < 0 else end
+            for _ in range(context):
+                if end >= len(data):
+                    break
+                nxt = data.find(b'\n', end + 1)
+                end = len(data) if nxt < 0 else nxt
+
+            if windows and line_start <= windows[-1][2] + 1:
+                # Within or right after the previous window: extend it
+                windows[-1][2] = max(windows[-1][2], end)
+            else:
+                start, first_line = line_start, line_number
+                for _ in range(context):
+                    if start == 0 or (windows and start <= windows[-1][2] + 1):
+                        break
+                    start = data.rfind(b'\n', 0, start - 1) + 1
+                    first_line -= 1
+                if windows and start <= windows[-1][2] + 1:
+                    windows[-1][2] = end
+                else:
+                    windows.append([first_line, start, end])
+
+            matches += 1
+            if matches >= max_matches:
+                break
+        return [(first_line, data[start:end].decode('utf-8', errors='replace'))
+                for first_line, start, end in windows]
+
+
+def summary_view(path, head_lines=100, tail_lines=100, pattern=None, max_matches=50):
+    """Text standing in for a file too large to send: head, matches and tail"""
+    size = os.path.getsize(path)
+    parts = [f"[{os.path.basename(path)}: {size:,} bytes, showing the first {head_lines} "
+             f"and last {tail_lines} lines]", head(path, head_lines).rstrip("\n")]
+    if pattern:
+        matches = grep(path, pattern, max_matches)
+        if matches:
+            parts.append(f"[{len(matches)} lines matching {pattern!r}]")
+            parts.extend(f"{number}: {text}" for number, text in matches)
+    parts.append("[...]")
+    parts.append(tail(path, tail_lines).rstrip("\n"))
+    return "\n".join(parts)
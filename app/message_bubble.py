@@ -3,8 +3,10 @@ from PyQt6.QtWidgets import (QApplication, QVBoxLayout,
                            QMenu, QFrame, QToolButton, QDialog,
                            QSizePolicy)
 from PyQt6.QtCore import Qt, QThread
+from PyQt6.QtGui import QTextCursor
 from datetime import datetime
 import os
+from app.themes import ThemeManager
 from app.tts_worker import OfflineTTSWorker
 from app.tts_worker import OnlineTTSWorker  
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
@@ -16,11 +18,18 @@ import shutil
 class MessageBubble(QFrame):
     """A custom widget for displaying chat messages with enhanced features and styling."""
     
-    def __init__(self, is_user=True, parent=None, chat_window=None):
+    def __init__(self, is_user=True, parent=None, chat_window=None, max_content_height=300, role=None):
         super().__init__(parent)
         self.is_user = is_user
+        # Selects the bubble rules of the application stylesheet
+        self.role = role or ('user' if is_user else 'ai')
+        self.setProperty('role', self.role)
+        self.setProperty('highlighted', False)
         self.chat_window = chat_window
+        # Content taller than this scrolls; None shows the whole message
+        self.max_content_height = max_content_height
         self._content = ""
+        self._last_doc_height = None
         self.tts_thread = None  # To keep reference to active TTS thread
         self.setSizePolicy(
             QSizePolicy.Policy.Expanding,
@@ -33,9 +42,6 @@ class MessageBubble(QFrame):
         self.setFrameShape(QFrame.Shape.StyledPanel)
         self.setFrameShadow(QFrame.Shadow.Raised)
         
-        # Apply cached styles based on message type
-        self.setStyleSheet(self._get_bubble_style())
-        
         # Initialize layouts with optimized margins
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(7, 4, 7, 4)
@@ -53,22 +59,6 @@ class MessageBubble(QFrame):
         # Setup context menu
         self._setup_context_menu()
         
-    def _get_bubble_style(self):
-        """Return cached styles for the bubble."""
-        return """
-            QFrame {
-                background-color: %(bg_color)s;
-                border-radius: 10px;
-                margin-left: %(margin_left)s;
-                margin-right: %(margin_right)s;
-                padding: 10px;
-            }
-        """ % {
-            'bg_color': '#2a5298' if self.is_user else '#3f3f3f',
-            'margin_left': '80px' if self.is_user else '10px',
-            'margin_right': '10px' if self.is_user else '80px'
-        }
-        
     def _setup_header(self):
         """Setup the header section with sender info and timestamp."""
         header_layout = QHBoxLayout()
@@ -83,15 +73,13 @@ class MessageBubble(QFrame):
                 except (AttributeError, TypeError):
                     pass
         else:
-            sender_name = "AI"
+            sender_name = {'error': "Error", 'system': "System"}.get(self.role, "AI")
         
         self.sender_label = QLabel(sender_name)
-        self.sender_label.setStyleSheet(
-            f"color: {'#ffffff' if self.is_user else '#4fc3f7'}; font-weight: bold;"
-        )
+        self.sender_label.setObjectName("bubbleSender")
         
         self.time_label = QLabel()
-        self.time_label.setStyleSheet("color: #bbbbbb; font-size: 12px;")
+        self.time_label.setObjectName("bubbleTime")
         
         header_layout.addWidget(self.sender_label)
         header_layout.addStretch()
@@ -104,15 +92,7 @@ class MessageBubble(QFrame):
         self.content = QTextEdit()
         self.content.setReadOnly(True)
         self.content.setFrameStyle(QFrame.Shape.NoFrame)
-        self.content.setStyleSheet("""
-            QTextEdit {
-                background-color: transparent;
-                color: #ffffff;
-                border: none;
-                selection-background-color: #666666;
-                selection-color: #ffffff;
-            }
-        """)
+        self.content.setObjectName("bubbleContent")
         self.content.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.content.document().setDocumentMargin(0)
         
@@ -126,14 +106,18 @@ class MessageBubble(QFrame):
     def _adjust_content_height(self):
         """Dynamically adjust content height based on text content."""
         doc_height = self.content.document().size().height()
+        if doc_height == self._last_doc_height:
+            return
+        self._last_doc_height = doc_height
+        
         margins = self.content.contentsMargins()
         total_margins = margins.top() + margins.bottom() + 10
         
         # Set minimum and maximum heights with scrollbar activation threshold
         min_height = 30
-        max_height = 300
+        max_height = self.max_content_height
         
-        if doc_height <= max_height:
+        if max_height is None or doc_height <= max_height:
             self.content.setFixedHeight(int(max(min_height, doc_height + total_margins)))
             self.content.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         else:
@@ -180,8 +164,12 @@ class MessageBubble(QFrame):
         self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self._show_context_menu)
         
-    def set_content(self, text, timestamp=None):
-        """Set the message content with optimized HTML handling."""
+    def set_content(self, text, timestamp=None, text_width=None):
+        """Set the message content with optimized HTML handling.
+        
+        Pass text_width when the bubble's width is already known, so its
+        height is right before it is first laid out.
+        """
         self._content = text
         self.content.setHtml(text)
         
@@ -190,25 +178,34 @@ class MessageBubble(QFrame):
         else:
             self.time_label.setText(datetime.now().strftime("%H:%M:%S"))
             
-        # Force layout update to ensure proper sizing
-        QApplication.processEvents()
+        # Size from the document layout itself instead of spinning the event loop
+        if text_width is not None:
+            self.content.document().setTextWidth(text_width)
         self._adjust_content_height()
         
+    def set_highlighted(self, highlighted):
+        """Mark the bubble as a search hit; restyled by the application stylesheet."""
+        ThemeManager.set_property(self, 'highlighted', bool(highlighted))
+        
     def append_content(self, text):
-        """Append content to the message with optimized HTML handling."""
+        """Append an HTML fragment at the end of the message without re-parsing it."""
         self._content += text
-        current_html = self.content.toHtml()
+        self._end_cursor().insertHtml(text)
         
-        if "</body></html>" in current_html:
-            self.content.setHtml(
-                current_html.replace("</body></html>", f"{text}</body></html>")
-            )
-        else:
-            self.content.setHtml(current_html + text)
-            
-        # Force layout update to ensure proper sizing
-        QApplication.processEvents()
-        self._adjust_content_height()
+    def append_text(self, text):
+        """Append plain text at the end of the message, e.g. streamed tokens."""
+        self._content += text
+        self._end_cursor().insertText(text)
+        
+    def _end_cursor(self):
+        """Return a cursor positioned at the end of the content document.
+        
+        Height is then updated through documentSizeChanged, and only when
+        the appended fragment actually changes the document size.
+        """
+        cursor = QTextCursor(self.content.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        return cursor
             
     def _handle_copy(self):
         """Copy message content to clipboard."""
@@ -458,7 +455,8 @@ class MessageBubble(QFrame):
                 if user_message and text:
                     try:
                         # Save to database with current session
-                        self.chat_window.db.save_conversation(
+                        self.chat_window.db.write(
+                            'save_conversation',
                             self.chat_window.current_model,
                             user_message,
                             text,
@@ -0,0 +1,137 @@
+import json
+
+import requests
+
+
+class OllamaSessionClient:
+    """Session-aware client for Ollama's /api/generate endpoint.
+
+    Ollama returns a ``context`` array with every completed generation that
+    encodes the conversation so far. Sending it back with the next request
+    lets the server skip re-processing the whole conversation prefix. This
+    client keeps the context of the last turn of each session and reuses it
+    as long as the model, system prompt and options it was produced with are
+    unchanged. A context left by another model is never reused: it misses
+    the turns answered since. A context longer than max_context_tokens is
+    dropped too, so the next prompt is rebuilt within the token budget
+    instead of growing until the server truncates it.
+
+    ``invoke`` and ``stream`` mirror the OllamaLLM interface so the client can
+    be used by AIResponseThread directly.
+    """
+
+    def __init__(self, model, base_url='http://localhost:11434', temperature=None,
+                 system_prompt='', timeout=300, max_context_tokens=None):
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.temperature = temperature
+        self.system_prompt = system_prompt
+        self.timeout = timeout
+        self.max_context_tokens = max_context_tokens
+        # session -> (fingerprint, context)
+        self._contexts = {}
+
+    def configure(self, model=None, base_url=None, temperature=None, system_prompt=None,
+                  max_context_tokens=None):
+        """Update generation parameters; stale contexts are dropped lazily"""
+        if model is not None:
+            self.model = model
+        if base_url is not None:
+            self.base_url = base_url.rstrip('/')
+        if temperature is not None:
+            self.temperature = temperature
+        if system_prompt is not None:
+            self.system_prompt = system_prompt
+        if max_context_tokens is not None:
+            self.max_context_tokens = max_context_tokens
+
+    @property
+    def options(self):
+        options = {}
+        if self.temperature is not None:
+            options['temperature'] = self.temperature
+        return options
+
+    def _fingerprint(self):
+        return (self.model, self.base_url, self.system_prompt,
+                json.dumps(self.options, sort_keys=True))
+
+    def get_context(self, session):
+        """Return the reusable context for session, or None if there is none"""
+        entry = self._contexts.get(session)
+        if entry is None:
+            return None
+        fingerprint, context = entry
+        if fingerprint != self._fingerprint() or self._too_long(context):
+            # Model, system prompt or options changed since it was produced,
+            # or the budget was lowered
+            del self._contexts[session]
+            return None
+        return context
+
+    def _too_long(self, context):
+        return self.max_context_tokens is not None and len(context) > self.max_context_tokens
+
+    def has_context(self, session):
+        return self.get_context(session) is not None
+
+    def reset(self, session=None):
+        """Forget stored contexts for one session, or for all sessions"""
+        if session is None:
+            self._contexts.clear()
+        else:
+            self._contexts.pop(session, None)
+
+    def _payload(self, prompt, session, stream):
+        """Request body, and the fingerprint the returned context is stored with"""
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'stream': stream,
+        }
+        if self.system_prompt:
+            payload['system'] = self.system_prompt
+        if self.options:
+            payload['options'] = self.options
+        if session is not None:
+            context = self.get_context(session)
+            if context:
+                payload['context'] = context
+        # Taken now: the model or options may change while the reply is generated
+        return payload, self._fingerprint()
+
+    def _store_context(self, session, fingerprint, data):
+        if session is None or not data.get('context'):
+            return
+        if self._too_long(data['context']):
+            # Rebuilt from the history next turn, within the budget
+            self._contexts.pop(session, None)
+        else:
+            self._contexts[session] = (fingerprint, data['context'])
+
+    def invoke(self, prompt, session=None):
+        """Generate a complete reply for prompt"""
+        payload, fingerprint = self._payload(prompt, session, False)
+        response = requests.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        self._store_context(session, fingerprint, data)
+        return data.get('response', '')
+
+    def stream(self, prompt, session=None):
+        """Yield reply tokens for prompt as they are generated"""
+        payload, fingerprint = self._payload(prompt, session, True)
+        with requests.post(f"{self.base_url}/api/generate", json=payload,
+                           stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('error'):
+                    raise RuntimeError(data['error'])
+                if data.get('response'):
+                    yield data['response']
+                if data.get('done'):
+                    self._store_context(session, fingerprint, data)
+                    break
@@ -0,0 +1,90 @@
+import hashlib
+from collections import OrderedDict
+
+# Bump whenever the renderer's output changes so stored renderings are
+# ignored instead of being shown with the old formatting
+RENDERER_VERSION = 3
+
+
+class RenderCache:
+    """Memoizes rendered replies in memory, backed by the rendered_html table.
+
+    Entries are keyed by RENDERER_VERSION, the code highlighting style and a
+    hash of the source text, so identical replies share one rendering and a
+    style or renderer change never serves stale HTML. Stored renderings made
+    with another version or style are deleted when the cache is created.
+    Lookups on the GUI thread only touch the in-memory LRU; prefetch() pulls
+    stored renderings for a batch of texts from the database thread
+    beforehand, and calls back even if the read fails. The cache is used
+    from the GUI thread only.
+
+        cache = RenderCache(db, render_markdown, style='monokai')
+        cache.prefetch(texts, callback=show_page)
+        html = cache.get(text)
+    """
+
+    MEMORY_SIZE = 500
+
+    def __init__(self, db, renderer, style=''):
+        self.db = db
+        self.renderer = renderer
+        self.style = style
+        self._memory = OrderedDict()
+        # Renderings of older versions or other styles will never be read again
+        self.db.write('prune_rendered_html', self.prefix)
+
+    @property
+    def prefix(self):
+        return f"{RENDERER_VERSION}/{self.style}/"
+
+    def key(self, text):
+        return self.prefix + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, text):
+        """Return the HTML for text, rendering and storing it on a miss"""
+        html = self.lookup(text)
+        if html is None:
+            html = self.renderer(text)
+            self.store(text, html)
+        return html
+
+    def lookup(self, text):
+        """Return the cached HTML for text, or None"""
+        key = self.key(text)
+        html = self._memory.get(key)
+        if html is not None:
+            self._memory.move_to_end(key)
+        return html
+
+    def store(self, text, html):
+        """Cache a rendering made elsewhere, e.g. on a render worker"""
+        key = self.key(text)
+        if key not in self._memory:
+            self.db.write('save_rendered_html', key, html)
+        self._remember(key, html)
+
+    def prefetch(self, texts, callback):
+        """Load stored renderings of texts into memory, then call callback()"""
+        missing = {self.key(text) for text in texts if text}
+        missing.difference_update(self._memory)
+        if not missing:
+            callback()
+            return
+
+        def loaded(found):
+            for key, html in found.items():
+                self._remember(key, html)
+            callback()
+
+        # Without the stored renderings the texts are simply rendered again
+        self.db.read('get_rendered_html', list(missing), callback=loaded,
+                     on_error=lambda error: callback())
+
+    def clear(self):
+        self._memory.clear()
+
+    def _remember(self, key, html):
+        self._memory[key] = html
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.MEMORY_SIZE:
+            self._memory.popitem(last=False)
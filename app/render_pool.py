@@ -0,0 +1,124 @@
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from app.renderer import MarkdownRenderer
+
+# One renderer per worker thread; MarkdownRenderer is not thread-safe
+_local = threading.local()
+
+
+def _thread_renderer(style):
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None or renderer.style != style:
+        renderer = _local.renderer = MarkdownRenderer(style=style)
+    return renderer
+
+
+class _RenderSignals(QObject):
+    # Emitted on a worker thread, delivered queued on the GUI thread
+    finished = pyqtSignal(object, str, str)
+
+
+class _RenderTask(QRunnable):
+    def __init__(self, signals, message, text, style, priority):
+        super().__init__()
+        self.setAutoDelete(False)  # The pool keeps the reference
+        self.signals = signals
+        self.message = message
+        self.text = text
+        self.style = style
+        self.priority = priority
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        html = _thread_renderer(self.style).render(self.text)
+        if not self.cancelled:
+            self.signals.finished.emit(self, self.text, html)
+
+
+class RenderPool(QObject):
+    """Renders AI replies to HTML on a background thread pool.
+
+    request() fills message.html straight from the RenderCache when it can,
+    otherwise it queues the render. Messages on screen are requested with
+    VISIBLE priority and history prefetch with PREFETCH, so what the user is
+    looking at is rendered first. Results are applied on the GUI thread, and
+    message_rendered is emitted for the view to relayout the message.
+    Cancelled requests, e.g. for messages that left the transcript, are
+    dropped from the queue or discarded when they finish.
+    """
+
+    message_rendered = pyqtSignal(object)
+
+    VISIBLE = 10
+    LATEST = 5
+    PREFETCH = 0
+
+    def __init__(self, cache, style='monokai', parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.style = style
+        self._pool = QThreadPool(self)
+        # Leave a core for the GUI thread
+        self._pool.setMaxThreadCount(max(1, QThreadPool.globalInstance().maxThreadCount() - 1))
+        self._signals = _RenderSignals(self)
+        self._signals.finished.connect(self._on_finished)
+        self._tasks = {}  # id(message) -> _RenderTask
+
+    def request(self, message, priority=PREFETCH):
+        """Make sure message.html gets rendered; returns True if it already is"""
+        if not message.needs_render:
+            return True
+        task = self._tasks.get(id(message))
+        if task is not None and task.priority >= priority and task.text == message.text:
+            return False
+
+        html = self.cache.lookup(message.text)
+        if html is not None:
+            self.cancel(message)
+            self._apply(message, html)
+            return True
+
+        if task is not None:
+            self._cancel(task)
+
+        task = _RenderTask(self._signals, message, message.text, self.style, priority)
+        self._tasks[id(message)] = task
+        self._pool.start(task, priority)
+        return False
+
+    def cancel(self, message):
+        task = self._tasks.pop(id(message), None)
+        if task is not None:
+            self._cancel(task)
+
+    def cancel_all(self):
+        for task in self._tasks.values():
+            self._cancel(task)
+        self._tasks.clear()
+
+    def wait(self):
+        """Block until running renders finish, e.g. on shutdown"""
+        self.cancel_all()
+        self._pool.waitForDone()
+
+    def _cancel(self, task):
+        task.cancelled = True
+        self._pool.tryTake(task)
+
+    def _on_finished(self, task, text, html):
+        self.cache.store(text, html)
+        if task.cancelled or self._tasks.get(id(task.message)) is not task:
+            return
+        del self._tasks[id(task.message)]
+        if task.message.text == text:
+            self._apply(task.message, html)
+
+    def _apply(self, message, html):
+        message.html = html
+        message.stream = None  # The streamed preview gives way to the full rendering
+        message.needs_render = False
+        self.message_rendered.emit(message)
@@ -0,0 +1,168 @@
+import html
+import re
+from functools import lru_cache
+
+import markdown
+from markdown.extensions import Extension
+from markdown.preprocessors import Preprocessor
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name, TextLexer
+from pygments.util import ClassNotFound
+
+# CSS class of highlighted code blocks
+CODE_CSS_CLASS = 'codehilite'
+
+# A fenced block: ``` or ~~~ at the start of a line, an optional language,
+# the code, and a closing fence of the same kind
+FENCE_RE = re.compile(
+    r'^(?P<fence>`{3,}|~{3,})[ \t]*(?P<lang>[\w#+.-]*)[^\n]*\n'
+    r'(?P<code>.*?)(?<=\n)(?P=fence)[ \t]*$',
+    re.MULTILINE | re.DOTALL,
+)
+
+
+@lru_cache(maxsize=64)
+def get_lexer(lang):
+    """Return a lexer for a fence language, plain text when unknown"""
+    try:
+        return get_lexer_by_name(lang, stripall=True) if lang else TextLexer(stripall=True)
+    except ClassNotFound:
+        return TextLexer(stripall=True)
+
+
+class FencedCodePreprocessor(Preprocessor):
+    """Replaces fenced blocks with highlighted HTML before markdown parses the text"""
+
+    def __init__(self, md, renderer):
+        super().__init__(md)
+        self.renderer = renderer
+
+    def run(self, lines):
+        text = "\n".join(lines)
+        if '```' not in text and '~~~' not in text:
+            return lines
+        return FENCE_RE.sub(self._replace, text).split("\n")
+
+    def _replace(self, match):
+        html = self.renderer.highlight_code(match.group('code'), match.group('lang').lower())
+        # Stashed HTML is passed through untouched by the markdown parser
+        return "\n\n" + self.md.htmlStash.store(html) + "\n\n"
+
+
+class FencedCodeExtension(Extension):
+    def __init__(self, renderer, **kwargs):
+        self.renderer = renderer
+        super().__init__(**kwargs)
+
+    def extendMarkdown(self, md):
+        # Same priority as markdown's own fenced_code extension
+        md.preprocessors.register(FencedCodePreprocessor(md, self.renderer), 'highlighted_fences', 25)
+
+
+class MarkdownRenderer:
+    """Renders replies to HTML in a single markdown pass.
+
+    Fenced code blocks are highlighted while the text is parsed, using a
+    cached lexer per language and one formatter per renderer. The HTML holds
+    no stylesheet: views install the formatter's css once as the default
+    stylesheet of their documents. A renderer keeps its markdown parser
+    between calls, so it must not be shared across threads.
+    """
+
+    def __init__(self, style='monokai'):
+        self.style = style
+        self.formatter = HtmlFormatter(style=style, cssclass=CODE_CSS_CLASS)
+        self._css = None
+        self._md = markdown.Markdown(extensions=[FencedCodeExtension(self)])
+
+    @property
+    def css(self):
+        if self._css is None:
+            self._css = self.formatter.get_style_defs(f'.{CODE_CSS_CLASS}')
+        return self._css
+
+    def highlight_code(self, code, lang):
+        return highlight(code, get_lexer(lang), self.formatter)
+
+    def render(self, text):
+        return self._md.reset().convert(text)
+
+
+# Opening or closing line of a fenced block
+FENCE_LINE_RE = re.compile(r'^(?P<fence>`{3,}|~{3,})[ \t]*(?P<lang>[\w#+.-]*)')
+
+
+class IncrementalMarkdownRenderer:
+    """Renders a streamed reply as it arrives, in time independent of its length.
+
+    Text is split into blocks at blank lines and around fenced code. Once a
+    block is complete its HTML is frozen and never rendered again; each
+    feed() only renders the open block at the end. An open code fence is
+    shown as escaped text and highlighted once, when its closing fence
+    arrives. The result is a preview: the finished reply should still be
+    rendered as a whole, since blocks are converted independently.
+
+    Views that keep a document can append the new entries of blocks and
+    replace tail_html(), instead of setting html() again on every chunk.
+    """
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.blocks = []        # HTML of the completed blocks, in order
+        self.version = 0        # Bumped by every feed()
+        self._block = ""        # Text of the open block
+        self._scanned = 0       # Offset in _block up to which whole lines were scanned
+        self._fence = None      # Marker of the open code fence, if any
+        self._fence_html = ""   # Escaped lines of the open code fence
+
+    def feed(self, chunk):
+        """Add streamed text"""
+        self._block += chunk
+        self._scan()
+        self.version += 1
+
+    def tail_html(self):
+        """HTML of the open block at the end"""
+        if self._fence is not None:
+            partial = html.escape(self._block[self._scanned:])
+            return f"<pre><code>{self._fence_html}{partial}</code></pre>"
+        if self._block.strip():
+            return self.renderer.render(self._block)
+        return ""
+
+    def html(self):
+        """HTML of everything so far"""
+        return "".join(self.blocks) + self.tail_html()
+
+    def _scan(self):
+        while True:
+            end = self._block.find("\n", self._scanned)
+            if end < 0:
+                return
+            start, self._scanned = self._scanned, end + 1
+            line = self._block[start:end]
+            match = FENCE_LINE_RE.match(line)
+
+            if self._fence is not None:
+                if match and match.group('fence') == self._fence and not line[match.end():].strip():
+                    # Fence closed: highlight the whole block once
+                    self._fence = None
+                    self._freeze(self._scanned)
+                else:
+                    self._fence_html += html.escape(line) + "\n"
+            elif match:
+                # Text before the fence is a block of its own
+                self._freeze(start)
+                self._fence = match.group('fence')
+                self._fence_html = ""
+            elif not line.strip():
+                self._freeze(self._scanned)
+
+    def _freeze(self, offset):
+        """Render _block[:offset] for good and start the next block after it"""
+        text = self._block[:offset]
+        if text.strip():
+            self.blocks.append(self.renderer.render(text))
+        self._block = self._block[offset:]
+        self._scanned -= offset
@@ -29,7 +29,10 @@ class SettingsDialog(QDialog):
                 'system_prompt': 'System Prompt:',
                 'advanced_settings': 'Advanced Settings',
                 'api_url': 'API URL:',
-                'temperature': 'Temperature:'
+                'temperature': 'Temperature:',
+                'context_budget': 'Context Budget (tokens):',
+                'attach_budget': 'Attachment Budget (tokens):',
+                'embedding_model': 'Embedding Model:'
             },
             'fr': {
                 'settings': 'Paramètres',
@@ -50,7 +53,10 @@ class SettingsDialog(QDialog):
                 'system_prompt': 'Invite Système:',
                 'advanced_settings': 'Paramètres Avancés',
                 'api_url': 'URL de l\'API:',
-                'temperature': 'Température:'
+                'temperature': 'Température:',
+                'context_budget': 'Budget de Contexte (jetons):',
+                'attach_budget': 'Budget des Pièces Jointes (jetons):',
+                'embedding_model': 'Modèle d\'Embedding:'
             }
         }
         
@@ -234,6 +240,28 @@ class SettingsDialog(QDialog):
         self.temp_label = QLabel(self.tr('temperature'))
         layout.addRow(self.temp_label, self.temperature)
         
+        # Token budget for system prompt + conversation history
+        self.context_budget = QSpinBox()
+        self.context_budget.setRange(256, 32768)
+        self.context_budget.setSingleStep(256)
+        self.context_budget.setValue(int(self.settings.get('context_budget', 2048)))
+        self.context_budget_label = QLabel(self.tr('context_budget'))
+        layout.addRow(self.context_budget_label, self.context_budget)
+        
+        # Total size of the files attached at once
+        self.attach_budget = QSpinBox()
+        self.attach_budget.setRange(10000, 2000000)
+        self.attach_budget.setSingleStep(10000)
+        self.attach_budget.setValue(int(self.settings.get('attach_budget', 200000)))
+        self.attach_budget_label = QLabel(self.tr('attach_budget'))
+        layout.addRow(self.attach_budget_label, self.attach_budget)
+        
+        # Ollama model used for semantic history search
+        self.embedding_model = QLineEdit()
+        self.embedding_model.setText(self.settings.get('embedding_model', 'nomic-embed-text'))
+        self.embedding_model_label = QLabel(self.tr('embedding_model'))
+        layout.addRow(self.embedding_model_label, self.embedding_model)
+        
         return self.advanced_group
     
     def on_language_changed(self, index):
@@ -426,6 +454,9 @@ class SettingsDialog(QDialog):
         self.prompt_label.setText(self.tr('system_prompt'))
         self.api_url_label.setText(self.tr('api_url'))
         self.temp_label.setText(self.tr('temperature'))
+        self.context_budget_label.setText(self.tr('context_budget'))
+        self.attach_budget_label.setText(self.tr('attach_budget'))
+        self.embedding_model_label.setText(self.tr('embedding_model'))
         
         # Update buttons
         self.save_button.setText(self.tr('save'))
@@ -443,6 +474,9 @@ class SettingsDialog(QDialog):
         self.settings['system_prompt'] = self.system_prompt.toPlainText()
         self.settings['api_url'] = self.api_url.text()
         self.settings['temperature'] = self.temperature.value()
+        self.settings['context_budget'] = self.context_budget.value()
+        self.settings['attach_budget'] = self.attach_budget.value()
+        self.settings['embedding_model'] = self.embedding_model.text().strip() or 'nomic-embed-text'
         
         # Save to file
         with open('settings.json', 'w') as f:
@@ -462,7 +496,10 @@ class SettingsDialog(QDialog):
             'font_size': 14,
             'language': 'en',
             'api_url': 'http://localhost:11434',
-            'temperature': 70
+            'temperature': 70,
+            'context_budget': 2048,
+            'attach_budget': 200000,
+            'embedding_model': 'nomic-embed-text'
         }
         
         # Try to load from file
@@ -0,0 +1,206 @@
+"""
+Map-reduce summarization of documents longer than the model's context.
+
+The text is split on structural boundaries into chunks that fit the
+context, every chunk is summarized (several requests at a time), and the
+partial summaries are combined level by level until they fit in one final
+prompt.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt6.QtCore import pyqtSignal
+
+from app.ai_response import AIResponseThread
+from app.context_builder import estimate_tokens
+
+# Boundaries tried in order: headings and page breaks, paragraphs, sentences
+SECTION_RE = re.compile(r'(?m)^(?=#{1,6}\s|(?:chapter|section|part)\s+\w+\b)|\f', re.IGNORECASE)
+PARAGRAPH_RE = re.compile(r'\n[ \t]*\n')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _cut(text, max_tokens):
+    # Last resort for a single over-long sentence
+    size = max_tokens * 4
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+_SPLITTERS = [SECTION_RE.split, PARAGRAPH_RE.split, SENTENCE_RE.split]
+
+
+def split_sections(text, max_tokens):
+    """Split text into chunks of at most max_tokens, cutting at structural boundaries.
+
+    Sections (headings, chapters, page breaks) are kept whole when they fit,
+    otherwise they are split at paragraphs, then at sentences. Consecutive
+    small pieces are packed together.
+    """
+    pieces = _split(text, max_tokens, 0)
+    chunks, current = [], []
+    size = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and size + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _split(text, max_tokens, level):
+    text = text.strip()
+    if not text:
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    if level == len(_SPLITTERS):
+        return _cut(text, max_tokens)
+    parts = _SPLITTERS[level](text)
+    if len(parts) == 1:
+        return _split(text, max_tokens, level + 1)
+    pieces = []
+    for part in parts:
+        pieces.extend(_split(part, max_tokens, level + 1))
+    return pieces
+
+
+class Summarizer:
+    """Condenses a long text into partial summaries that fit one prompt.
+
+        summarizer = Summarizer(llm, chunk_tokens=1536)
+        summary = summarizer.summarize(text)
+
+    llm needs an invoke(prompt) method; requests run on up to max_workers
+    threads. progress(stage, done, total) is called as requests complete,
+    always from the thread that called condense() or summarize().
+    """
+
+    MAP_PROMPT = ("Summarize part {index} of {count} of a longer document. Keep the key facts, "
+                  "names, numbers and conclusions; do not add commentary.\n\n{text}")
+    REDUCE_PROMPT = ("Merge these summaries of consecutive parts of a document into one summary, "
+                     "keeping the key facts and the order of events.\n\n{text}")
+    FINAL_PROMPT = ("The following are summaries of consecutive parts of one document.\n\n{text}\n\n"
+                    "{instruction}")
+
+    def __init__(self, llm, chunk_tokens=1536, max_workers=4,
+                 instruction="Write a concise summary of the whole document."):
+        self.llm = llm
+        self.chunk_tokens = chunk_tokens
+        self.max_workers = max_workers
+        self.instruction = instruction
+
+    def needs_splitting(self, text):
+        return estimate_tokens(text) > self.chunk_tokens
+
+    def condense(self, text, progress=None, cancelled=None):
+        """Summaries of consecutive parts of text, together within chunk_tokens"""
+        chunks = split_sections(text, self.chunk_tokens)
+        count = len(chunks)
+        summaries = self._run('map', [self.MAP_PROMPT.format(index=i + 1, count=count, text=chunk)
+                                      for i, chunk in enumerate(chunks)], progress, cancelled)
+        level = 1
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > self.chunk_tokens:
+            groups = self._group(summaries)
+            summaries = self._run(f'reduce {level}', [self.REDUCE_PROMPT.format(text="\n\n".join(group))
+                                                      for group in groups], progress, cancelled)
+            level += 1
+        return summaries
+
+    def final_prompt(self, summaries):
+        return self.FINAL_PROMPT.format(text="\n\n".join(summaries), instruction=self.instruction)
+
+    def summarize(self, text, progress=None):
+        if not self.needs_splitting(text):
+            return self.llm.invoke(f"{self.instruction}\n\n{text}")
+        return self.llm.invoke(self.final_prompt(self.condense(text, progress)))
+
+    def _group(self, summaries):
+        """Consecutive summaries packed up to chunk_tokens, at least two per group"""
+        groups, current = [], []
+        size = 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if len(current) >= 2 and size + tokens > self.chunk_tokens:
+                groups.append(current)
+                current, size = [], 0
+            current.append(summary)
+            size += tokens
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        elif current:
+            groups.append(current)
+        return groups
+
+    def _run(self, stage, prompts, progress, cancelled):
+        """Invoke the model on every prompt concurrently; results in prompt order"""
+        results = [None] * len(prompts)
+        if progress is not None:
+            progress(stage, 0, len(prompts))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.llm.invoke, prompt): i for i, prompt in enumerate(prompts)}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    if cancelled is not None and cancelled():
+                        raise RuntimeError("Summarization cancelled")
+                    results[futures[future]] = future.result().strip()
+                    if progress is not None:
+                        progress(stage, done, len(prompts))
+            except BaseException:
+                # Don't send the queued requests once one has failed
+                for pending in futures:
+                    pending.cancel()
+                raise
+        return results
+
+
+class SummarizeThread(AIResponseThread):
+    """Summarizes a long text and streams the final summary like a normal reply.
+
+    While the parts are summarized, a line per stage is streamed into the
+    chat and progress reports the stage's completion in percent; the final
+    reply replaces them. requestInterruption() stops it once the requests
+    in flight complete, with error_occurred.
+    """
+
+    progress = pyqtSignal(int)
+
+    def __init__(self, summarizer, text, streaming=False):
+        # Stateless requests: the parts must not go into the session's context
+        super().__init__(summarizer.llm, None, streaming=streaming)
+        self.summarizer = summarizer
+        self.text = text
+
+    def run(self):
+        try:
+            # The text may be a callable so a large file is read on this thread
+            if callable(self.text):
+                self.text = self.text()
+            if self.summarizer.needs_splitting(self.text):
+                summaries = self.summarizer.condense(self.text, progress=self._report,
+                                                     cancelled=self.isInterruptionRequested)
+                if self.isInterruptionRequested():
+                    raise RuntimeError("Summarization cancelled")
+                self.prompt = self.summarizer.final_prompt(summaries)
+                self.chunk_ready.emit("*Writing the summary...*\n\n")
+            else:
+                self.prompt = f"{self.summarizer.instruction}\n\n{self.text}"
+            if self.streaming:
+                response = self._stream_response()
+            else:
+                response = self.llm.invoke(self.prompt)
+            self.response_ready.emit(response)
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+    def _report(self, stage, done, total):
+        if done == 0:
+            if stage == 'map':
+                line = f"*Summarizing {total} parts, {self.summarizer.max_workers} at a time...*"
+            else:
+                line = f"*Merging into {total} {'summary' if total == 1 else 'summaries'}...*"
+            self.chunk_ready.emit(line + "\n\n")
+        self.progress.emit(done * 100 // max(total, 1))
@@ -1,250 +1,262 @@
+from PyQt6.QtWidgets import QWidget
 from PyQt6.QtGui import QPalette, QColor
 
+
 class ThemeManager:
-    @staticmethod
-    def apply_dark_theme(app):
-        """Apply dark theme to the application"""
-        palette = QPalette()
-        
-        # Set window and widget background colors
-        palette.setColor(QPalette.ColorRole.Window, QColor("#1e1e1e"))
-        palette.setColor(QPalette.ColorRole.WindowText, QColor("#ffffff"))
-        palette.setColor(QPalette.ColorRole.Base, QColor("#2b2b2b"))
-        palette.setColor(QPalette.ColorRole.AlternateBase, QColor("#3f3f3f"))
-        
-        # Text colors
-        palette.setColor(QPalette.ColorRole.Text, QColor("#ffffff"))
-        palette.setColor(QPalette.ColorRole.PlaceholderText, QColor("#bbbbbb"))
-        
-        # Button colors
-        palette.setColor(QPalette.ColorRole.Button, QColor("#3f3f3f"))
-        palette.setColor(QPalette.ColorRole.ButtonText, QColor("#ffffff"))
-        
-        # Link colors
-        palette.setColor(QPalette.ColorRole.Link, QColor("#4fc3f7"))
-        
-        # Highlight colors
-        palette.setColor(QPalette.ColorRole.Highlight, QColor("#4CAF50"))
-        palette.setColor(QPalette.ColorRole.HighlightedText, QColor("#ffffff"))
-        
-        # Disabled colors
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Text, QColor("#666666"))
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.ButtonText, QColor("#666666"))
-        
-        app.setPalette(palette)
-        
-        # Return additional stylesheet for custom widgets
-        return """
-            QMainWindow {
-                background-color: #1e1e1e;
-            }
-            QWidget {
-                background-color: #1e1e1e;
-            }
-            QScrollArea {
-                background-color: #2b2b2b;
-                border: none;
-            }
-            QTextEdit {
-                background-color: #3f3f3f;
-                color: white;
-                border: 1px solid #555555;
-                border-radius: 5px;
-                padding: 10px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QPushButton {
-                border-radius: 5px;
-                padding: 8px 15px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #555555;
-            }
-            QComboBox {
-                background-color: #3f3f3f;
-                color: white;
-                border: 1px solid #555555;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QLineEdit {
-                background-color: #3f3f3f;
-                color: white;
-                border: 1px solid #555555;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QTabWidget::pane {
-                border: 1px solid #3f3f3f;
-                border-radius: 5px;
-            }
-            QTabBar::tab {
-                background-color: #2b2b2b;
-                color: #bbbbbb;
-                padding: 8px 15px;
-                margin-right: 2px;
-                border-top-left-radius: 5px;
-                border-top-right-radius: 5px;
-            }
-            QTabBar::tab:selected {
-                background-color: #3f3f3f;
-                color: white;
-            }
-            QToolTip {
-                background-color: #2b2b2b;
-                color: white;
-                border: 1px solid #3f3f3f;
-                border-radius: 3px;
-            }
-        """
+    """One application-wide stylesheet covering every theme.
 
-    @staticmethod
-    def apply_light_theme(app):
-        """Apply light theme to the application"""
+    The stylesheet is parsed once, when apply_stylesheet() installs it on the
+    QApplication. Rules are selected through dynamic properties instead of
+    per-widget stylesheets: the main window's `theme` ("dark" or "light") and
+    a message bubble's `role` ("user", "ai", "error" or "system") and
+    `highlighted`. Switching theme or highlighting a bubble is then a
+    property change followed by a repolish, with no QSS to parse.
+    """
+
+    COLORS = {
+        'dark': {
+            'window': '#1e1e1e',
+            'base': '#2b2b2b',
+            'alternate': '#3f3f3f',
+            'text': '#ffffff',
+            'muted': '#bbbbbb',
+            'border': '#555555',
+            'link': '#4fc3f7',
+            'disabled': '#666666',
+            'hover': '#555555',
+            'scrollbar': '#666666',
+            'user': '#2a5298',
+            'ai': '#3f3f3f',
+            'error': '#d32f2f',
+            'system': '#ff9800',
+            'bubble_text': '#ffffff',
+            'user_sender': '#ffffff',
+            'ai_sender': '#4fc3f7',
+            'highlight': '#FFEB3B',
+        },
+        'light': {
+            'window': '#f5f5f5',
+            'base': '#ffffff',
+            'alternate': '#e0e0e0',
+            'text': '#212121',
+            'muted': '#757575',
+            'border': '#bdbdbd',
+            'link': '#1976D2',
+            'disabled': '#9e9e9e',
+            'hover': '#d0d0d0',
+            'scrollbar': '#bdbdbd',
+            'user': '#2196F3',
+            'ai': '#e0e0e0',
+            'error': '#d32f2f',
+            'system': '#ff9800',
+            'bubble_text': '#212121',
+            'user_sender': '#ffffff',
+            'ai_sender': '#1976D2',
+            'highlight': '#FBC02D',
+        },
+    }
+
+    # Rules repeated for each theme, scoped to windows with that theme
+    THEME_RULES = """
+        ChatBotWindow[theme="%(name)s"], ChatBotWindow[theme="%(name)s"] QWidget {
+            background-color: %(window)s;
+            color: %(text)s;
+        }
+        ChatBotWindow[theme="%(name)s"] QLabel {
+            color: %(text)s;
+        }
+        ChatBotWindow[theme="%(name)s"] QTextEdit {
+            background-color: %(base)s;
+            color: %(text)s;
+            border: 1px solid %(border)s;
+            border-radius: 5px;
+            padding: 10px;
+            font-family: 'Segoe UI', Arial, sans-serif;
+        }
+        ChatBotWindow[theme="%(name)s"] QPushButton {
+            border-radius: 5px;
+            padding: 8px 15px;
+            font-weight: bold;
+        }
+        ChatBotWindow[theme="%(name)s"] QPushButton:hover {
+            background-color: %(hover)s;
+        }
+        ChatBotWindow[theme="%(name)s"] QComboBox,
+        ChatBotWindow[theme="%(name)s"] QLineEdit {
+            background-color: %(base)s;
+            color: %(text)s;
+            border: 1px solid %(border)s;
+            border-radius: 5px;
+            padding: 5px;
+        }
+        ChatBotWindow[theme="%(name)s"] QListWidget {
+            background-color: %(base)s;
+            color: %(text)s;
+            border: 1px solid %(border)s;
+        }
+        ChatBotWindow[theme="%(name)s"] QStatusBar {
+            background-color: %(window)s;
+            color: %(text)s;
+        }
+        ChatBotWindow[theme="%(name)s"] TranscriptView {
+            border: none;
+            background-color: %(base)s;
+        }
+        ChatBotWindow[theme="%(name)s"] TranscriptView QScrollBar:vertical {
+            border: none;
+            background: %(base)s;
+            width: 10px;
+            margin: 0px;
+        }
+        ChatBotWindow[theme="%(name)s"] TranscriptView QScrollBar::handle:vertical {
+            background: %(scrollbar)s;
+            min-height: 20px;
+            border-radius: 5px;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble[role="user"] {
+            background-color: %(user)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble[role="ai"] {
+            background-color: %(ai)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble[role="error"] {
+            background-color: %(error)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble[role="system"] {
+            background-color: %(system)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble[highlighted="true"] {
+            border: 2px solid %(highlight)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble QLabel#bubbleSender {
+            color: %(ai_sender)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble[role="user"] QLabel#bubbleSender {
+            color: %(user_sender)s;
+        }
+        ChatBotWindow[theme="%(name)s"] MessageBubble QTextEdit#bubbleContent {
+            color: %(bubble_text)s;
+        }
+    """
+
+    # Rules that are the same in every theme
+    COMMON_RULES = """
+        QTabWidget::pane {
+            border-radius: 5px;
+        }
+        QTabBar::tab {
+            padding: 8px 15px;
+            margin-right: 2px;
+            border-top-left-radius: 5px;
+            border-top-right-radius: 5px;
+        }
+        TranscriptView QScrollBar::add-line:vertical,
+        TranscriptView QScrollBar::sub-line:vertical {
+            border: none;
+            background: none;
+        }
+        MessageBubble {
+            border-radius: 10px;
+            padding: 10px;
+            margin-left: 10px;
+            margin-right: 80px;
+        }
+        MessageBubble[role="user"] {
+            margin-left: 80px;
+            margin-right: 10px;
+        }
+        MessageBubble QLabel#bubbleSender {
+            background: transparent;
+            font-weight: bold;
+        }
+        MessageBubble QLabel#bubbleTime {
+            background: transparent;
+            color: #bbbbbb;
+            font-size: 12px;
+        }
+        MessageBubble QTextEdit#bubbleContent {
+            background-color: transparent;
+            border: none;
+            padding: 0px;
+            selection-background-color: #666666;
+            selection-color: #ffffff;
+        }
+    """
+
+    _stylesheet = None
+
+    @classmethod
+    def colors(cls, theme):
+        """Return the color tokens of a theme, e.g. for custom painting"""
+        return cls.COLORS.get(theme, cls.COLORS['dark'])
+
+    @classmethod
+    def stylesheet(cls):
+        """Return the application stylesheet for all themes, built once"""
+        if cls._stylesheet is None:
+            rules = [cls.COMMON_RULES]
+            for name, colors in cls.COLORS.items():
+                rules.append(cls.THEME_RULES % dict(colors, name=name))
+            cls._stylesheet = "".join(rules)
+        return cls._stylesheet
+
+    @classmethod
+    def palette(cls, theme):
+        colors = cls.colors(theme)
         palette = QPalette()
-        
-        # Set window and widget background colors
-        palette.setColor(QPalette.ColorRole.Window, QColor("#f5f5f5"))
-        palette.setColor(QPalette.ColorRole.WindowText, QColor("#212121"))
-        palette.setColor(QPalette.ColorRole.Base, QColor("#ffffff"))
-        palette.setColor(QPalette.ColorRole.AlternateBase, QColor("#e0e0e0"))
-        
+
+        # Window and widget backgrounds
+        palette.setColor(QPalette.ColorRole.Window, QColor(colors['window']))
+        palette.setColor(QPalette.ColorRole.WindowText, QColor(colors['text']))
+        palette.setColor(QPalette.ColorRole.Base, QColor(colors['base']))
+        palette.setColor(QPalette.ColorRole.AlternateBase, QColor(colors['alternate']))
+
         # Text colors
-        palette.setColor(QPalette.ColorRole.Text, QColor("#212121"))
-        palette.setColor(QPalette.ColorRole.PlaceholderText, QColor("#757575"))
-        
+        palette.setColor(QPalette.ColorRole.Text, QColor(colors['text']))
+        palette.setColor(QPalette.ColorRole.PlaceholderText, QColor(colors['muted']))
+
         # Button colors
-        palette.setColor(QPalette.ColorRole.Button, QColor("#e0e0e0"))
-        palette.setColor(QPalette.ColorRole.ButtonText, QColor("#212121"))
-        
+        palette.setColor(QPalette.ColorRole.Button, QColor(colors['alternate']))
+        palette.setColor(QPalette.ColorRole.ButtonText, QColor(colors['text']))
+
         # Link colors
-        palette.setColor(QPalette.ColorRole.Link, QColor("#1976D2"))
-        
+        palette.setColor(QPalette.ColorRole.Link, QColor(colors['link']))
+
         # Highlight colors
         palette.setColor(QPalette.ColorRole.Highlight, QColor("#4CAF50"))
         palette.setColor(QPalette.ColorRole.HighlightedText, QColor("#ffffff"))
-        
+
         # Disabled colors
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Text, QColor("#9e9e9e"))
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.ButtonText, QColor("#9e9e9e"))
-        
-        app.setPalette(palette)
-        
-        # Return additional stylesheet for custom widgets
-        return """
-            QMainWindow {
-                background-color: #f5f5f5;
-            }
-            QWidget {
-                background-color: #f5f5f5;
-            }
-            QScrollArea {
-                background-color: #ffffff;
-                border: none;
-            }
-            QTextEdit {
-                background-color: #ffffff;
-                color: #212121;
-                border: 1px solid #bdbdbd;
-                border-radius: 5px;
-                padding: 10px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QPushButton {
-                border-radius: 5px;
-                padding: 8px 15px;
-                font-weight: bold;
-                background-color: #e0e0e0;
-                color: #212121;
-            }
-            QPushButton:hover {
-                background-color: #d0d0d0;
-            }
-            QComboBox {
-                background-color: #ffffff;
-                color: #212121;
-                border: 1px solid #bdbdbd;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QLineEdit {
-                background-color: #ffffff;
-                color: #212121;
-                border: 1px solid #bdbdbd;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QTabWidget::pane {
-                border: 1px solid #bdbdbd;
-                border-radius: 5px;
-            }
-            QTabBar::tab {
-                background-color: #e0e0e0;
-                color: #757575;
-                padding: 8px 15px;
-                margin-right: 2px;
-                border-top-left-radius: 5px;
-                border-top-right-radius: 5px;
-            }
-            QTabBar::tab:selected {
-                background-color: #ffffff;
-                color: #212121;
-            }
-            QToolTip {
-                background-color: #ffffff;
-                color: #212121;
-                border: 1px solid #bdbdbd;
-                border-radius: 3px;
-            }
-        """
+        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Text, QColor(colors['disabled']))
+        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.ButtonText, QColor(colors['disabled']))
+        return palette
+
+    @classmethod
+    def apply_stylesheet(cls, app):
+        """Install the application stylesheet; call once at startup"""
+        if app.styleSheet() != cls.stylesheet():
+            app.setStyleSheet(cls.stylesheet())
 
     @classmethod
-    def get_bubble_style(cls, is_user=True, is_dark=True):
-        """Get style for message bubbles based on theme and sender"""
-        if is_dark:
-            # Dark theme styles
-            if is_user:
-                return """
-                    QFrame {
-                        background-color: #2a5298;
-                        border-radius: 10px;
-                        margin-left: 80px;
-                        margin-right: 10px;
-                        padding: 10px;
-                    }
-                """
-            else:
-                return """
-                    QFrame {
-                        background-color: #3f3f3f;
-                        border-radius: 10px;
-                        margin-left: 10px;
-                        margin-right: 80px;
-                        padding: 10px;
-                    }
-                """
-        else:
-            # Light theme styles
-            if is_user:
-                return """
-                    QFrame {
-                        background-color: #2196F3;
-                        color: white;
-                        border-radius: 10px;
-                        margin-left: 80px;
-                        margin-right: 10px;
-                        padding: 10px;
-                    }
-                """
-            else:
-                return """
-                    QFrame {
-                        background-color: #e0e0e0;
-                        color: #212121;
-                        border-radius: 10px;
-                        margin-left: 10px;
-                        margin-right: 80px;
-                        padding: 10px;
-                    }
-                """
+    def apply_theme(cls, app, window, theme):
+        """Switch window to theme with a property change and one repolish"""
+        cls.apply_stylesheet(app)
+        app.setPalette(cls.palette(theme))
+        cls.set_property(window, 'theme', theme)
+
+    @staticmethod
+    def set_property(widget, name, value):
+        """Change a dynamic property used by the stylesheet and repolish once"""
+        if widget.property(name) == value:
+            return
+        widget.setProperty(name, value)
+        ThemeManager.repolish(widget)
+
+    @staticmethod
+    def repolish(widget):
+        """Re-evaluate stylesheet rules for widget and its children"""
+        style = widget.style()
+        for child in [widget, *widget.findChildren(QWidget)]:
+            style.unpolish(child)
+            style.polish(child)
+        widget.update()
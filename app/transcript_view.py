@@ -0,0 +1,519 @@
+import html
+from collections import OrderedDict
+
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView, QStyle
+from PyQt6.QtCore import (Qt, QAbstractListModel, QModelIndex, QPersistentModelIndex,
+                          QSize, QRect, QRectF, QPointF, QTimer)
+from PyQt6.QtGui import (QTextDocument, QTextDocumentFragment, QTextCursor, QTextBlockFormat,
+                         QTextCharFormat, QColor, QPen, QPainter, QPalette, QAbstractTextDocumentLayout,
+                         QFontMetrics)
+
+from app.message_bubble import MessageBubble
+from app.themes import ThemeManager
+
+
+class ChatMessage:
+    """One entry of the chat transcript"""
+
+    __slots__ = ('role', 'text', 'html', 'timestamp', 'highlighted', 'needs_render',
+                 'conversation_id', 'stream')
+
+    def __init__(self, role, text, html=None, timestamp="", needs_render=False,
+                 conversation_id=None):
+        self.role = role            # 'user', 'ai', 'error' or 'system'
+        self.text = text            # Raw text (markdown for AI replies)
+        self.html = html            # Rendered HTML, or None to show text as-is
+        self.timestamp = timestamp
+        self.highlighted = False
+        self.needs_render = needs_render  # Markdown waiting for the render pool
+        self.conversation_id = conversation_id  # Database row of the turn, once saved
+        self.stream = None  # IncrementalMarkdownRenderer while the reply is streamed
+
+    @property
+    def is_user(self):
+        return self.role == 'user'
+
+    def display_html(self):
+        if self.stream is not None:
+            return self.stream.html()
+        if self.html is not None:
+            return self.html
+        return html.escape(self.text).replace("\n", "<br>")
+
+
+class TranscriptModel(QAbstractListModel):
+    """List model holding the chat messages, oldest first"""
+
+    MessageRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages = []
+
+    @property
+    def messages(self):
+        return self._messages
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return message.text
+        if role == self.MessageRole:
+            return message
+        return None
+
+    def flags(self, index):
+        # Editable so the delegate can open the action bubble on demand
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    def append_message(self, message):
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(message)
+        self.endInsertRows()
+        return row
+
+    def append_messages(self, messages):
+        """Append several messages with a single row insertion"""
+        if not messages:
+            return
+        first = len(self._messages)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self._messages.extend(messages)
+        self.endInsertRows()
+
+    def prepend_messages(self, messages):
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._messages[:0] = messages
+        self.endInsertRows()
+
+    def row_of(self, message):
+        """Row of message; searched from the end since recent messages change most"""
+        for row in range(len(self._messages) - 1, -1, -1):
+            if self._messages[row] is message:
+                return row
+        return -1
+
+    def row_of_conversation(self, conversation_id):
+        """First row showing the given conversation, or -1 if it isn't loaded"""
+        for row, message in enumerate(self._messages):
+            if message.conversation_id == conversation_id:
+                return row
+        return -1
+
+    def clear(self):
+        self.beginResetModel()
+        self._messages = []
+        self.endResetModel()
+
+    def message_changed(self, row):
+        """Notify views that the message at row was modified in place"""
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def all_changed(self):
+        if self._messages:
+            self.dataChanged.emit(self.index(0), self.index(len(self._messages) - 1))
+
+
+def _remove(document, start, end):
+    cursor = QTextCursor(document)
+    cursor.setPosition(start)
+    cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+    cursor.removeSelectedText()
+
+
+class TranscriptDelegate(QStyledItemDelegate):
+    """Paints messages as chat bubbles from cached QTextDocument layouts.
+
+    Only painted rows are laid out: the size of a row without a laid out
+    document is estimated from its text, and corrected once the row is
+    painted. Heights are cached per message and width, and the documents
+    themselves live in a small LRU, so memory stays flat and a resize costs
+    one pass over the text however long the transcript gets. A reply being streamed keeps
+    its document: each chunk appends the newly completed blocks and replaces
+    the open one at the end, so only the end is parsed and laid out again.
+    Clicking a row opens a MessageBubble over it as an editor, which
+    provides the copy, speak, edit and save actions.
+    """
+
+    # Layout, matching the MessageBubble stylesheet
+    SPACING = 15          # Between two messages
+    NEAR_MARGIN = 10      # Bubble margin on the sender's side
+    FAR_MARGIN = 80       # Bubble margin on the opposite side
+    PADDING = 12
+    HEADER_HEIGHT = 20
+    ACTIONS_HEIGHT = 28   # Strip where the action buttons appear when opened
+    RADIUS = 10
+
+    # Number of laid out documents kept around
+    DOCUMENT_CACHE_SIZE = 200
+
+    def __init__(self, view, chat_window=None):
+        super().__init__(view)
+        self.view = view
+        self.chat_window = chat_window
+        self.render_pool = None  # Set to render markdown of visible rows first
+        # Code highlighting CSS, the default stylesheet of every document
+        self.code_css = ""
+        self.colors = ThemeManager.colors('dark')
+        # id(message) -> (message, width, source, document, stream state)
+        self._documents = OrderedDict()
+        self._heights = {}  # id(message) -> (width, source, height)
+
+    def set_theme(self, theme):
+        """Paint bubbles with the colors of theme"""
+        # Colors are applied at paint time, so the cached layouts stay valid
+        self.colors = ThemeManager.colors(theme)
+        self.view.viewport().update()
+
+    def _text_width(self, total_width):
+        return max(50, total_width - self.NEAR_MARGIN - self.FAR_MARGIN - 2 * self.PADDING)
+
+    @staticmethod
+    def _source(message):
+        """What the layout of message depends on, cheap to compare"""
+        if message.stream is not None:
+            # Changes with every chunk; the version stands for the HTML
+            return (message.stream, message.stream.version)
+        return message.display_html()
+
+    def _document(self, message, width, font):
+        """Return a laid out document for message, reusing the cached one when valid"""
+        key = id(message)
+        source = self._source(message)
+        cached = self._documents.get(key)
+        if cached is not None and cached[0] is message and cached[1] == width:
+            document, state = cached[3], cached[4]
+            if cached[2] == source:
+                self._documents.move_to_end(key)
+                return document
+            if message.stream is not None and state is not None and state[0] is message.stream:
+                state = self._extend_stream(document, message.stream, state)
+                self._documents[key] = (message, width, source, document, state)
+                self._documents.move_to_end(key)
+                return document
+
+        document = QTextDocument()
+        document.setDocumentMargin(0)
+        document.setDefaultFont(font)
+        document.setDefaultStyleSheet(self.code_css)
+        document.setTextWidth(width)
+        if message.stream is not None:
+            document.setUndoRedoEnabled(False)
+            state = self._extend_stream(document, message.stream, (message.stream, 0, 0))
+        else:
+            document.setHtml(source)
+            state = None
+
+        self._documents[key] = (message, width, source, document, state)
+        self._documents.move_to_end(key)
+        while len(self._documents) > self.DOCUMENT_CACHE_SIZE:
+            self._documents.popitem(last=False)
+        return document
+
+    def _extend_stream(self, document, stream, state):
+        """Bring a streamed reply's document up to date; returns the new state.
+
+        state is (stream, blocks already in the document, position where the
+        open block starts).
+        """
+        _, appended, tail_start = state
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        cursor.setPosition(tail_start)
+        cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        for fragment in stream.blocks[appended:]:
+            self._insert_block(cursor, fragment)
+        tail_start = cursor.position()
+        self._insert_block(cursor, stream.tail_html())
+        cursor.endEditBlock()
+        return (stream, len(stream.blocks), tail_start)
+
+    @staticmethod
+    def _insert_block(cursor, fragment):
+        """Append an HTML fragment at cursor as blocks of their own"""
+        if not fragment:
+            return
+        source = QTextDocument()
+        source.setDefaultStyleSheet(cursor.document().defaultStyleSheet())
+        source.setHtml(fragment)
+        at_start = cursor.position() == 0
+        # A fresh block, so the fragment doesn't merge into the previous one
+        cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+        first = cursor.block()
+        cursor.insertFragment(QTextDocumentFragment(source))
+        if first.length() > 1 or first == cursor.block():
+            # The first block was merged into the fresh one, without its format
+            block_format = source.firstBlock().blockFormat()
+            block_format.setObjectIndex(-1)
+            QTextCursor(first).setBlockFormat(block_format)
+        else:
+            # Lists and tables start a block of their own and leave it empty
+            _remove(cursor.document(), first.position() - 1, first.position())
+        if at_start:
+            # The empty block every document starts with
+            _remove(cursor.document(), 0, 1)
+
+    def _content_height(self, message, width, font):
+        """Height of the laid out message, or an estimate if it isn't laid out"""
+        key = id(message)
+        source = self._source(message)
+        cached = self._heights.get(key)
+        if cached is not None and cached[0] == width and cached[1] == source:
+            return cached[2]
+        document = self._documents.get(key)
+        if document is not None and document[0] is message and document[1] == width:
+            # Shown recently, e.g. a streamed reply; updating it is cheap
+            return self._layout_height(message, width, font)
+        return self._estimated_height(message, width, font)
+
+    def _layout_height(self, message, width, font):
+        height = self._document(message, width, font).size().height()
+        self._heights[id(message)] = (width, self._source(message), height)
+        return height
+
+    @staticmethod
+    def _estimated_height(message, width, font):
+        """Height of message's text wrapped at width, without laying it out"""
+        metrics = QFontMetrics(font)
+        per_line = max(1, width // max(1, metrics.averageCharWidth()))
+        lines = sum(len(line) // per_line + 1 for line in message.text.split("\n"))
+        return lines * metrics.lineSpacing()
+
+    def _row_height(self, content_height):
+        return (self.SPACING + 2 * self.PADDING + self.HEADER_HEIGHT
+                + int(content_height) + self.ACTIONS_HEIGHT)
+
+    def forget(self, message):
+        """Drop cached layouts of a message that was removed from the model"""
+        self._documents.pop(id(message), None)
+        self._heights.pop(id(message), None)
+
+    def clear_cache(self):
+        self._documents.clear()
+        self._heights.clear()
+
+    def sizeHint(self, option, index):
+        message = index.data(TranscriptModel.MessageRole)
+        total_width = self.view.viewport().width()
+        width = self._text_width(total_width)
+        content_height = self._content_height(message, width, option.font)
+        return QSize(total_width, self._row_height(content_height))
+
+    def _row_rect(self, option):
+        # Rows always span the viewport, whatever width the view assigned
+        return QRect(option.rect.left(), option.rect.top(),
+                     self.view.viewport().width(), option.rect.height())
+
+    def _bubble_rect(self, rect, message):
+        left = self.FAR_MARGIN if message.is_user else self.NEAR_MARGIN
+        right = self.NEAR_MARGIN if message.is_user else self.FAR_MARGIN
+        return QRectF(rect.left() + left, rect.top() + self.SPACING / 2,
+                      rect.width() - left - right, rect.height() - self.SPACING)
+
+    def _sender_name(self, message):
+        if message.is_user:
+            if self.chat_window is not None and hasattr(self.chat_window, "settings"):
+                return self.chat_window.settings.get("user_name", "You")
+            return "You"
+        return {'error': "Error", 'system': "System"}.get(message.role, "AI")
+
+    def paint(self, painter, option, index):
+        message = index.data(TranscriptModel.MessageRole)
+        if message.needs_render and self.render_pool is not None:
+            # Shown as plain text until the rendered HTML arrives
+            self.render_pool.request(message, self.render_pool.VISIBLE)
+        row_rect = self._row_rect(option)
+        bubble = self._bubble_rect(row_rect, message)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # Bubble background
+        colors = self.colors
+        painter.setPen(QPen(QColor(colors['highlight']), 2) if message.highlighted
+                       else Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(colors.get(message.role, colors['ai'])))
+        painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+
+        # Header: sender and time
+        header = QRectF(bubble.left() + self.PADDING, bubble.top() + self.PADDING / 2,
+                        bubble.width() - 2 * self.PADDING, self.HEADER_HEIGHT)
+        font = option.font
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(QColor(colors['user_sender'] if message.is_user else colors['ai_sender']))
+        painter.drawText(header, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         self._sender_name(message))
+        font.setBold(False)
+        painter.setFont(font)
+        painter.setPen(QColor(colors['muted']))
+        painter.drawText(header, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter,
+                         message.timestamp)
+
+        # Content from the cached layout
+        width = self._text_width(row_rect.width())
+        document = self._document(message, width, option.font)
+        self._heights[id(message)] = (width, self._source(message), document.size().height())
+        if self._row_height(document.size().height()) != option.rect.height():
+            # The row was sized from an estimate
+            self.view.relayout_later(index)
+        origin = QPointF(bubble.left() + self.PADDING, header.bottom() + self.PADDING / 2)
+        painter.translate(origin)
+        context = QAbstractTextDocumentLayout.PaintContext()
+        # Only the blocks in view are drawn, however long the message
+        context.clip = QRectF(self.view.viewport().rect()).translated(-origin)
+        context.palette.setColor(QPalette.ColorRole.Text,
+                                 QColor(colors['user_sender'] if message.is_user else colors['bubble_text']))
+        document.documentLayout().draw(painter, context)
+
+        painter.restore()
+
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            painter.save()
+            painter.setPen(QColor(self.colors['muted']))
+            actions = QRectF(bubble.left() + self.PADDING, bubble.bottom() - self.ACTIONS_HEIGHT,
+                             bubble.width() - 2 * self.PADDING, self.ACTIONS_HEIGHT)
+            painter.drawText(actions, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                             "Click for actions")
+            painter.restore()
+
+    def createEditor(self, parent, option, index):
+        message = index.data(TranscriptModel.MessageRole)
+        bubble = MessageBubble(is_user=message.is_user, parent=parent, chat_window=self.chat_window,
+                               max_content_height=None, role=message.role)
+        bubble.content.document().setDefaultStyleSheet(self.code_css)
+        return bubble
+
+    def setEditorData(self, editor, index):
+        message = index.data(TranscriptModel.MessageRole)
+        editor.set_content(message.display_html(), message.timestamp,
+                           text_width=self._text_width(self.view.viewport().width()))
+        editor.set_highlighted(message.highlighted)
+
+    def setModelData(self, editor, model, index):
+        pass  # Messages are read-only
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(self._row_rect(option))
+
+
+class TranscriptView(QListView):
+    """Virtualized chat transcript: only visible rows are laid out and painted"""
+
+    def __init__(self, chat_window=None, parent=None, render_pool=None, code_css=""):
+        super().__init__(parent)
+        self.transcript = TranscriptModel(self)
+        self.setModel(self.transcript)
+        self.message_delegate = TranscriptDelegate(self, chat_window)
+        self.message_delegate.render_pool = render_pool
+        self.message_delegate.code_css = code_css
+        self.setItemDelegate(self.message_delegate)
+        if render_pool is not None:
+            render_pool.message_rendered.connect(self._on_message_rendered)
+
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setUniformItemSizes(False)
+        # Rows are laid out a batch at a time, so the view stays responsive
+        # while a long transcript is sized
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setMouseTracking(True)
+
+        self._open_index = None
+        self._relayout_rows = []  # Painted rows whose estimated height was wrong
+        self._bottom_distance = None  # See keep_bottom_distance()
+        self.verticalScrollBar().rangeChanged.connect(self._on_range_changed)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        self.clicked.connect(self.open_actions)
+        self.transcript.rowsAboutToBeRemoved.connect(self._on_rows_removed)
+        self.transcript.modelAboutToBeReset.connect(self._on_model_reset)
+
+    def open_actions(self, index):
+        """Show the interactive MessageBubble for the clicked message"""
+        self.close_actions()
+        # Persistent so it follows the row when older history is prepended
+        self._open_index = QPersistentModelIndex(index)
+        self.openPersistentEditor(index)
+
+    def close_actions(self):
+        if self._open_index is not None and self._open_index.isValid():
+            self.closePersistentEditor(self.transcript.index(self._open_index.row()))
+        self._open_index = None
+
+    def scroll_to_row(self, row):
+        self.scrollTo(self.transcript.index(row), QAbstractItemView.ScrollHint.PositionAtCenter)
+
+    def message_resized(self, row):
+        """Relayout a message whose content changed size, e.g. while streaming"""
+        self.transcript.message_changed(row)
+        self.message_delegate.sizeHintChanged.emit(self.transcript.index(row))
+
+    def scrollToBottom(self):
+        super().scrollToBottom()
+        self.keep_bottom_distance(0)
+
+    def keep_bottom_distance(self, distance):
+        """Keep the view distance pixels above the end until it is scrolled.
+
+        Batched layout grows the scroll range over several passes, and rows
+        change height once painted, so a position set once doesn't hold.
+        """
+        self._bottom_distance = distance
+
+    def _anchored_value(self):
+        return max(0, self.verticalScrollBar().maximum() - self._bottom_distance)
+
+    def relayout_later(self, index):
+        """Resize a row once painting is over; called from the delegate's paint()"""
+        if not self._relayout_rows:
+            QTimer.singleShot(0, self._relayout)
+        self._relayout_rows.append(QPersistentModelIndex(index))
+
+    def _relayout(self):
+        rows, self._relayout_rows = self._relayout_rows, []
+        scroll_bar = self.verticalScrollBar()
+        if self._bottom_distance is None and scroll_bar.value() == scroll_bar.maximum():
+            # A view showing the end keeps showing it
+            self.keep_bottom_distance(0)
+        for row in rows:
+            if row.isValid():
+                self.message_delegate.sizeHintChanged.emit(self.transcript.index(row.row()))
+
+    def _on_range_changed(self, _minimum, _maximum):
+        if self._bottom_distance is not None:
+            self.verticalScrollBar().setValue(self._anchored_value())
+
+    def _on_scrolled(self, value):
+        if self._bottom_distance is not None and value != self._anchored_value():
+            self._bottom_distance = None
+
+    def _on_message_rendered(self, message):
+        row = self.transcript.row_of(message)
+        if row >= 0:
+            self.message_resized(row)
+
+    def _on_rows_removed(self, parent, first, last):
+        render_pool = self.message_delegate.render_pool
+        for message in self.transcript.messages[first:last + 1]:
+            self.message_delegate.forget(message)
+            if render_pool is not None:
+                render_pool.cancel(message)
+
+    def _on_model_reset(self):
+        self._open_index = None
+        self.message_delegate.clear_cache()
+        if self.message_delegate.render_pool is not None:
+            self.message_delegate.render_pool.cancel_all()
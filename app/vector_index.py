@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import requests
+
+
+class VectorIndex:
+    """Append-only matrix of unit-length float32 vectors, memory-mapped from disk.
+
+    Three files share the index path: <path>.f32 holds the vectors row by row,
+    <path>.ids the int64 conversation id of each row, and <path>.json the
+    dimension, embedding model and committed row count. Rows past the
+    committed count are leftovers of an interrupted append and are ignored.
+    Search is a single matrix-vector product followed by a partial sort.
+    Not thread-safe; use it from one thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dim = None
+        self.model = None
+        self.count = 0
+        self._vectors = None
+        self._ids = None
+        self._load()
+
+    @property
+    def last_id(self):
+        """Highest conversation id in the index, or 0 when empty"""
+        return int(self._ids[-1]) if self.count else 0
+
+    def _file(self, suffix):
+        return f"{self.path}.{suffix}"
+
+    def _load(self):
+        try:
+            with open(self._file('json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.dim, self.model, self.count = meta['dim'], meta['model'], meta['count']
+        except (OSError, ValueError, KeyError):
+            self.dim, self.model, self.count = None, None, 0
+        self._map()
+
+    def _map(self):
+        self._vectors = self._ids = None
+        if not self.count:
+            return
+        try:
+            self._vectors = np.memmap(self._file('f32'), dtype=np.float32, mode='r',
+                                      shape=(self.count, self.dim))
+            self._ids = np.memmap(self._file('ids'), dtype=np.int64, mode='r', shape=(self.count,))
+        except (OSError, ValueError):
+            # Missing or truncated files: start over
+            self.reset()
+
+    def _save_meta(self):
+        tmp = self._file('json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'model': self.model, 'count': self.count}, f)
+        os.replace(tmp, self._file('json'))
+
+    def reset(self, model=None, dim=None):
+        """Drop every vector, e.g. after the history was cleared or the model changed"""
+        self._vectors = self._ids = None
+        for suffix in ('f32', 'ids', 'json'):
+            try:
+                os.remove(self._file(suffix))
+            except OSError:
+                pass
+        self.model, self.dim, self.count = model, dim, 0
+
+    def matches(self, model, dim):
+        """True if vectors from model with this dimension can be added"""
+        return self.count == 0 or (self.model == model and self.dim == dim)
+
+    def add(self, ids, vectors, model):
+        """Append vectors for the given conversation ids (ids must be increasing)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        if not self.matches(model, vectors.shape[1]):
+            self.reset()
+        self.model, self.dim = model, vectors.shape[1]
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        # Release the maps before writing; overwrite any uncommitted tail
+        self._vectors = self._ids = None
+        for suffix, data, row_bytes in (('f32', vectors, self.dim * 4), ('ids', ids, 8)):
+            with open(self._file(suffix), 'ab') as f:
+                f.truncate(self.count * row_bytes)
+                f.write(data.tobytes())
+        self.count += len(ids)
+        self._save_meta()
+        self._map()
+
+    def search(self, vector, k=20):
+        """Return up to k (conversation_id, cosine similarity) pairs, best first"""
+        if not self.count:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dim,):
+            return []
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = self._vectors @ query
+        k = min(k, self.count)
+        top = np.argpartition(scores, self.count - k)[self.count - k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(self._ids[i]), float(scores[i])) for i in top]
+
+
+class OllamaEmbedder:
+    """Embeds text with a local Ollama embedding model"""
+
+    def __init__(self, model='nomic-embed-text', base_url='http://localhost:11434', timeout=60):
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    @property
+    def name(self):
+        return f"ollama:{self.model}"
+
+    def embed(self, texts):
+        """Return a (len(texts), dim) float32 array"""
+        response = requests.post(f"{self.base_url}/api/embed",
+                                 json={'model': self.model, 'input': list(texts)},
+                                 timeout=self.timeout)
+        if response.status_code == 404:
+            # Older servers only have the one-prompt-per-request endpoint
+            return np.array([self._embed_one(text) for text in texts], dtype=np.float32)
+        response.raise_for_status()
+        return np.array(response.json()['embeddings'], dtype=np.float32)
+
+    def _embed_one(self, text):
+        response = requests.post(f"{self.base_url}/api/embeddings",
+                                 json={'model': self.model, 'prompt': text},
+                                 timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['embedding']
+
+
+class FakeEmbedder:
+    """Deterministic local stand-in for an embedding model.
+
+    Hashes words into a fixed number of buckets, so texts sharing words get
+    similar vectors. Needs no server, for tests and offline use.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    @property
+    def name(self):
+        return f"fake:{self.dim}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                bucket = int.from_bytes(hashlib.md5(word.encode('utf-8')).digest()[:4], 'little')
+                vectors[row, bucket % self.dim] += 1.0
+        return vectors
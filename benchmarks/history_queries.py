@@ -0,0 +1,58 @@
+"""
+Benchmark recent-history queries against databases of growing size.
+
+With the (session, ts DESC, id DESC) index the query is an index range scan,
+so its latency should stay flat from 1k to 1M rows.
+
+Usage: python benchmarks/history_queries.py [max_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.database import ChatDatabase
+
+SESSIONS = 20
+REPEAT = 200
+
+
+def populate(db, rows):
+    base_ts = int(time.time() * 1000) - rows * 1000
+    db.conn.executemany('''
+        INSERT INTO conversations (timestamp, ts, model, user_message, ai_response, session)
+        VALUES ('', ?, 'bench', ?, ?, ?)
+    ''', ((base_ts + i * 1000, f"question {i}", f"answer {i} " * 20, f"session-{i % SESSIONS}")
+          for i in range(rows)))
+    db.conn.commit()
+
+
+def measure(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sizes = [n for n in (1_000, 10_000, 100_000, 1_000_000) if n <= max_rows]
+
+    print(f"{'rows':>10} {'recent 50 (ms)':>16}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ChatDatabase(os.path.join(tmp, 'bench.db'))
+            populate(db, rows)
+            session = f"session-{SESSIONS // 2}"
+            recent = measure(lambda: db.get_recent_conversations(session, 50))
+            print(f"{rows:>10} {recent:>16.3f}")
+            db.conn.close()
+
+
+if __name__ == '__main__':
+    main()
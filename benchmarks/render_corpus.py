@@ -0,0 +1,83 @@
+"""
+Benchmark reply rendering over a corpus of code-heavy replies.
+
+Compares the previous approach (markdown, then a split on backticks with a
+new lexer and formatter per block and a replace over the whole HTML) with
+MarkdownRenderer, which highlights fenced blocks during the markdown parse.
+
+Usage: python benchmarks/render_corpus.py [replies]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+from app.renderer import MarkdownRenderer
+
+SNIPPETS = {
+    'python': "def fib(n):\n    a, b = 0, 1\n    for _ in range(n):\n        a, b = b, a + b\n    return a\n",
+    'javascript': "const total = items\n  .filter(x => x.price > 10)\n  .reduce((sum, x) => sum + x.price, 0);\n",
+    'sql': "SELECT session, COUNT(*)\nFROM conversations\nWHERE ts > 0\nGROUP BY session;\n",
+    'bash': "for f in *.log; do\n  grep -c ERROR \"$f\"\ndone\n",
+    'rust': "fn main() {\n    let v: Vec<i32> = (1..10).map(|x| x * x).collect();\n    println!(\"{:?}\", v);\n}\n",
+}
+
+
+def make_reply(rng):
+    parts = []
+    for _ in range(rng.randint(2, 6)):
+        parts.append("Here is how you can do it, with **bold** text and `inline code`.\n")
+        lang = rng.choice(list(SNIPPETS))
+        parts.append(f"```{lang}\n{SNIPPETS[lang] * rng.randint(1, 8)}```\n")
+    parts.append("- first point\n- second point\n")
+    return "\n".join(parts)
+
+
+def legacy_render(text):
+    html = markdown.markdown(text)
+    code_blocks = text.split("```")
+    for i in range(1, len(code_blocks), 2):
+        try:
+            lang = code_blocks[i].split("\n")[0]
+            code = "\n".join(code_blocks[i].split("\n")[1:])
+            lexer = get_lexer_by_name(lang, stripall=True)
+            formatted_code = highlight(code, lexer, HtmlFormatter(style='monokai'))
+            html = html.replace(code_blocks[i], formatted_code)
+        except Exception:
+            continue
+    return html
+
+
+def measure(render, corpus):
+    start = time.perf_counter()
+    for reply in corpus:
+        render(reply)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    replies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(42)
+    corpus = [make_reply(rng) for _ in range(replies)]
+    renderer = MarkdownRenderer(style='monokai')
+
+    # Warm up lexer and formatter caches for both
+    legacy_render(corpus[0])
+    renderer.render(corpus[0])
+
+    legacy = measure(legacy_render, corpus)
+    single_pass = measure(renderer.render, corpus)
+    print(f"{replies} replies, {sum(map(len, corpus)) / 1024:.0f} KiB")
+    print(f"{'legacy':>12} {legacy:>10.1f} ms  {legacy / replies:.3f} ms/reply")
+    print(f"{'single pass':>12} {single_pass:>10.1f} ms  {single_pass / replies:.3f} ms/reply")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark the per-chunk cost of showing a streamed reply in the transcript.
+
+Feeds a long markdown reply to the transcript in small chunks, as the
+response thread does, and times each chunk end to end: the markdown step,
+the delegate's layout of the message (sizeHint) and a synchronous paint of
+the viewport. Two modes are compared:
+
+  full         the message's whole HTML is set on every chunk, so the
+               delegate lays out a new document each time
+  incremental  the message streams through message.stream, so the delegate
+               only replaces the open block at the end of its document
+
+The per-chunk cost is reported for the first and the last tenth of the
+reply; it should stay flat for incremental and grow with the reply for full.
+
+Usage: python benchmarks/stream_paint.py [paragraphs] [chunk_chars]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+
+from app.renderer import MarkdownRenderer, IncrementalMarkdownRenderer
+from app.transcript_view import TranscriptView, ChatMessage
+
+PARAGRAPH = ("Streaming replies are shown while they are generated, so the cost of "
+             "each update must not depend on how much text came before it. ")
+CODE = "```python\ndef fib(n):\n    a, b = 0, 1\n    for _ in range(n):\n        a, b = b, a + b\n    return a\n```\n\n"
+
+
+def make_reply(paragraphs):
+    parts = []
+    for i in range(paragraphs):
+        parts.append(CODE if i % 5 == 4 else f"{PARAGRAPH * 3}\n\n")
+    return "".join(parts)
+
+
+def stream(app, view, renderer, reply, chunk_chars, incremental):
+    view.transcript.clear()
+    message = ChatMessage('ai', "")
+    stream_renderer = IncrementalMarkdownRenderer(renderer)
+    if incremental:
+        message.stream = stream_renderer
+    view.transcript.append_message(message)
+    row = view.transcript.row_of(message)
+
+    times = []
+    for start in range(0, len(reply), chunk_chars):
+        began = time.perf_counter()
+        chunk = reply[start:start + chunk_chars]
+        message.text += chunk
+        stream_renderer.feed(chunk)
+        if not incremental:
+            message.html = stream_renderer.html()
+        view.message_resized(row)
+        view.doItemsLayout()
+        view.scrollToBottom()
+        view.viewport().repaint()
+        times.append(time.perf_counter() - began)
+        app.processEvents()
+    return times
+
+
+def report(name, times):
+    tenth = max(1, len(times) // 10)
+    first = sum(times[:tenth]) / tenth * 1000
+    last = sum(times[-tenth:]) / tenth * 1000
+    print(f"{name:>12} {first:8.2f} ms/chunk first tenth {last:8.2f} ms/chunk last tenth"
+          f" {sum(times) * 1000:10.1f} ms total")
+
+
+def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chunk_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    app = QApplication(sys.argv)
+    renderer = MarkdownRenderer(style='monokai')
+    view = TranscriptView(code_css=renderer.css)
+    view.resize(900, 700)
+    view.show()
+    app.processEvents()
+
+    reply = make_reply(paragraphs)
+    chunks = (len(reply) + chunk_chars - 1) // chunk_chars
+    print(f"{len(reply) // 1024} KiB reply in {chunks} chunks of {chunk_chars} characters")
+    for name, incremental in (('full', False), ('incremental', True)):
+        report(name, stream(app, view, renderer, reply, chunk_chars, incremental))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark semantic history search on a memory-mapped vector index.
+
+Fills a VectorIndex with random unit vectors and times top-k queries.
+
+Usage: python benchmarks/vector_search.py [turns] [dim]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.vector_index import VectorIndex
+
+BATCH = 10_000
+REPEAT = 50
+TOP_K = 20
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(os.path.join(tmp, 'bench.vectors'))
+        for start in range(0, turns, BATCH):
+            count = min(BATCH, turns - start)
+            vectors = rng.standard_normal((count, dim), dtype=np.float32)
+            index.add(range(start + 1, start + count + 1), vectors, 'bench')
+
+        queries = rng.standard_normal((REPEAT, dim), dtype=np.float32)
+        index.search(queries[0], TOP_K)  # Fault the pages in
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, TOP_K)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+
+        size_mb = os.path.getsize(index.path + '.f32') / 1024 / 1024
+        print(f"{turns} turns x {dim} dims ({size_mb:.0f} MB)")
+        print(f"top-{TOP_K} median {timings[len(timings) // 2] * 1000:.2f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,488 @@
+import html
+import re
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 
+# Column order of the conversation rows returned by ChatDatabase
+CONVERSATION_COLUMNS = 'id, timestamp, model, user_message, ai_response, session'
+
+
+def _create_conversations(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            model TEXT,
+            user_message TEXT,
+            ai_response TEXT,
+            session TEXT DEFAULT 'Default'
+        )
+    ''')
+
+
+def _index_session(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session)')
+
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute('CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)')
+        cursor.execute('DROP TABLE temp._fts5_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _create_fulltext_index(cursor):
+    # SQLite builds without FTS5 keep using the LIKE fallback in search_conversations
+    if not _fts5_available(cursor):
+        return
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+            user_message,
+            ai_response,
+            content='conversations',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+            INSERT INTO conversations_fts(rowid, user_message, ai_response)
+            VALUES (new.id, new.user_message, new.ai_response);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+            INSERT INTO conversations_fts(conversations_fts, rowid, user_message, ai_response)
+            VALUES ('delete', old.id, old.user_message, old.ai_response);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE ON conversations BEGIN
+            INSERT INTO conversations_fts(conversations_fts, rowid, user_message, ai_response)
+            VALUES ('delete', old.id, old.user_message, old.ai_response);
+            INSERT INTO conversations_fts(rowid, user_message, ai_response)
+            VALUES (new.id, new.user_message, new.ai_response);
+        END
+    ''')
+    # Index conversations saved before this migration
+    cursor.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')")
+
+
+def _iso_to_epoch_ms(timestamp):
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _add_integer_timestamps(cursor):
+    # Epoch milliseconds sort and compare as integers; the ISO text column is
+    # kept for display and exports
+    cursor.execute('ALTER TABLE conversations ADD COLUMN ts INTEGER NOT NULL DEFAULT 0')
+    cursor.connection.create_function('iso_to_epoch_ms', 1, _iso_to_epoch_ms)
+    cursor.execute('UPDATE conversations SET ts = iso_to_epoch_ms(timestamp)')
+    cursor.execute('DROP INDEX IF EXISTS idx_conversations_session')
+    cursor.execute('CREATE INDEX idx_conversations_session_ts ON conversations(session, ts DESC, id DESC)')
+
+
+def _create_rendered_html(cursor):
+    # Rendered replies keyed by a hash of their source text and render
+    # settings, so history loads skip the markdown and highlighting work
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rendered_html (
+            key TEXT PRIMARY KEY,
+            html TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _create_attachments(cursor):
+    # Attached file contents stored once, keyed by the SHA-256 of the file,
+    # and the line ranges of them that each turn sent to the model
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            digest TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS message_attachments (
+            conversation_id INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            name TEXT NOT NULL,
+            start_line INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            PRIMARY KEY (conversation_id, digest, start_line, end_line)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_message_attachments_digest ON message_attachments(digest)')
+
+
+def fts_query(text):
+    """Turn free text typed by the user into a safe FTS5 MATCH expression.
+
+    Every word is quoted so FTS5 operators in the input are taken literally,
+    and the last word is a prefix match so results update while typing.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+# Schema migrations, applied in order. The database's PRAGMA user_version
+# records how many of them have run; append new steps, never edit old ones.
+MIGRATIONS = [
+    _create_conversations,
+    _index_session,
+    _create_fulltext_index,
+    _add_integer_timestamps,
+    _create_rendered_html,
+    _create_attachments,
+]
+
+# Maximum number of host parameters used in one IN (...) list
+_MAX_QUERY_PARAMS = 500
+
+# Match markers for snippet(), replaced by tags once the text is escaped
+_MATCH_START, _MATCH_END = '\x02', '\x03'
+
+
+def _highlight(snippet):
+    """HTML for a snippet(): the text escaped, then the matches wrapped in <b></b>"""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MATCH_START, '<b>').replace(_MATCH_END, '</b>')
+
+
 class ChatDatabase:
-    def __init__(self):
-        self.conn = sqlite3.connect('chat_history.db')
-        # Drop and recreate the table to include the new session column
-        self.reset_database()
+    def __init__(self, db_path='chat_history.db'):
+        self.conn = sqlite3.connect(db_path)
+        self._batch_depth = 0
+        self.configure()
+        self.migrate()
 
-    def reset_database(self):
+    def configure(self):
+        """Tune the connection for an interactive, single-writer workload"""
         cursor = self.conn.cursor()
-        # Drop the table if it exists
-        cursor.execute('DROP TABLE IF EXISTS conversations')
-        # Create the table with the session column
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                model TEXT,
-                user_message TEXT,
-                ai_response TEXT,
-                session TEXT DEFAULT 'Default'
-            )
-        ''')
-        self.conn.commit()
+        # WAL lets readers proceed while a write is in progress, and with
+        # synchronous=NORMAL a commit only fsyncs at checkpoints
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.execute('PRAGMA mmap_size = 268435456')  # 256 MB
+        cursor.execute('PRAGMA cache_size = -16000')    # 16 MB
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.execute('PRAGMA busy_timeout = 5000')
+
+    @contextmanager
+    def batch(self):
+        """Group every write made inside the block into a single commit"""
+        self._batch_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.rollback()
+            raise
+        else:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.commit()
+
+    def _commit(self):
+        if not self._batch_depth:
+            self.conn.commit()
+
+    @property
+    def schema_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self):
+        """Bring the schema up to date, keeping existing conversations"""
+        version = self.schema_version
+        if version >= len(MIGRATIONS):
+            return
+
+        cursor = self.conn.cursor()
+        try:
+            # Take the write lock up front so two instances can't both migrate
+            cursor.execute('BEGIN IMMEDIATE')
+            version = self.schema_version
+            for migration in MIGRATIONS[version:]:
+                migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
 
     def save_conversation(self, model, user_message, ai_response, session='Default'):
+        now = datetime.now()
         cursor = self.conn.cursor()
         cursor.execute('''
-            INSERT INTO conversations (timestamp, model, user_message, ai_response, session)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (datetime.now().isoformat(), model, user_message, ai_response, session))
-        self.conn.commit()
+            INSERT INTO conversations (timestamp, ts, model, user_message, ai_response, session)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (now.isoformat(), int(now.timestamp() * 1000), model, user_message, ai_response, session))
+        self._commit()
+        return cursor.lastrowid
+
+    def get_conversation(self, conversation_id):
+        cursor = self.conn.cursor()
+        cursor.execute(f'SELECT {CONVERSATION_COLUMNS} FROM conversations WHERE id = ?',
+                       (conversation_id,))
+        return cursor.fetchone()
 
     def get_recent_conversations(self, session='Default', limit=50):
         cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT * FROM conversations 
+        cursor.execute(f'''
+            SELECT {CONVERSATION_COLUMNS} FROM conversations
             WHERE session = ?
-            ORDER BY timestamp DESC 
+            ORDER BY ts DESC, id DESC
             LIMIT ?
         ''', (session, limit))
         return cursor.fetchall()
 
-    def search_conversations(self, query, session='Default'):
+    def get_page(self, session='Default', before_ts=None, limit=50, before_id=None):
+        """Return up to limit conversations older than (before_ts, before_id).
+
+        Keyset pagination: rows come newest first with their ts appended, and
+        the (ts, id) of the last row is the cursor for the next, older page.
+        Pass no cursor to get the newest page. Each page is an index range
+        scan, however deep into the history it is.
+        """
+        cursor = self.conn.cursor()
+        if before_ts is None:
+            cursor.execute(f'''
+                SELECT {CONVERSATION_COLUMNS}, ts FROM conversations
+                WHERE session = ?
+                ORDER BY ts DESC, id DESC
+                LIMIT ?
+            ''', (session, limit))
+        else:
+            if before_id is None:
+                before_id = -1  # Strictly older than before_ts
+            cursor.execute(f'''
+                SELECT {CONVERSATION_COLUMNS}, ts FROM conversations
+                WHERE session = ? AND (ts, id) < (?, ?)
+                ORDER BY ts DESC, id DESC
+                LIMIT ?
+            ''', (session, before_ts, before_id, limit))
+        return cursor.fetchall()
+
+    def get_conversations(self, conversation_ids):
+        """Return the conversations with the given ids, in no particular order"""
+        ids = list(conversation_ids)
+        rows = []
+        cursor = self.conn.cursor()
+        for start in range(0, len(ids), _MAX_QUERY_PARAMS):
+            chunk = ids[start:start + _MAX_QUERY_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT {CONVERSATION_COLUMNS} FROM conversations WHERE id IN ({placeholders})',
+                           chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def get_turns_after(self, last_id, limit=32):
+        """Return (id, user_message, ai_response) of conversations after last_id, oldest first"""
         cursor = self.conn.cursor()
         cursor.execute('''
-            SELECT * FROM conversations 
+            SELECT id, user_message, ai_response FROM conversations
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, limit))
+        return cursor.fetchall()
+
+    @property
+    def has_fulltext_index(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations_fts'")
+        return cursor.fetchone() is not None
+
+    def search(self, query, session=None, limit=50):
+        """Full-text search ranked by bm25, best match first.
+
+        Searches every session when session is None. Returns rows of
+        (id, timestamp, session, user_snippet, ai_snippet, rank), where the
+        snippets are HTML-escaped with matches wrapped in <b></b>.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = '''
+            SELECT c.id, c.timestamp, c.session,
+                   snippet(conversations_fts, 0, ?, ?, '…', 12),
+                   snippet(conversations_fts, 1, ?, ?, '…', 12),
+                   bm25(conversations_fts) AS rank
+            FROM conversations_fts
+            JOIN conversations c ON c.id = conversations_fts.rowid
+            WHERE conversations_fts MATCH ?
+        '''
+        params = [_MATCH_START, _MATCH_END, _MATCH_START, _MATCH_END, match]
+        if session is not None:
+            sql += ' AND c.session = ?'
+            params.append(session)
+        sql += ' ORDER BY rank LIMIT ?'
+        params.append(limit)
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        return [(*row[:3], _highlight(row[3]), _highlight(row[4]), row[5]) for row in cursor.fetchall()]
+
+    def find_conversations(self, query, session='Default', limit=200, before_ts=None, before_id=None):
+        """Return (id, ts) of up to limit conversations in session matching query.
+
+        Keyset pagination as in get_page: hits come newest first, and the
+        (ts, id) of the last one is the cursor for the next, older page.
+        """
+        if before_ts is None:
+            before_ts, before_id = 2 ** 63 - 1, 0
+        elif before_id is None:
+            before_id = -1  # Strictly older than before_ts
+        cursor = self.conn.cursor()
+        if self.has_fulltext_index:
+            match = fts_query(query)
+            if not match:
+                return []
+            cursor.execute('''
+                SELECT c.id, c.ts
+                FROM conversations_fts
+                JOIN conversations c ON c.id = conversations_fts.rowid
+                WHERE conversations_fts MATCH ? AND c.session = ? AND (c.ts, c.id) < (?, ?)
+                ORDER BY c.ts DESC, c.id DESC
+                LIMIT ?
+            ''', (match, session, before_ts, before_id, limit))
+        else:
+            cursor.execute('''
+                SELECT id, ts FROM conversations
+                WHERE session = ? AND (ts, id) < (?, ?)
+                    AND (user_message LIKE ? OR ai_response LIKE ?)
+                ORDER BY ts DESC, id DESC
+                LIMIT ?
+            ''', (session, before_ts, before_id, f'%{query}%', f'%{query}%', limit))
+        return cursor.fetchall()
+
+    def get_range(self, session, from_ts, from_id, before_ts, before_id):
+        """Return the conversations from (from_ts, from_id) up to, not including,
+        (before_ts, before_id), newest first and in the get_page row format"""
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT {CONVERSATION_COLUMNS}, ts FROM conversations
+            WHERE session = ? AND (ts, id) >= (?, ?) AND (ts, id) < (?, ?)
+            ORDER BY ts DESC, id DESC
+        ''', (session, from_ts, from_id, before_ts, before_id))
+        return cursor.fetchall()
+
+    def search_conversations(self, query, session='Default'):
+        cursor = self.conn.cursor()
+        if self.has_fulltext_index:
+            match = fts_query(query)
+            if not match:
+                return []
+            cursor.execute('''
+                SELECT c.id, c.timestamp, c.model, c.user_message, c.ai_response, c.session
+                FROM conversations_fts
+                JOIN conversations c ON c.id = conversations_fts.rowid
+                WHERE conversations_fts MATCH ? AND c.session = ?
+                ORDER BY bm25(conversations_fts)
+            ''', (match, session))
+            return cursor.fetchall()
+
+        cursor.execute(f'''
+            SELECT {CONVERSATION_COLUMNS} FROM conversations
             WHERE session = ? AND (
-                user_message LIKE ? OR 
+                user_message LIKE ? OR
                 ai_response LIKE ?
             )
-            ORDER BY timestamp DESC
+            ORDER BY ts DESC, id DESC
         ''', (session, f'%{query}%', f'%{query}%'))
         return cursor.fetchall()
 
+    def get_rendered_html(self, keys):
+        """Return {key: html} for the keys that have a stored rendering"""
+        keys = list(keys)
+        found = {}
+        cursor = self.conn.cursor()
+        for start in range(0, len(keys), _MAX_QUERY_PARAMS):
+            chunk = keys[start:start + _MAX_QUERY_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT key, html FROM rendered_html WHERE key IN ({placeholders})', chunk)
+            found.update(cursor.fetchall())
+        return found
+
+    def save_rendered_html(self, key, html):
+        cursor = self.conn.cursor()
+        cursor.execute('INSERT OR REPLACE INTO rendered_html (key, html) VALUES (?, ?)', (key, html))
+        self._commit()
+
+    def prune_rendered_html(self, prefix):
+        """Delete the stored renderings whose key doesn't start with prefix"""
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM rendered_html WHERE substr(key, 1, ?) != ?', (len(prefix), prefix))
+        self._commit()
+
+    def save_attachment(self, digest, content):
+        """Store an attached file's text unless the same content is already stored"""
+        cursor = self.conn.cursor()
+        cursor.execute('INSERT OR IGNORE INTO attachments (digest, size, content) VALUES (?, ?, ?)',
+                       (digest, len(content), content))
+        self._commit()
+
+    def link_attachments(self, conversation_id, excerpts):
+        """Record the excerpts, as (digest, name, start_line, end_line), sent with a turn"""
+        cursor = self.conn.cursor()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO message_attachments
+                (conversation_id, digest, name, start_line, end_line)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(conversation_id, *excerpt) for excerpt in excerpts])
+        self._commit()
+
+    def get_message_attachments(self, conversation_ids):
+        """Return {conversation_id: [(digest, name, start_line, end_line), ...]}"""
+        conversation_ids = list(conversation_ids)
+        found = {}
+        cursor = self.conn.cursor()
+        for start in range(0, len(conversation_ids), _MAX_QUERY_PARAMS):
+            chunk = conversation_ids[start:start + _MAX_QUERY_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT conversation_id, digest, name, start_line, end_line
+                FROM message_attachments
+                WHERE conversation_id IN ({placeholders})
+                ORDER BY conversation_id, name, start_line
+            ''', chunk)
+            for conversation_id, *excerpt in cursor.fetchall():
+                found.setdefault(conversation_id, []).append(tuple(excerpt))
+        return found
+
+    def get_attachments(self, digests):
+        """Return {digest: content} for the stored attachments among digests"""
+        digests = list(digests)
+        found = {}
+        cursor = self.conn.cursor()
+        for start in range(0, len(digests), _MAX_QUERY_PARAMS):
+            chunk = digests[start:start + _MAX_QUERY_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT digest, content FROM attachments WHERE digest IN ({placeholders})', chunk)
+            found.update(cursor.fetchall())
+        return found
+
+    def get_sessions(self):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT DISTINCT session FROM conversations ORDER BY session')
+        return [row[0] for row in cursor.fetchall()]
+
     def clear_history(self):
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM conversations')
-        self.conn.commit()
+        cursor.execute('DELETE FROM rendered_html')
+        cursor.execute('DELETE FROM message_attachments')
+        cursor.execute('DELETE FROM attachments')
+        self._commit()
@@ -0,0 +1,90 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from app.attachment_batch import AttachBatchThread, IgnoreRules, collect_files
+
+
+def make_tree(root, files):
+    for rel_path, content in files.items():
+        path = os.path.join(root, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def relative(root, paths):
+    return [os.path.relpath(path, root).replace(os.sep, '/') for path in paths]
+
+
+def test_ignore_rules_follow_gitignore_semantics():
+    rules = IgnoreRules([])
+    rules.add(['# comment', '*.log', '!keep.log', 'build/', '/top.txt', 'docs/**/*.tmp', 'a?c'])
+
+    assert rules.ignored('debug.log')
+    assert rules.ignored('src/deep/debug.log')
+    assert not rules.ignored('keep.log')
+    assert rules.ignored('build', is_dir=True)
+    assert rules.ignored('src/build', is_dir=True)
+    assert not rules.ignored('build')  # A file, not a directory
+    assert rules.ignored('top.txt')
+    assert not rules.ignored('src/top.txt')
+    assert rules.ignored('docs/a/b/x.tmp')
+    assert rules.ignored('docs/x.tmp')
+    assert rules.ignored('abc')
+    assert not rules.ignored('abbc')
+
+
+def test_nested_patterns_apply_below_their_directory():
+    rules = IgnoreRules([])
+    rules.add(['*.txt'], base='sub')
+
+    assert rules.ignored('sub/notes.txt')
+    assert rules.ignored('sub/deeper/notes.txt')
+    assert not rules.ignored('notes.txt')
+
+
+def test_collect_files_skips_ignored_paths(tmp_path):
+    root = str(tmp_path)
+    make_tree(root, {
+        '.gitignore': "*.log\n",
+        'main.py': "print()",
+        'run.log': "log",
+        'node_modules/lib/index.js': "js",
+        'pkg/.gitignore': "generated/\n!important.log\n",
+        'pkg/module.py': "x = 1",
+        'pkg/important.log': "kept",
+        'pkg/generated/out.py': "y = 2",
+        'other/generated/out.py': "z = 3",
+    })
+
+    assert relative(root, collect_files(root)) == [
+        '.gitignore', 'main.py', 'other/generated/out.py',
+        'pkg/.gitignore', 'pkg/important.log', 'pkg/module.py',
+    ]
+
+
+def test_batch_reads_only_the_files_within_the_budget(tmp_path):
+    root = str(tmp_path)
+    make_tree(root, {'a.txt': "a" * 400, 'b.txt': "b" * 4000, 'd.txt': "d" * 40, 'e.txt': "e" * 40})
+    # Would leave too little of the budget for d.txt if it were counted
+    (tmp_path / 'c.bin').write_bytes(b"\0\1" * 180)
+    read = []
+
+    def load(path):
+        read.append(os.path.basename(path))
+        return SimpleNamespace(binary=path.endswith('.bin'))
+
+    results = []
+    thread = AttachBatchThread(load, [root], token_budget=200)
+    thread.loaded.connect(lambda attached, skipped: results.append((attached, skipped)))
+    thread.run()
+
+    attached, skipped = results[0]
+    assert sorted(read) == ['a.txt', 'd.txt', 'e.txt']
+    assert [os.path.basename(path) for path, _ in attached] == ['a.txt', 'd.txt', 'e.txt']
+    assert sorted((os.path.basename(path), reason) for path, reason in skipped) == [
+        ('b.txt', "over the token budget"), ('c.bin', "binary file")]
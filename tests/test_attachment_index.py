@@ -0,0 +1,118 @@
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from app.attachment_index import AttachmentIndex, chunk_text
+from app.vector_index import FakeEmbedder
+
+
+class FailingEmbedder(FakeEmbedder):
+    """Indexes like FakeEmbedder, then fails once the server is gone"""
+
+    def __init__(self):
+        super().__init__()
+        self.available = True
+
+    def embed(self, texts):
+        if not self.available:
+            raise ConnectionError("embedding server unreachable")
+        return super().embed(texts)
+
+
+def large_text(needle_line=200, needle="the tokenizer handles unicode normalization"):
+    lines = [f"line {n} filler text about nothing in particular" for n in range(1, 401)]
+    lines[needle_line - 1] = f"line {needle_line} {needle}"
+    return "\n".join(lines)
+
+
+def test_chunks_cover_the_text_with_their_line_numbers():
+    text = "\n".join(f"line {n}" for n in range(1, 501))
+    lines = text.splitlines()
+    chunks = chunk_text('f.txt', text, chunk_chars=200)
+    assert chunks[0].start_line == 1
+    assert chunks[-1].end_line == 500
+    for chunk in chunks:
+        assert chunk.text == "\n".join(lines[chunk.start_line - 1:chunk.end_line])
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start_line <= previous.end_line + 1
+
+
+def test_long_lines_are_not_split():
+    text = "short\n" + "x" * 4000 + "\nend"
+    chunks = chunk_text('f.txt', text, chunk_chars=1500)
+    keys = [(chunk.start_line, chunk.end_line) for chunk in chunks]
+    assert len(keys) == len(set(keys))
+    assert any(chunk.text == "x" * 4000 for chunk in chunks)
+
+
+def test_small_files_are_ranked_not_always_included():
+    index = AttachmentIndex(FakeEmbedder())
+    for n in range(20):
+        index.add(f"small{n}.py", f"def helper{n}():\n    return {n}\n")
+    index.add('big.txt', large_text())
+    chunks = index.retrieve("how does the tokenizer handle unicode normalization")
+    assert any(chunk.name == 'big.txt' and chunk.start_line <= 200 <= chunk.end_line
+               for chunk in chunks)
+
+
+def test_pinned_small_file_is_always_sent():
+    index = AttachmentIndex(FakeEmbedder())
+    index.add('big.txt', large_text())
+    index.add('notes.md', "unrelated words only\n", pin=True)
+    chunks = index.retrieve("tokenizer unicode normalization")
+    assert chunks[0].name == 'notes.md'
+    # Pinning another file replaces it
+    index.add('other.md', "also unrelated\n", pin=True)
+    names = [chunk.name for chunk in index.retrieve("tokenizer unicode normalization")]
+    assert names[0] == 'other.md'
+    assert 'notes.md' not in names[:1]
+
+
+def test_query_embedding_failure_falls_back_to_keywords():
+    embedder = FailingEmbedder()
+    index = AttachmentIndex(embedder)
+    index.add('big.txt', large_text())
+    embedder.available = False
+    chunks = index.retrieve("tokenizer unicode normalization")
+    assert chunks
+    assert chunks[0].start_line <= 200 <= chunks[0].end_line
+
+
+def test_retrieve_stays_within_token_budget():
+    index = AttachmentIndex(FakeEmbedder())
+    index.add('big.txt', large_text())
+    chunks = index.retrieve("line filler", k=50, max_tokens=300)
+    assert sum(len(chunk.text) // 4 + 1 for chunk in chunks) <= 300
+
+
+def test_large_files_are_searched_on_disk(tmp_path):
+    path = tmp_path / 'huge.log'
+    path.write_text(large_text(needle="ERROR disk quota exceeded"))
+    index = AttachmentIndex(FakeEmbedder())
+    index.add_file('huge.log', str(path))
+    chunks = index.retrieve("why was the disk quota exceeded")
+    assert chunks[0].name == 'huge.log'
+    assert "ERROR disk quota exceeded" in chunks[0].text
+
+
+def test_excerpt_keys_need_a_digest():
+    index = AttachmentIndex(FakeEmbedder())
+    index.add('a.txt', large_text(), digest='abc')
+    index.add('b.txt', large_text())
+    chunks = {chunk.name: chunk for chunk in index.retrieve("tokenizer unicode", k=20)}
+    assert chunks['a.txt'].key[0] == 'abc'
+    assert chunks['b.txt'].key is None
+
+
+def test_keyword_hits_do_not_crowd_out_embedded_chunks(tmp_path):
+    # Each match in the log repeats the query words, so its keyword scores
+    # are far above any cosine similarity
+    path = tmp_path / 'huge.log'
+    path.write_text("\n".join(f"tokenizer unicode normalization retry {n}" if n % 10 == 0 else "-"
+                              for n in range(400)))
+    index = AttachmentIndex(FakeEmbedder())
+    index.add_file('huge.log', str(path))
+    index.add('big.txt', large_text())
+    names = [chunk.name for chunk in index.retrieve("tokenizer unicode normalization", k=4)]
+    assert 'big.txt' in names
+    assert 'huge.log' in names
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from app import data_profiler, ingest
+from app.data_profiler import DataProfile, _flatten, profile_csv, profile_json
+
+CSV = """id,price,qty,city,active,when
+1,10.5,2,Paris,yes,2024-01-01
+2,20.5,4,Berlin,no,2024-01-02
+3,NA,6,Paris,yes,2024-01-03
+4,40.5,8,Rome,yes,2024-01-04
+"""
+
+
+def column_line(text, name):
+    return next(line for line in text.splitlines() if line.startswith(f"- {name} "))
+
+
+def test_csv_profile_infers_kinds_and_statistics(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text(CSV)
+    text = profile_csv(str(path))
+
+    assert text.startswith("Dataset: data.csv (0.0 MB, 4 rows, 6 columns)")
+    assert column_line(text, 'id').startswith("- id (integer): 0 nulls; 4 distinct; min 1,")
+    assert "1 nulls" in column_line(text, 'price')
+    assert "mean 23.8333" in column_line(text, 'price')
+    assert column_line(text, 'city').startswith("- city (text)")
+    assert "top: Paris (50%)" in column_line(text, 'city')
+    assert column_line(text, 'active').startswith("- active (boolean)")
+    assert column_line(text, 'when').startswith("- when (datetime)")
+    assert "First 4 rows:" in text
+
+
+def test_csv_with_only_a_header_lists_its_columns(tmp_path):
+    path = tmp_path / 'empty.csv'
+    path.write_text("id,price,city\n")
+    text = profile_csv(str(path))
+
+    assert text.startswith("Dataset: empty.csv (0.0 MB, 0 rows, 3 columns)")
+    assert column_line(text, 'price').startswith("- price (empty)")
+
+
+def test_statistics_are_exact_across_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(data_profiler, 'CHUNK_ROWS', 7)
+    values = np.random.default_rng(1).normal(1e6, 3.0, 100)
+    path = tmp_path / 'values.csv'
+    path.write_text("x,y\n" + "".join(f"{x!r},{-2 * x!r}\n" for x in values.tolist()))
+    text = profile_csv(str(path))
+
+    line = column_line(text, 'x')
+    assert f"mean {data_profiler._number(values.mean())}" in line
+    assert f"std {data_profiler._number(values.std())}" in line
+    assert "Strongest correlations: x ~ y -1.00" in text
+
+
+def test_correlations_use_rows_where_both_columns_are_present():
+    profile = DataProfile('data', 0)
+    header = ['a', 'b', 'c']
+    profile.add_chunk(header, [['1', '2', 'x'], ['2', '4', 'y'], ['3', '', 'z']])
+    profile.add_chunk(header, [['4', '8', 'w'], ['', '10', 'v'], ['6', '12', 'u']])
+
+    [(a, b, r)] = profile.correlations()
+    assert (a, b) == ('a', 'b')
+    assert r == pytest.approx(1.0)
+
+
+def test_large_csv_is_profiled_from_a_sample(monkeypatch, tmp_path):
+    monkeypatch.setattr(data_profiler, 'FULL_SCAN_BYTES', 1024)
+    monkeypatch.setattr(data_profiler, 'SAMPLE_BLOCKS', 4)
+    monkeypatch.setattr(data_profiler, 'SAMPLE_BLOCK_BYTES', 256)
+    path = tmp_path / 'big.csv'
+    path.write_text("n,label\n" + "".join(f"{n},row {n}\n" for n in range(5000)))
+    text = profile_csv(str(path))
+
+    assert "5,000 rows" in text.splitlines()[0]
+    assert "Statistics from a sample of" in text
+    assert "% nulls" in column_line(text, 'n')
+
+
+def test_flatten_makes_dotted_string_columns():
+    record = {'a': 1, 'b': {'c': None, 'd': [1, 2], 'e': {'f': True}}}
+    assert _flatten(record) == {'a': '1', 'b.c': '', 'b.d': '[1, 2]', 'b.e.f': 'true'}
+    assert _flatten(3.5) == {'value': '3.5'}
+
+
+@pytest.mark.parametrize('layout', ['array', 'lines'])
+def test_json_profile_reads_arrays_and_json_lines(monkeypatch, tmp_path, layout):
+    # Small decode chunks so records and numbers are cut between chunks
+    iter_text = ingest.iter_text
+    monkeypatch.setattr(ingest, 'iter_text', lambda path: iter_text(path, chunk_size=7))
+    records = [{'id': n, 'user': {'name': f"user {n}"}, 'score': n * 1.5} for n in range(50)]
+    records[3]['extra'] = "late column"
+    path = tmp_path / 'data.json'
+    if layout == 'array':
+        path.write_text(json.dumps(records))
+    else:
+        path.write_text("\n".join(json.dumps(record) for record in records) + "\n")
+    text = profile_json(str(path))
+
+    assert "50 rows, 4 columns" in text.splitlines()[0]
+    assert "max 49" in column_line(text, 'id')
+    assert column_line(text, 'user.name').startswith("- user.name (text): 0 nulls; 50 distinct")
+    assert column_line(text, 'extra').startswith("- extra (text): 49 nulls")
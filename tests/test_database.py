@@ -0,0 +1,235 @@
+import sqlite3
+
+import pytest
+
+from model.database import ChatDatabase, MIGRATIONS, fts_query
+
+
+def _has_fts5():
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE probe USING fts5(x)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+needs_fts5 = pytest.mark.skipif(not _has_fts5(), reason="SQLite built without FTS5")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'chat.db')
+
+
+@pytest.fixture
+def db(db_path):
+    database = ChatDatabase(db_path)
+    yield database
+    database.conn.close()
+
+
+def test_new_database_is_at_the_latest_schema_version(db):
+    assert db.schema_version == len(MIGRATIONS)
+
+
+def test_history_survives_reopening(db_path):
+    db = ChatDatabase(db_path)
+    db.save_conversation('llama3', "hello", "hi there", 'Work')
+    db.conn.close()
+
+    db = ChatDatabase(db_path)
+    rows = db.get_recent_conversations('Work')
+    assert [(row[3], row[4], row[5]) for row in rows] == [("hello", "hi there", 'Work')]
+    assert db.get_sessions() == ['Work']
+    db.conn.close()
+
+
+def test_unversioned_database_is_migrated_in_place(db_path):
+    # The schema from before migrations were tracked, with user_version 0
+    conn = sqlite3.connect(db_path)
+    MIGRATIONS[0](conn.cursor())
+    conn.execute("INSERT INTO conversations (timestamp, model, user_message, ai_response, session) "
+                 "VALUES ('2024-03-01T12:00:00', 'llama3', 'old question', 'old answer', 'Default')")
+    conn.commit()
+    conn.close()
+
+    db = ChatDatabase(db_path)
+    assert db.schema_version == len(MIGRATIONS)
+    assert [row[3] for row in db.get_recent_conversations()] == ['old question']
+    db.conn.close()
+
+
+def test_up_to_date_database_runs_no_migration(db_path, monkeypatch):
+    ChatDatabase(db_path).conn.close()
+
+    def fail(cursor):
+        raise AssertionError("migration ran again")
+
+    monkeypatch.setattr('model.database.MIGRATIONS', [fail] * len(MIGRATIONS))
+    ChatDatabase(db_path).conn.close()
+
+
+def test_failed_migration_is_rolled_back(db_path, monkeypatch):
+    def broken(cursor):
+        cursor.execute('CREATE TABLE half_done (x)')
+        raise sqlite3.OperationalError("disk full")
+
+    monkeypatch.setattr('model.database.MIGRATIONS', [MIGRATIONS[0], broken])
+    with pytest.raises(sqlite3.OperationalError):
+        ChatDatabase(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name IN ('conversations', 'half_done')"
+                        ).fetchall() == []
+    conn.close()
+
+
+def test_fts_query_quotes_words_and_prefixes_the_last():
+    assert fts_query("pasta sauce") == '"pasta" "sauce"*'
+    assert fts_query('NOT "a" OR b*') == '"NOT" "a" "OR" "b"*'
+    assert fts_query("  ?! ") == ''
+
+
+@needs_fts5
+def test_search_ranks_matches_and_highlights_them(db):
+    db.save_conversation('llama3', "how do I cook pasta", "boil the pasta in salted water")
+    db.save_conversation('llama3', "tell me about engines", "engines burn fuel")
+    db.save_conversation('llama3', "pasta again", "sure", 'Work')
+
+    rows = db.search("pasta")
+    assert {row[2] for row in rows} == {'Default', 'Work'}
+    assert '<b>pasta</b>' in rows[0][3] + rows[0][4]
+    assert [row[2] for row in db.search("pasta", session='Work')] == ['Work']
+    # The last word is a prefix, and operators are plain words
+    assert len(db.search("engi")) == 1
+    assert db.search("pasta NOT engines") == []
+
+
+@needs_fts5
+def test_search_snippets_are_escaped(db):
+    db.save_conversation('llama3', "is a<b && b>c valid pasta", "<script>pasta</script>")
+
+    rows = db.search("pasta")
+    assert rows[0][3] == "is a&lt;b &amp;&amp; b&gt;c valid <b>pasta</b>"
+    assert rows[0][4] == "&lt;script&gt;<b>pasta</b>&lt;/script&gt;"
+
+
+@needs_fts5
+def test_fulltext_index_follows_updates_and_deletes(db):
+    conversation_id = db.save_conversation('llama3', "question", "old answer")
+    db.conn.execute("UPDATE conversations SET ai_response = 'new answer' WHERE id = ?",
+                    (conversation_id,))
+    assert db.search("old") == []
+    assert len(db.search("new")) == 1
+
+    db.conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+    assert db.search("new") == []
+
+
+def test_search_conversations_without_fts5(db):
+    db.save_conversation('llama3', "how do I cook pasta", "boil it")
+    db.save_conversation('llama3', "engines", "burn fuel")
+    db.conn.execute('DROP TABLE IF EXISTS conversations_fts')
+
+    assert [row[3] for row in db.search_conversations("pasta")] == ["how do I cook pasta"]
+
+
+def test_timestamp_migration_backfills_ts_from_iso_timestamps(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for migration in MIGRATIONS[:3]:
+        migration(cursor)
+    conn.execute("INSERT INTO conversations (timestamp, model, user_message, ai_response, session) "
+                 "VALUES ('2024-03-01T12:00:00', 'llama3', 'older', 'a', 'Default'), "
+                 "('2024-03-02T12:00:00', 'llama3', 'newer', 'b', 'Default'), "
+                 "('not a date', 'llama3', 'broken', 'c', 'Default')")
+    conn.execute('PRAGMA user_version = 3')
+    conn.commit()
+    conn.close()
+
+    db = ChatDatabase(db_path)
+    ts = dict(db.conn.execute('SELECT user_message, ts FROM conversations'))
+    assert ts['newer'] - ts['older'] == 24 * 3600 * 1000
+    assert ts['broken'] == 0
+    assert [row[3] for row in db.get_recent_conversations()] == ['newer', 'older', 'broken']
+    db.conn.close()
+
+
+def test_recent_history_is_an_index_range_scan(db):
+    plan = db.conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT id FROM conversations WHERE session = ? ORDER BY ts DESC, id DESC LIMIT 50
+    ''', ('Default',)).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert 'idx_conversations_session_ts' in details
+    assert 'TEMP B-TREE' not in details
+
+
+def test_get_page_walks_the_history_newest_first(db):
+    ids = [db.save_conversation('llama3', f"question {n}", "answer") for n in range(23)]
+    db.save_conversation('llama3', "other session", "answer", 'Work')
+    # Turns saved within the same millisecond are ordered by id
+    db.conn.execute('UPDATE conversations SET ts = 1000 WHERE id <= ?', (ids[9],))
+
+    seen, cursor = [], (None, None)
+    while True:
+        page = db.get_page('Default', cursor[0], 10, cursor[1])
+        if not page:
+            break
+        assert len(page) <= 10
+        seen.extend(row[0] for row in page)
+        cursor = (page[-1][6], page[-1][0])
+    assert seen == ids[::-1]
+
+
+def test_get_page_without_id_returns_rows_strictly_older_than_ts(db):
+    for n in range(3):
+        db.save_conversation('llama3', f"question {n}", "answer")
+    db.conn.execute('UPDATE conversations SET ts = id * 1000')
+
+    assert [row[0] for row in db.get_page('Default', 3000)] == [2, 1]
+
+
+def test_get_page_is_an_index_range_scan(db):
+    plan = db.conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT id FROM conversations WHERE session = ? AND (ts, id) < (?, ?)
+        ORDER BY ts DESC, id DESC LIMIT 50
+    ''', ('Default', 1000, 5)).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert 'idx_conversations_session_ts' in details
+    assert 'TEMP B-TREE' not in details
+
+
+@pytest.mark.parametrize('fulltext', [True, False])
+def test_find_conversations_pages_hits_newest_first(db, fulltext):
+    if fulltext and not db.has_fulltext_index:
+        pytest.skip("SQLite built without FTS5")
+    ids = [db.save_conversation('llama3', f"pasta question {n}" if n % 2 else f"other {n}", "answer")
+           for n in range(30)]
+    db.save_conversation('llama3', "pasta elsewhere", "answer", 'Work')
+    db.conn.execute('UPDATE conversations SET ts = 1000 WHERE id <= ?', (ids[9],))
+    if not fulltext:
+        db.conn.execute('DROP TABLE conversations_fts')
+
+    seen, cursor = [], (None, None)
+    while True:
+        hits = db.find_conversations("pasta", 'Default', 4, *cursor)
+        if not hits:
+            break
+        assert len(hits) <= 4
+        seen.extend(hit[0] for hit in hits)
+        cursor = (hits[-1][1], hits[-1][0])
+    assert seen == ids[1::2][::-1]
+
+
+def test_prune_rendered_html_keeps_only_the_current_prefix(db):
+    for key in ('3/monokai/aa', '3/monokai/bb', '2/monokai/aa', '3/default/aa', 'c0ffee'):
+        db.save_rendered_html(key, f"<p>{key}</p>")
+    db.prune_rendered_html('3/monokai/')
+    keys = [row[0] for row in db.conn.execute('SELECT key FROM rendered_html ORDER BY key')]
+    assert keys == ['3/monokai/aa', '3/monokai/bb']
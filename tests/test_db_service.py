@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from PyQt6.QtCore import QCoreApplication
+
+from app.db_service import DatabaseService
+from model.database import ChatDatabase
+
+
+def wait_for(condition, timeout=5.0):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def service(tmp_path):
+    db = DatabaseService(str(tmp_path / 'chat.db'))
+    yield db
+    db.stop()
+
+
+def test_database_is_in_wal_mode(service):
+    service.call('get_sessions')
+    conn = sqlite3.connect(service.db_path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+
+
+def test_reads_see_the_writes_queued_before_them(service):
+    for n in range(10):
+        service.write('save_conversation', 'llama3', f"question {n}", "answer")
+    results = []
+    service.read('get_recent_conversations', 'Default', 50, callback=results.append)
+    assert wait_for(lambda: results)
+    assert len(results[0]) == 10
+
+
+def test_callbacks_run_on_the_calling_thread(service):
+    threads = []
+    service.read('get_sessions', callback=lambda result: threads.append(threading.current_thread()))
+    assert wait_for(lambda: threads)
+    assert threads == [threading.current_thread()]
+
+
+def test_call_blocks_until_served_and_raises_errors(service):
+    service.write('save_conversation', 'llama3', "question", "answer", 'Work')
+    assert service.call('get_sessions') == ['Work']
+    with pytest.raises(AttributeError):
+        service.call('no_such_method')
+
+
+def test_a_failed_write_does_not_take_its_group_down(service, monkeypatch):
+    # Hold the service thread so the writes are queued as one group
+    release = threading.Event()
+    monkeypatch.setattr(ChatDatabase, 'get_sessions', lambda db: release.wait())
+    service.read('get_sessions')
+    errors = []
+    service.error_occurred.connect(errors.append)
+    service.write('save_conversation', 'llama3', "kept", "answer")
+    service.write('no_such_method')
+    service.write('save_conversation', 'llama3', "kept too", "answer")
+    release.set()
+    assert wait_for(lambda: errors)
+    assert len(errors) == 1 and 'no_such_method' in errors[0]
+    rows = service.call('get_recent_conversations')
+    assert sorted(row[3] for row in rows) == ["kept", "kept too"]
+
+
+def test_requests_fail_instead_of_hanging_when_the_database_cannot_open(tmp_path):
+    service = DatabaseService(str(tmp_path / 'missing' / 'chat.db'))
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            service.call('get_sessions')
+        # Later requests too
+        with pytest.raises(sqlite3.OperationalError):
+            service.call('get_sessions')
+    finally:
+        service.stop()
+
+
+def test_a_failed_read_calls_on_error(service):
+    results, failures = [], []
+    service.read('no_such_method', callback=results.append, on_error=failures.append)
+    assert wait_for(lambda: failures)
+    assert isinstance(failures[0], AttributeError)
+    assert results == []
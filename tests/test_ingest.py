@@ -0,0 +1,83 @@
+import pytest
+
+from app import ingest
+
+
+@pytest.fixture
+def numbered(tmp_path):
+    """A 60-line file whose lines 12, 14, 30, 33, 34 and 50 contain HIT"""
+    hits = {12, 14, 30, 33, 34, 50}
+    path = tmp_path / 'numbered.txt'
+    path.write_text("".join(f"line {n}{' HIT' if n in hits else ''}\n" for n in range(1, 61)))
+    return str(path)
+
+
+def line_numbers(results):
+    numbers = []
+    for first, text in results:
+        lines = text.split("\n")
+        assert [int(line.split()[1]) for line in lines] == list(range(first, first + len(lines)))
+        numbers.extend(range(first, first + len(lines)))
+    return numbers
+
+
+def test_grep_without_context_returns_matching_lines(numbered):
+    results = ingest.grep(numbered, b'hit', context=0)
+    assert [first for first, _ in results] == [12, 14, 30, 33, 50]
+    assert results[0] == (12, "line 12 HIT")
+    # Touching matches are one window
+    assert results[3] == (33, "line 33 HIT\nline 34 HIT")
+
+
+@pytest.mark.parametrize('context', [1, 2, 3])
+def test_grep_merges_overlapping_windows(numbered, context):
+    numbers = line_numbers(ingest.grep(numbered, b'hit', context=context))
+    assert len(numbers) == len(set(numbers))
+    for hit in (12, 14, 30, 33, 34, 50):
+        assert set(range(hit - context, hit + context + 1)) <= set(numbers)
+
+
+def test_grep_context_one_shows_line_13_once(numbered):
+    results = ingest.grep(numbered, b'hit', context=1)
+    assert results[0] == (11, "line 11\nline 12 HIT\nline 13\nline 14 HIT\nline 15")
+
+
+def test_grep_limits_matching_lines(numbered):
+    results = ingest.grep(numbered, b'hit', max_matches=2, context=0)
+    assert [first for first, _ in results] == [12, 14]
+
+
+def test_grep_context_stops_at_file_edges(tmp_path):
+    path = tmp_path / 'short.txt'
+    path.write_text("HIT a\nb\nc")
+    assert ingest.grep(str(path), b'hit', context=5) == [(1, "HIT a\nb\nc")]
+    assert ingest.grep(str(path), b'c', context=1) == [(2, "b\nc")]
+
+
+def test_grep_counts_lines_across_count_windows(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'COUNT_WINDOW', 7)
+    path = tmp_path / 'long.txt'
+    path.write_text("".join(f"{n}\n" for n in range(1, 200)) + "needle\n")
+    assert ingest.grep(str(path), b'needle') == [(200, "needle")]
+
+
+def test_head_and_tail(tmp_path):
+    path = tmp_path / 'lines.txt'
+    path.write_text("".join(f"{n}\n" for n in range(1, 11)))
+    assert ingest.head(str(path), 3) == "1\n2\n3\n"
+    assert ingest.tail(str(path), 2) == "9\n10\n"
+
+
+def test_iter_text_decodes_characters_split_across_chunks(tmp_path):
+    path = tmp_path / 'utf8.txt'
+    text = "é" * 1000
+    path.write_bytes(text.encode('utf-8'))
+    assert "".join(ingest.iter_text(str(path), chunk_size=7)) == text
+
+
+def test_is_binary(tmp_path):
+    text, binary = tmp_path / 'a.txt', tmp_path / 'b.bin'
+    text.write_text("plain text\n")
+    binary.write_bytes(b"\x00\x01\x02PNG")
+    assert not ingest.is_binary(str(text))
+    assert ingest.is_binary(str(binary))
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from app import ollama_client
+from app.ollama_client import OllamaSessionClient
+
+
+class FakeServer:
+    """Answers /api/generate like Ollama, with one context token per request"""
+
+    def __init__(self):
+        self.payloads = []
+
+    def post(self, url, json=None, **kwargs):
+        self.payloads.append(json)
+        context = list(json.get('context', [])) + [len(self.payloads)]
+        return FakeResponse({'response': f"reply {len(self.payloads)}", 'context': context})
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+    def iter_lines(self):
+        # Streamed as one token, then the final message with the context
+        yield json.dumps({'response': self.data['response']}).encode()
+        yield json.dumps({'done': True, 'context': self.data['context']}).encode()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeServer()
+    monkeypatch.setattr(ollama_client.requests, 'post', fake.post)
+    return fake
+
+
+def test_context_is_reused_within_a_session(server):
+    client = OllamaSessionClient('model-a')
+    client.invoke("first", session='s')
+    client.invoke("second", session='s')
+    client.invoke("elsewhere", session='t')
+
+    assert 'context' not in server.payloads[0]
+    assert server.payloads[1]['context'] == [1]
+    assert 'context' not in server.payloads[2]
+
+
+def test_switching_models_back_does_not_revive_an_old_context(server):
+    client = OllamaSessionClient('model-a')
+    client.invoke("asked a", session='s')
+    client.configure(model='model-b')
+    client.invoke("asked b", session='s')
+    client.configure(model='model-a')
+
+    # The context from model-a doesn't hold the turn model-b answered
+    assert not client.has_context('s')
+
+
+def test_context_is_filed_under_the_model_it_was_generated_with(server, monkeypatch):
+    client = OllamaSessionClient('model-a')
+
+    def switch_while_generating(url, json=None, **kwargs):
+        client.configure(model='model-b')
+        return server.post(url, json=json, **kwargs)
+
+    monkeypatch.setattr(ollama_client.requests, 'post', switch_while_generating)
+    client.invoke("asked a", session='s')
+
+    client.configure(model='model-a')
+    assert client.get_context('s') == [1]
+
+
+def test_streamed_replies_store_their_context(server):
+    client = OllamaSessionClient('model-a')
+    assert "".join(client.stream("first", session='s')) == "reply 1"
+    assert client.get_context('s') == [1]
+
+
+def test_context_over_the_budget_is_dropped(server):
+    client = OllamaSessionClient('model-a', max_context_tokens=2)
+    client.invoke("one", session='s')
+    client.invoke("two", session='s')
+    assert client.get_context('s') == [1, 2]
+
+    client.invoke("three", session='s')
+    assert not client.has_context('s')
+    # Rebuilt from the history, and reused again from there
+    client.invoke("four", session='s')
+    assert client.get_context('s') == [4]
+
+    client.invoke("five", session='s')
+    client.configure(max_context_tokens=1)
+    assert not client.has_context('s')
@@ -0,0 +1,44 @@
+from app.render_cache import RenderCache
+
+
+class FakeService:
+    """Answers DatabaseService reads inline, or fails them"""
+
+    def __init__(self, stored=None, error=None):
+        self.stored = stored or {}
+        self.error = error
+        self.writes = []
+
+    def write(self, method, *args, callback=None, on_error=None):
+        self.writes.append((method, *args))
+
+    def read(self, method, keys, callback=None, on_error=None):
+        if self.error is not None:
+            on_error(self.error)
+        else:
+            callback({key: self.stored[key] for key in keys if key in self.stored})
+
+
+def test_prefetch_loads_stored_renderings():
+    cache = RenderCache(FakeService(), str.upper, style='monokai')
+    cache.db.stored[cache.key("hello")] = "<p>stored</p>"
+    done = []
+    cache.prefetch(["hello", "other"], lambda: done.append(True))
+    assert done == [True]
+    assert cache.lookup("hello") == "<p>stored</p>"
+    assert cache.lookup("other") is None
+
+
+def test_prefetch_calls_back_when_the_read_fails():
+    cache = RenderCache(FakeService(error=OSError("disk I/O error")), str.upper)
+    done = []
+    cache.prefetch(["hello"], lambda: done.append(True))
+    assert done == [True]
+    assert cache.get("hello") == "HELLO"
+
+
+def test_renderings_of_other_versions_are_pruned():
+    service = FakeService()
+    cache = RenderCache(service, str.upper, style='monokai')
+    assert service.writes == [('prune_rendered_html', cache.prefix)]
+    assert cache.key("hello").startswith(cache.prefix)
@@ -0,0 +1,97 @@
+import re
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from app.context_builder import estimate_tokens
+from app.summarizer import Summarizer, split_sections
+
+
+class FakeLLM:
+    """Answers every prompt with a fixed-size 'summary' and records the prompts"""
+
+    def __init__(self, summary_chars=200, fail_on=None, delay=0.0):
+        self.summary_chars = summary_chars
+        self.delay = delay
+        self.fail_on = fail_on
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            number = len(self.prompts)
+        time.sleep(self.delay)
+        if self.fail_on is not None and number == self.fail_on:
+            raise ConnectionError("model unavailable")
+        part = re.match(r'Summarize part (\d+) of', prompt)
+        tag = f"part {part.group(1)}" if part else f"request {number}"
+        return f"summary of {tag}: " + "x" * self.summary_chars
+
+
+def document(chapters=6, paragraphs=8):
+    sentence = "The committee reviewed the figures and agreed on the next steps. "
+    return "\n\n".join(f"# Chapter {c}\n\n" + "\n\n".join(sentence * 5 for _ in range(paragraphs))
+                       for c in range(1, chapters + 1))
+
+
+def test_split_sections_fits_chunks_and_keeps_the_text():
+    text = document()
+    chunks = split_sections(text, 400)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 400 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_split_sections_cuts_at_headings_first():
+    text = "\n\n".join(f"# Part {n}\n\n" + "word " * 300 for n in range(1, 4))
+    chunks = split_sections(text, 400)
+
+    assert [chunk.split("\n", 1)[0] for chunk in chunks] == ["# Part 1", "# Part 2", "# Part 3"]
+
+
+def test_split_sections_cuts_an_overlong_sentence():
+    chunks = split_sections("a" * 10000, 100)
+    assert all(estimate_tokens(chunk) <= 101 for chunk in chunks)
+    assert "".join(chunks) == "a" * 10000
+
+
+def test_short_text_is_summarized_in_one_request():
+    llm = FakeLLM()
+    Summarizer(llm, chunk_tokens=1000).summarize("A short note.")
+    assert len(llm.prompts) == 1
+
+
+def test_summaries_are_merged_until_they_fit_one_prompt():
+    llm = FakeLLM(summary_chars=600)
+    summarizer = Summarizer(llm, chunk_tokens=400, max_workers=3)
+    stages = []
+    summaries = summarizer.condense(document(), progress=lambda stage, done, total: stages.append(stage))
+
+    assert estimate_tokens("\n\n".join(summaries)) <= 400 or len(summaries) == 1
+    assert stages[0] == 'map'
+    assert 'reduce 1' in stages
+    # Partial summaries are merged in document order
+    merged = next(prompt for prompt in llm.prompts
+                  if prompt.startswith("Merge") and "summary of part 1:" in prompt)
+    assert merged.index("summary of part 1:") < merged.index("summary of part 2:")
+
+
+def test_cancelling_stops_before_the_remaining_requests():
+    llm = FakeLLM(delay=0.02)
+    summarizer = Summarizer(llm, chunk_tokens=200, max_workers=1)
+    with pytest.raises(RuntimeError, match="cancelled"):
+        summarizer.condense(document(), cancelled=lambda: len(llm.prompts) >= 2)
+    assert len(llm.prompts) < len(split_sections(document(), 200))
+
+
+def test_a_failed_request_stops_the_others():
+    llm = FakeLLM(fail_on=2, delay=0.02)
+    summarizer = Summarizer(llm, chunk_tokens=200, max_workers=1)
+    with pytest.raises(ConnectionError):
+        summarizer.condense(document())
+    assert len(llm.prompts) < len(split_sections(document(), 200))
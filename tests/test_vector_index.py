@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from PyQt6.QtCore import QCoreApplication
+
+from app.embedding_service import EmbeddingService
+from app.vector_index import FakeEmbedder, VectorIndex
+
+
+class FakeDatabase:
+    """The two calls EmbeddingService makes, over an in-memory list of turns"""
+
+    def __init__(self, db_path, turns):
+        self.db_path = db_path
+        self.turns = turns  # [(id, user, ai), ...]
+
+    def call(self, name, *args):
+        if name == 'get_turns_after':
+            last_id, limit = args
+            return [turn for turn in self.turns if turn[0] > last_id][:limit]
+        if name == 'get_conversations':
+            return [turn for turn in self.turns if turn[0] in args[0]]
+        raise AttributeError(name)
+
+
+class DownEmbedder(FakeEmbedder):
+    """Fails like an Ollama server that is not running"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+
+def wait_for(condition, timeout=5.0):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    app.processEvents()
+    return condition()
+
+
+def test_fake_embedder_is_deterministic_and_favours_shared_words():
+    embedder = FakeEmbedder(dim=64)
+    pasta, sauce, engine = embedder.embed(["pasta with tomato sauce", "tomato sauce recipe",
+                                           "diesel engine maintenance"])
+    assert np.array_equal(embedder.embed(["pasta with tomato sauce"])[0], pasta)
+
+    def cosine(a, b):
+        return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    assert cosine(pasta, sauce) > cosine(pasta, engine)
+
+
+def test_search_returns_best_matches_first(tmp_path):
+    embedder = FakeEmbedder()
+    index = VectorIndex(str(tmp_path / 'history'))
+    texts = ["pasta with tomato sauce", "diesel engine maintenance", "bread baking at home"]
+    index.add([1, 2, 3], embedder.embed(texts), embedder.name)
+
+    hits = index.search(embedder.embed(["engine maintenance"])[0], k=2)
+    assert [conversation_id for conversation_id, _ in hits][0] == 2
+    assert len(hits) == 2
+    assert hits[0][1] >= hits[1][1]
+    assert index.last_id == 3
+
+
+def test_index_survives_reopening_and_appends(tmp_path):
+    embedder = FakeEmbedder()
+    path = str(tmp_path / 'history')
+    VectorIndex(path).add([1, 2], embedder.embed(["first turn", "second turn"]), embedder.name)
+
+    index = VectorIndex(path)
+    assert (index.count, index.model, index.last_id) == (2, embedder.name, 2)
+    index.add([5], embedder.embed(["third turn"]), embedder.name)
+    assert VectorIndex(path).count == 3
+
+
+def test_reset_and_model_change_drop_the_vectors(tmp_path):
+    path = str(tmp_path / 'history')
+    index = VectorIndex(path)
+    index.add([1], FakeEmbedder(dim=16).embed(["hello"]), 'fake:16')
+    index.add([2], FakeEmbedder(dim=32).embed(["hello"]), 'fake:32')
+    assert (index.count, index.dim, index.last_id) == (1, 32, 2)
+
+    index.reset()
+    assert VectorIndex(path).count == 0
+    assert index.search(np.ones(32), k=5) == []
+
+
+def test_service_indexes_and_searches(tmp_path):
+    turns = [(1, "how do I cook pasta", "boil it in salted water"),
+             (2, "my engine makes noise", "check the belt")]
+    service = EmbeddingService(FakeDatabase(str(tmp_path / 'chat.db'), turns), FakeEmbedder())
+    try:
+        results = []
+        service.index_new()
+        service.search("pasta water", k=1, callback=results.append)
+        assert wait_for(lambda: results)
+        assert [row[0] for row, _ in results[0]] == [1]
+    finally:
+        service.stop()
+
+
+def test_service_reports_an_unreachable_embedder_once(tmp_path):
+    turns = [(1, "hello", "hi")]
+    embedder = DownEmbedder()
+    service = EmbeddingService(FakeDatabase(str(tmp_path / 'chat.db'), turns), embedder)
+    errors = []
+    service.error_occurred.connect(errors.append)
+    try:
+        service.index_new()
+        assert wait_for(lambda: embedder.calls == 1)
+        for _ in range(5):
+            service.index_new()
+        wait_for(lambda: False, timeout=0.2)
+        # Further attempts wait for the retry delay
+        assert embedder.calls == 1
+        assert len(errors) == 1
+    finally:
+        service.stop()
+
+
+def test_service_retries_in_the_background(tmp_path):
+    class QuickRetry(EmbeddingService):
+        RETRY_DELAY = 0.05
+
+    embedder = DownEmbedder()
+    service = QuickRetry(FakeDatabase(str(tmp_path / 'chat.db'), [(1, "hello", "hi")]), embedder)
+    errors = []
+    service.error_occurred.connect(errors.append)
+    try:
+        service.index_new()
+        assert wait_for(lambda: embedder.calls >= 3)
+        assert len(errors) == 1
+    finally:
+        service.stop()